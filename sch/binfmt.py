@@ -0,0 +1,635 @@
+import struct
+from uuid import UUID
+from PyQt5.QtCore import Qt, QPoint
+from lxml import etree
+import sch.obj.line
+import sch.obj.net
+import sch.obj.text
+import sch.obj.part
+import sch.obj.pin
+import sch.obj.proptext
+
+
+# Binary document format
+#
+# A compact alternative to the xSchematic XML format: every object type is stored as an array
+# of fixed-width little-endian records, all strings (fonts, texts, property names and values,
+# symbol paths) are interned in one string table, and pages can be located through a page table
+# without reading the others.
+#
+#   magic               8 bytes
+#   index offset        u64
+#   page blobs          one per symPart / page, in document order
+#   index               string table, document section, page table
+#
+# A page blob holds one record array per object type (u32 count, then the records) in the
+# order of PAGE_SECTIONS.  Property texts and key/value properties refer to the object they
+# belong to by (owner kind, index into that kind's array); OWNER_PAGE means the page itself.
+#
+# Conversion to and from XML keeps all content of the schema; within a page, objects come out
+# grouped by type.
+
+MAGIC = b"xSchBin\x01"
+EXTENSION = ".xschb"
+
+OWNER_PAGE = 0
+OWNER_PART = 1
+OWNER_NET = 2
+OWNER_PIN = 3
+
+PAGE_SYMBOL = 0
+PAGE_SCHEMATIC = 1
+
+# section name -> record layout; "s" fields are string table ids
+PAGE_SECTIONS = (
+    ("line", struct.Struct("<5i")),         # weight, x1, y1, x2, y2
+    ("net", struct.Struct("<4i")),          # x1, y1, x2, y2
+    ("text", struct.Struct("<3i2BIiI")),    # x, y, rot, hAlign, vAlign, family, size, text
+    ("part", struct.Struct("<2I3iB")),      # schPath, partId, x, y, rot, mirror
+    ("pin", struct.Struct("<2I3i")),        # id, desc, x, y, rot
+    ("proptext", struct.Struct("<BI3i2BIi2BI")),   # owner kind, owner, x, y, rot, hAlign, vAlign,
+                                                   # family, size, visible, showName, prop
+    ("prop", struct.Struct("<BI2I")),       # owner kind, owner, name, value
+)
+# string fields of each section, by position in the record
+_STRING_FIELDS = {
+    "line": (), "net": (), "text": (5, 7), "part": (0, 1), "pin": (0, 1),
+    "proptext": (7, 11), "prop": (2, 3),
+}
+
+_HEADER = struct.Struct("<8sQ")
+_U32 = struct.Struct("<I")
+_PAGE_ENTRY = struct.Struct("<BIQQ")
+
+H_ALIGN = ("left", "center", "right")
+V_ALIGN = ("top", "middle", "bottom")
+_QT_H_ALIGN = (Qt.AlignLeft, Qt.AlignCenter, Qt.AlignRight)
+_QT_V_ALIGN = (Qt.AlignTop, Qt.AlignVCenter, Qt.AlignBottom)
+
+
+def isBinaryName(file):
+    return file.endswith(EXTENSION)
+
+
+def isBinaryFile(f):
+    """Checks the magic of an open binary file handle, leaving its position unchanged."""
+    pos = f.tell()
+    magic = f.read(len(MAGIC))
+    f.seek(pos)
+    return magic == MAGIC
+
+
+def emptyRecords():
+    return {name: [] for name, _ in PAGE_SECTIONS}
+
+
+class DocRecords(object):
+    """Document level content; pages are (kind, name, records) tuples."""
+    def __init__(self):
+        self.uuid = None
+        self.props = []         # (name, value)
+        self.symProps = []      # (name, value)
+        self.pinMaps = []       # (name, [(part, from, to)])
+        self.hasSymbol = False  # <symbol> element present
+        self.hasPages = False   # <pages> element present
+        self.pages = []
+
+
+# ---- model objects <-> records ----
+
+def alignCodes(alignment):
+    # same mapping as the XML writers of the text objects
+    h = 0 if alignment & Qt.AlignLeft else 2 if alignment & Qt.AlignRight else 1
+    v = 0 if alignment & Qt.AlignTop else 2 if alignment & Qt.AlignBottom else 1
+    return h, v
+
+
+def alignment(h, v):
+    return _QT_H_ALIGN[h] | _QT_V_ALIGN[v]
+
+
+def _propTextRecord(kind, owner, t):
+    h, v = alignCodes(t.alignment)
+    return (kind, owner, t.pos.x(), t.pos.y(), t.rot, h, v, t.family, t.ptSize,
+            int(bool(t.vis)), int(bool(t.showName)), t.name)
+
+
+def objectRecords(objs, recs=None):
+    """Adds records for the given top-level page objects to recs (a dict from emptyRecords())."""
+    if recs is None:
+        recs = emptyRecords()
+    for obj in objs:
+        t = type(obj)
+        if t is sch.obj.net.NetObj:
+            recs["net"].append((obj.pt1.x(), obj.pt1.y(), obj.pt2.x(), obj.pt2.y()))
+            if obj._props:
+                idx = len(recs["net"]) - 1
+                recs["prop"] += [(OWNER_NET, idx, name, value or "") for name, value in obj._props.items()]
+        elif t is sch.obj.line.LineObj:
+            recs["line"].append((obj.weight, obj.pt1.x(), obj.pt1.y(), obj.pt2.x(), obj.pt2.y()))
+        elif t is sch.obj.text.TextObj:
+            h, v = alignCodes(obj.alignment)
+            recs["text"].append((obj.pos.x(), obj.pos.y(), obj.rot, h, v, obj.family, obj.ptSize,
+                                 obj.text or ""))
+        elif t is sch.obj.part.PartObj:
+            idx = len(recs["part"])
+            recs["part"].append((obj.path, obj.name, obj.pos.x(), obj.pos.y(), obj.rot, int(bool(obj.mirror))))
+            for txt in obj.children():
+                recs["proptext"].append(_propTextRecord(OWNER_PART, idx, txt))
+            for name, value in obj.props().items():
+                recs["prop"].append((OWNER_PART, idx, name, value or ""))
+        elif t is sch.obj.pin.PinObj:
+            idx = len(recs["pin"])
+            recs["pin"].append((obj.pinId, obj.desc, obj.pos.x(), obj.pos.y(), obj.rot))
+            for txt in obj.children():
+                recs["proptext"].append(_propTextRecord(OWNER_PIN, idx, txt))
+        elif t is sch.obj.proptext.PropTextObj and type(obj._parent) is not sch.obj.pin.PinObj:
+            # (pin labels are recorded with their pin)
+            recs["proptext"].append(_propTextRecord(OWNER_PAGE, 0, obj))
+    return recs
+
+
+def buildObjects(page, recs):
+    """Creates the model objects of page (a DocPage or SymbolPage) from its records."""
+    objs = []
+    # lines and nets are the bulk of a page; skip their constructors, which copy the points
+    LineObj = sch.obj.line.LineObj
+    for w, x1, y1, x2, y2 in recs["line"]:
+        obj = LineObj.__new__(LineObj)
+        obj.pt1 = QPoint(x1, y1)
+        obj.pt2 = QPoint(x2, y2)
+        obj.weight = w
+        objs.append(obj)
+    NetObj = sch.obj.net.NetObj
+    nets = []
+    for x1, y1, x2, y2 in recs["net"]:
+        obj = NetObj.__new__(NetObj)
+        obj.pt1 = QPoint(x1, y1)
+        obj.pt2 = QPoint(x2, y2)
+        obj._props = {}
+        nets.append(obj)
+    objs += nets
+    for x, y, rot, h, v, family, size, text in recs["text"]:
+        objs.append(sch.obj.text.TextObj(text, QPoint(x, y), alignment(h, v), family, size, rot))
+    parts = []
+    for path, partId, x, y, rot, mirror in recs["part"]:
+        obj = sch.obj.part.PartObj(page.parentDoc.lib)
+        obj.name = partId
+        obj.pos = QPoint(x, y)
+        obj.rot = rot
+        obj.mirror = bool(mirror)
+        obj.path = path
+        obj._proptexts = []
+        parts.append(obj)
+        objs.append(obj)
+    pins = [sch.obj.pin.PinObj(pinId, desc, QPoint(x, y), rot) for pinId, desc, x, y, rot in recs["pin"]]
+    objs += pins
+    # properties go first: property texts look up their value when created
+    for kind, owner, name, value in recs["prop"]:
+        if kind == OWNER_PAGE and hasattr(page, "setProp"):
+            page.setProp(name, value)
+        elif kind == OWNER_PART:
+            parts[owner]._props[name] = value
+        elif kind == OWNER_NET:
+            nets[owner]._props[name] = value
+    for kind, owner, x, y, rot, h, v, family, size, vis, showName, prop in recs["proptext"]:
+        if kind == OWNER_PART:
+            parent = parts[owner]
+        elif kind == OWNER_PIN:
+            parent = pins[owner]
+        elif kind == OWNER_PAGE:
+            parent = page
+        else:
+            continue    # net labels are not part of the model yet
+        txt = sch.obj.proptext.PropTextObj(parent, prop, QPoint(x, y), alignment(h, v), family, size, rot,
+                                           bool(vis), bool(showName))
+        if kind in (OWNER_PART, OWNER_PIN):
+            parent._proptexts.append(txt)
+        objs.append(txt)
+    return objs
+
+
+# ---- XML <-> records ----
+
+def _attrs(elem, *names):
+    return [elem.attrib[n] for n in names]
+
+
+def _xmlPropText(elem, kind, owner):
+    a = elem.attrib
+    return (kind, owner, int(a["x"]), int(a["y"]), int(a["rot"]), H_ALIGN.index(a["hAlign"]),
+            V_ALIGN.index(a["vAlign"]), a["fontFamily"], int(a["fontSize"]), int(a["visible"] == "1"),
+            int(a["showName"] == "1"), a["prop"])
+
+
+def _xmlChildren(elem, kind, owner, recs):
+    for sub in elem:
+        if sub.tag == "proptext":
+            recs["proptext"].append(_xmlPropText(sub, kind, owner))
+        elif sub.tag == "prop":
+            recs["prop"].append((kind, owner, sub.attrib["name"], sub.text or ""))
+
+
+def xmlObjectRecords(obj, recs):
+    """Adds the records for one object element of a page or symPart."""
+    a = obj.attrib
+    if obj.tag == "line":
+        recs["line"].append(tuple(int(a[n]) for n in ("weight", "x1", "y1", "x2", "y2")))
+    elif obj.tag == "net":
+        recs["net"].append(tuple(int(a[n]) for n in ("x1", "y1", "x2", "y2")))
+        _xmlChildren(obj, OWNER_NET, len(recs["net"]) - 1, recs)
+    elif obj.tag == "text":
+        recs["text"].append((int(a["x"]), int(a["y"]), int(a["rot"]), H_ALIGN.index(a["hAlign"]),
+                             V_ALIGN.index(a["vAlign"]), a["fontFamily"], int(a["fontSize"]), obj.text or ""))
+    elif obj.tag == "part":
+        recs["part"].append((a["schPath"], a["partId"], int(a["x"]), int(a["y"]), int(a["rot"]),
+                             int(a["mirror"] == "1")))
+        _xmlChildren(obj, OWNER_PART, len(recs["part"]) - 1, recs)
+    elif obj.tag == "pin":
+        recs["pin"].append((a["id"], a["desc"], int(a["x"]), int(a["y"]), int(a["rot"])))
+        _xmlChildren(obj, OWNER_PIN, len(recs["pin"]) - 1, recs)
+    elif obj.tag == "proptext":
+        recs["proptext"].append(_xmlPropText(obj, OWNER_PAGE, 0))
+
+
+def xmlPageRecords(pageElem):
+    """Returns the records of a <page> or <symPart> element."""
+    recs = emptyRecords()
+    props = pageElem.find("props")
+    if props is not None:
+        _xmlChildren(props, OWNER_PAGE, 0, recs)
+    objs = pageElem.find("objects")
+    for obj in objs if objs is not None else ():
+        xmlObjectRecords(obj, recs)
+    return recs
+
+
+def readXml(f):
+    """Reads an xSchematic XML file into DocRecords."""
+    doc = DocRecords()
+    doc.pages = list(iterXml(f, doc))
+    return doc
+
+
+def iterXml(f, doc):
+    """Reads an xSchematic XML file, yielding its pages as (kind, name, records) and filling in
+    the rest of the DocRecords doc; elements are released as they are converted."""
+    path = [""]
+    recs = None
+    for event, elem in etree.iterparse(f, events=("start", "end")):
+        if event == "start":
+            parent = path[-1]
+            path.append(parent + "/" + elem.tag if parent else elem.tag)
+            if parent in ("xSchematic/symbol", "xSchematic/pages") and elem.tag in ("symPart", "page"):
+                recs = emptyRecords()
+            continue
+        path.pop()
+        parent = path[-1]
+        if parent == "xSchematic/pages/page/objects" or parent == "xSchematic/symbol/symPart/objects":
+            xmlObjectRecords(elem, recs)
+        elif parent == "xSchematic/symbol/symPart/props":
+            recs["prop"].append((OWNER_PAGE, 0, elem.attrib["name"], elem.text or ""))
+        elif parent in ("xSchematic/symbol", "xSchematic/pages") and elem.tag in ("symPart", "page"):
+            page = (PAGE_SYMBOL if elem.tag == "symPart" else PAGE_SCHEMATIC, elem.attrib["name"], recs)
+            recs = None
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+            yield page
+            continue
+        elif parent == "xSchematic/props" and elem.tag == "uuid":
+            doc.uuid = UUID(elem.text)
+        elif parent == "xSchematic/props" and elem.tag == "prop":
+            doc.props.append((elem.attrib["name"], elem.text or ""))
+        elif parent == "xSchematic/symbol/props" and elem.tag == "prop":
+            doc.symProps.append((elem.attrib["name"], elem.text or ""))
+        elif parent == "xSchematic/symbol/props" and elem.tag == "pinMap":
+            doc.pinMaps.append((elem.attrib["name"], [tuple(_attrs(m, "part", "from", "to"))
+                                                      for m in elem if m.tag == "map"]))
+        elif parent == "xSchematic":
+            doc.hasSymbol = doc.hasSymbol or elem.tag == "symbol"
+            doc.hasPages = doc.hasPages or elem.tag == "pages"
+        else:
+            continue
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+def _newline(xf, level):
+    xf.write("\n" + "  " * level)
+
+
+def _writeXmlProps(xf, level, props):
+    for name, value in props:
+        _newline(xf, level)
+        with xf.element("prop", name=name):
+            xf.write(value)
+
+
+def _propTextAttrs(r):
+    return dict(x=str(r[2]), y=str(r[3]), rot=str(r[4]), hAlign=H_ALIGN[r[5]], vAlign=V_ALIGN[r[6]],
+                fontFamily=r[7], fontSize=str(r[8]), visible=str(r[9]), showName=str(r[10]), prop=r[11])
+
+
+def writeXmlPage(xf, level, kind, name, recs):
+    """Writes the records of a page as a <page> or <symPart> element.  Each section of recs is
+    gone through once, so it can be an iterator (see iterPage)."""
+    # children (property texts and properties) by owner; they are stored after the objects
+    # they belong to, so they are the only records held for the whole page
+    children = {}
+    for r in recs["proptext"]:
+        children.setdefault((r[0], r[1]), ([], []))[0].append(r)
+    for r in recs["prop"]:
+        children.setdefault((r[0], r[1]), ([], []))[1].append(r)
+
+    def writeChildren(key, lvl):
+        texts, props = children.get(key, ((), ()))
+        for r in texts:
+            _newline(xf, lvl)
+            xf.write(etree.Element("proptext", _propTextAttrs(r)))
+        _writeXmlProps(xf, lvl, [(r[2], r[3]) for r in props])
+        if texts or props:
+            _newline(xf, lvl - 1)
+
+    def leaf(tag, attrs, key=None, text=None):
+        _newline(xf, level + 2)
+        if key is not None and key in children or text is not None:
+            with xf.element(tag, attrs):
+                if text is not None:
+                    xf.write(text)
+                else:
+                    writeChildren(key, level + 3)
+        else:
+            xf.write(etree.Element(tag, attrs))
+
+    with xf.element("symPart" if kind == PAGE_SYMBOL else "page", name=name):
+        if kind == PAGE_SYMBOL:
+            _newline(xf, level + 1)
+            with xf.element("props"):
+                _writeXmlProps(xf, level + 2, [(r[2], r[3]) for r in children.get((OWNER_PAGE, 0), ((), ()))[1]])
+                _newline(xf, level + 1)
+        _newline(xf, level + 1)
+        with xf.element("objects"):
+            for r in recs["line"]:
+                leaf("line", dict(zip(("weight", "x1", "y1", "x2", "y2"), map(str, r))))
+            for i, r in enumerate(recs["net"]):
+                leaf("net", dict(zip(("x1", "y1", "x2", "y2"), map(str, r))), (OWNER_NET, i))
+            for r in recs["text"]:
+                leaf("text", dict(x=str(r[0]), y=str(r[1]), rot=str(r[2]), hAlign=H_ALIGN[r[3]],
+                                  vAlign=V_ALIGN[r[4]], fontFamily=r[5], fontSize=str(r[6])), text=r[7])
+            for i, r in enumerate(recs["part"]):
+                leaf("part", dict(schPath=r[0], partId=r[1], x=str(r[2]), y=str(r[3]), rot=str(r[4]),
+                                  mirror=str(r[5])), (OWNER_PART, i))
+            for i, r in enumerate(recs["pin"]):
+                leaf("pin", dict(id=r[0], desc=r[1], x=str(r[2]), y=str(r[3]), rot=str(r[4])), (OWNER_PIN, i))
+            for r in children.get((OWNER_PAGE, 0), ((), ()))[0]:
+                leaf("proptext", _propTextAttrs(r))
+            _newline(xf, level + 1)
+        _newline(xf, level)
+
+
+def writeXml(doc, h):
+    """Writes DocRecords as xSchematic XML to the binary file handle h.
+
+    doc.pages is gone through once, and has to list the symbol parts first, as documents do;
+    it can be an iterator decoding one page at a time (see BinaryReader.iterPages)."""
+    with etree.xmlfile(h) as xf:
+        with xf.element("xSchematic"):
+            _newline(xf, 1)
+            with xf.element("props"):
+                _newline(xf, 2)
+                with xf.element("uuid"):
+                    xf.write(str(doc.uuid))
+                _writeXmlProps(xf, 2, doc.props)
+                _newline(xf, 1)
+            pages = iter(doc.pages)
+            page = next(pages, None)
+            if doc.hasSymbol or page is not None and page[0] == PAGE_SYMBOL:
+                _newline(xf, 1)
+                with xf.element("symbol"):
+                    _newline(xf, 2)
+                    with xf.element("props"):
+                        _writeXmlProps(xf, 3, doc.symProps)
+                        for name, maps in doc.pinMaps:
+                            _newline(xf, 3)
+                            with xf.element("pinMap", name=name):
+                                for part, frm, to in maps:
+                                    _newline(xf, 4)
+                                    xf.write(etree.Element("map", {"part": part, "from": frm, "to": to}))
+                                _newline(xf, 3)
+                        _newline(xf, 2)
+                    while page is not None and page[0] == PAGE_SYMBOL:
+                        _newline(xf, 2)
+                        writeXmlPage(xf, 2, *page)
+                        page = next(pages, None)
+                    _newline(xf, 1)
+            if doc.hasPages or page is not None:
+                _newline(xf, 1)
+                with xf.element("pages"):
+                    while page is not None:
+                        _newline(xf, 2)
+                        writeXmlPage(xf, 2, *page)
+                        page = next(pages, None)
+                    _newline(xf, 1)
+            _newline(xf, 0)
+    h.write(b"\n")
+
+
+# ---- binary encoding ----
+
+class _StringTable(object):
+    def __init__(self):
+        self.ids = {}
+        self.strings = []
+
+    def id(self, s):
+        i = self.ids.get(s)
+        if i is None:
+            i = self.ids[s] = len(self.strings)
+            self.strings.append(s)
+        return i
+
+    def pack(self):
+        data = [s.encode("utf-8") for s in self.strings]
+        return b"".join([_U32.pack(len(data)), struct.pack("<%dI" % len(data), *map(len, data))] + data)
+
+
+def _packPage(recs, strings):
+    out = []
+    for name, st in PAGE_SECTIONS:
+        rows = recs[name]
+        sf = _STRING_FIELDS[name]
+        out.append(_U32.pack(len(rows)))
+        if sf:
+            sid = strings.id
+            rows = [tuple(sid(v) if i in sf else v for i, v in enumerate(r)) for r in rows]
+        pack = st.pack
+        out.append(b"".join([pack(*r) for r in rows]))
+    return b"".join(out)
+
+
+def _sections(data):
+    # (name, layout, bytes of the records) of each section of a page blob
+    mv = memoryview(data)
+    pos = 0
+    for name, st in PAGE_SECTIONS:
+        n = _U32.unpack_from(mv, pos)[0]
+        pos += 4
+        end = pos + n * st.size
+        yield name, st, mv[pos:end]
+        pos = end
+
+
+def unpackPage(data, strings):
+    recs = {}
+    for name, st, mv in _sections(data):
+        rows = list(st.iter_unpack(mv))
+        sf = _STRING_FIELDS[name]
+        if sf:
+            rows = [tuple(strings[v] if i in sf else v for i, v in enumerate(r)) for r in rows]
+        recs[name] = rows
+    return recs
+
+
+def _decodeRows(rows, sf, strings):
+    for r in rows:
+        yield tuple(strings[v] if i in sf else v for i, v in enumerate(r))
+
+
+def iterPage(data, strings):
+    """Like unpackPage, but each section is an iterator decoding its records as they are taken."""
+    recs = {}
+    for name, st, mv in _sections(data):
+        sf = _STRING_FIELDS[name]
+        recs[name] = _decodeRows(st.iter_unpack(mv), sf, strings) if sf else st.iter_unpack(mv)
+    return recs
+
+
+class BinaryWriter(object):
+    """Writes DocRecords pages one by one to the binary file handle h."""
+    def __init__(self, h):
+        self._h = h
+        self._strings = _StringTable()
+        self._entries = []
+        self._start = h.tell()
+        h.write(_HEADER.pack(MAGIC, 0))
+
+    def writePage(self, kind, name, recs):
+        blob = _packPage(recs, self._strings)
+        self._entries.append((kind, self._strings.id(name), self._h.tell() - self._start, len(blob)))
+        self._h.write(blob)
+
+    def finish(self, doc):
+        s = self._strings
+        sect = []
+        for props in (doc.props, doc.symProps):
+            sect.append(_U32.pack(len(props)))
+            sect += [struct.pack("<2I", s.id(n), s.id(v)) for n, v in props]
+        sect.append(_U32.pack(len(doc.pinMaps)))
+        for name, maps in doc.pinMaps:
+            sect.append(struct.pack("<2I", s.id(name), len(maps)))
+            sect += [struct.pack("<3I", *map(s.id, m)) for m in maps]
+        sect.append(_U32.pack(len(self._entries)))
+        sect += [_PAGE_ENTRY.pack(*e) for e in self._entries]
+        index = self._h.tell() - self._start
+        self._h.write(s.pack())
+        self._h.write(doc.uuid.bytes + bytes([int(doc.hasSymbol) | int(doc.hasPages) << 1]))
+        self._h.write(b"".join(sect))
+        end = self._h.tell()
+        self._h.seek(self._start)
+        self._h.write(_HEADER.pack(MAGIC, index))
+        self._h.seek(end)
+
+
+def writeBinary(doc, h):
+    w = BinaryWriter(h)
+    for kind, name, recs in doc.pages:
+        w.writePage(kind, name, recs)
+    w.finish(doc)
+
+
+class BinaryReader(object):
+    """Reads the index of a binary document; pages are decoded on request."""
+    def __init__(self, f):
+        self._f = f
+        self._start = f.tell()
+        magic, index = _HEADER.unpack(f.read(_HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("not a binary xSchematic file")
+        f.seek(self._start + index)
+        data = memoryview(f.read())
+        n = _U32.unpack_from(data, 0)[0]
+        lens = struct.unpack_from("<%dI" % n, data, 4)
+        pos = 4 + 4 * n
+        strings = []
+        for ln in lens:
+            strings.append(bytes(data[pos:pos + ln]).decode("utf-8"))
+            pos += ln
+        self.strings = strings
+        doc = self.doc = DocRecords()
+        doc.uuid = UUID(bytes=bytes(data[pos:pos + 16]))
+        doc.hasSymbol = bool(data[pos + 16] & 1)
+        doc.hasPages = bool(data[pos + 16] & 2)
+        pos += 17
+        for props in (doc.props, doc.symProps):
+            cnt = _U32.unpack_from(data, pos)[0]
+            pos += 4
+            for i in range(cnt):
+                nm, v = struct.unpack_from("<2I", data, pos)
+                props.append((strings[nm], strings[v]))
+                pos += 8
+        cnt = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        for i in range(cnt):
+            nm, nmaps = struct.unpack_from("<2I", data, pos)
+            pos += 8
+            maps = []
+            for j in range(nmaps):
+                maps.append(tuple(strings[k] for k in struct.unpack_from("<3I", data, pos)))
+                pos += 12
+            doc.pinMaps.append((strings[nm], maps))
+        cnt = _U32.unpack_from(data, pos)[0]
+        pos += 4
+        # (kind, name, offset, size)
+        self.pageTable = []
+        for i in range(cnt):
+            kind, nm, off, size = _PAGE_ENTRY.unpack_from(data, pos)
+            self.pageTable.append((kind, strings[nm], off, size))
+            pos += _PAGE_ENTRY.size
+
+    def pageBlob(self, i):
+        kind, name, off, size = self.pageTable[i]
+        self._f.seek(self._start + off)
+        return self._f.read(size)
+
+    def readPage(self, i):
+        return unpackPage(self.pageBlob(i), self.strings)
+
+    def iterPages(self):
+        """Yields (kind, name, records) for every page, decoding each as it is taken (see iterPage)."""
+        for i, (kind, name, off, size) in enumerate(self.pageTable):
+            yield kind, name, iterPage(self.pageBlob(i), self.strings)
+
+    def readAll(self):
+        """Returns the DocRecords with all pages filled in."""
+        self.doc.pages = [(kind, name, self.readPage(i)) for i, (kind, name, off, size) in enumerate(self.pageTable)]
+        return self.doc
+
+
+# the converters hold one page at a time
+
+def xmlToBinary(src, dst):
+    doc = DocRecords()
+    with open(src, "rb") as f, open(dst, "wb") as h:
+        w = BinaryWriter(h)
+        for kind, name, recs in iterXml(f, doc):
+            w.writePage(kind, name, recs)
+        w.finish(doc)
+
+
+def binaryToXml(src, dst):
+    with open(src, "rb") as f, open(dst, "wb") as h:
+        reader = BinaryReader(f)
+        reader.doc.pages = reader.iterPages()
+        writeXml(reader.doc, h)
@@ -0,0 +1,221 @@
+import argparse
+import concurrent.futures
+import io
+import json
+import multiprocessing
+import os
+import sys
+import time
+from PyQt5.QtCore import QCoreApplication
+from PyQt5.QtGui import QGuiApplication
+import sch.binfmt
+import sch.document
+import sch.library
+import sch.netlist
+import sch.obj.net
+import sch.project
+
+
+# Batch processing of schematic files, without the GUI:
+#
+#   python -m sch.cli validate  PATH...
+#   python -m sch.cli normalize [--check] PATH...
+#   python -m sch.cli convert   --to {xml,binary,project} [--out DIR] PATH...
+#   python -m sch.cli netlist   [--out DIR] PATH...
+#
+# A PATH is a document or a directory searched recursively for documents.  Files are processed
+# on a pool of worker processes; a JSON object is printed on its own line for every file as it
+# finishes, followed by one summary line.  The exit status is 1 if any file failed (or, with
+# normalize --check, would change).
+
+FORMATS = {"xml": ".xsch", "binary": sch.binfmt.EXTENSION, "project": sch.project.EXTENSION}
+
+# library used by the documents loaded in this process, and the application it measures the
+# texts of parts with (see _initWorker)
+_lib = None
+_app = None
+
+
+def findDocuments(paths):
+    """Yields (document, root) for every document given or found under the given directories;
+    root is the argument it was found under."""
+    for root in paths:
+        if not os.path.isdir(root) or sch.project.isProjectName(root):
+            yield root, root
+            continue
+        for dirName, dirs, files in os.walk(root):
+            dirs.sort()
+            for d in list(dirs):
+                path = os.path.join(dirName, d)
+                if sch.project.isProjectName(path):
+                    dirs.remove(d)
+                    yield path, root
+            for f in sorted(files):
+                if os.path.splitext(f)[1] in (".xsch", sch.binfmt.EXTENSION):
+                    yield os.path.join(dirName, f), root
+
+
+def formatOf(path):
+    if sch.project.isProjectName(path):
+        return "project"
+    with open(path, "rb") as f:
+        return "binary" if sch.binfmt.isBinaryFile(f) else "xml"
+
+
+def outputName(path, root, ext, outDir=None):
+    base = os.path.splitext(os.path.normpath(path))[0]
+    if outDir is not None:
+        # keep the layout of the directory tree the document was found in
+        rel = os.path.relpath(base, root) if path != root else os.path.basename(base)
+        base = os.path.join(outDir, rel)
+    return base + ext
+
+
+def _load(path, args, lazy):
+    doc = sch.document.MasterDocument(_lib)
+    validation = sch.document.Validation.strict if args.validate else sch.document.Validation.off
+    # a batch run neither replays nor writes edit journals
+    doc.loadFromFile(path, validation, lazy=lazy, workers=1, recover=False)
+    return doc
+
+
+def validate(path, root, args):
+    doc = _load(path, args, lazy=False)
+    return {"pages": len(doc.pages), "symbols": len(doc.symbols)}
+
+
+def normalize(path, root, args):
+    doc = _load(path, args, lazy=True)
+    changed = [page.name for page in doc.pages if sch.obj.net.normalizeNets(page)]
+    if changed and not args.check:
+        doc.saveToFile()
+    return {"changed": changed}
+
+
+def convert(path, root, args):
+    if formatOf(path) == args.to:
+        return {"skipped": "already {}".format(args.to)}
+    out = outputName(path, root, FORMATS[args.to], args.out)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    doc = _load(path, args, lazy=True)
+    # unopened pages are written straight from their source
+    doc.saveToFile(out)
+    return {"output": out}
+
+
+def netlist(path, root, args):
+    out = outputName(path, root, sch.netlist.EXTENSION, args.out)
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    # pages are only parsed, one at a time, never built
+    doc = _load(path, args, lazy=True)
+    count = 0
+
+    def write(h):
+        nonlocal count
+        t = io.TextIOWrapper(h, encoding="utf-8", newline="\n")
+        count = sch.netlist.writeNetlist(doc, t)
+        t.flush()
+        t.detach()
+    sch.document.atomicWrite(out, write)
+    return {"output": out, "nets": count}
+
+
+COMMANDS = {"validate": validate, "normalize": normalize, "convert": convert, "netlist": netlist}
+
+
+def _initWorker(libPaths):
+    global _lib, _app
+    # texts, and with them parts, are measured with the same fonts as in the GUI (see
+    # sch.obj.text.textExtent); the offscreen platform needs no display
+    if not isinstance(QCoreApplication.instance(), QGuiApplication):
+        os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+        _app = QGuiApplication(["sch.cli"])
+    _lib = sch.library.PartLibrary(libPaths)
+
+
+def processFile(path, root, args):
+    """Runs args.command on one document; returns its result line (without progress fields)."""
+    result = {"file": path, "command": args.command}
+    start = time.perf_counter()
+    try:
+        result.update(COMMANDS[args.command](path, root, args))
+        result["ok"] = True
+    except Exception as e:
+        result["ok"] = False
+        result["error"] = "{}: {}".format(type(e).__name__, e)
+    result["seconds"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def run(args, out=sys.stdout):
+    """Processes every document named by args.paths; returns the exit status."""
+    start = time.perf_counter()
+    docs = list(findDocuments(args.paths))
+    jobs = min(args.jobs or os.cpu_count() or 1, len(docs))
+    failed = changed = 0
+
+    def report(result, done):
+        nonlocal failed, changed
+        result.update(done=done, total=len(docs))
+        failed += not result["ok"]
+        changed += bool(result.get("changed"))
+        out.write(json.dumps(result) + "\n")
+        out.flush()
+
+    if jobs <= 1:
+        _initWorker(args.lib)
+        for i, (path, root) in enumerate(docs):
+            report(processFile(path, root, args), i + 1)
+    else:
+        # spawn rather than fork, as for loading pages (see MasterDocument.loadPages)
+        ctx = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(jobs, mp_context=ctx, initializer=_initWorker,
+                                                    initargs=(args.lib,)) as pool:
+            futures = [pool.submit(processFile, path, root, args) for path, root in docs]
+            for i, f in enumerate(concurrent.futures.as_completed(futures)):
+                report(f.result(), i + 1)
+    summary = {"summary": True, "command": args.command, "files": len(docs), "failed": failed,
+               "workers": max(jobs, 1), "seconds": round(time.perf_counter() - start, 6)}
+    if args.command == "normalize":
+        summary["changed"] = changed
+    out.write(json.dumps(summary) + "\n")
+    if failed or (args.command == "normalize" and args.check and changed):
+        return 1
+    return 0
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sch.cli", description="Batch processing of schematic files.")
+    parser.add_argument("-j", "--jobs", type=int, default=None,
+                        help="number of worker processes (default: one per core)")
+    parser.add_argument("--lib", action="append", default=None, metavar="DIR",
+                        help="part library directory; may be repeated (default: ./schlib/)")
+    parser.add_argument("--no-validate", dest="validate", action="store_false",
+                        help="don't check XML files against the schema while loading")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("validate", help="check that documents load and match the schema")
+    p.add_argument("paths", nargs="+", metavar="PATH")
+    p = sub.add_parser("normalize", help="split and merge nets so that they only touch at endpoints")
+    p.add_argument("--check", action="store_true", help="only report the files that would change")
+    p.add_argument("paths", nargs="+", metavar="PATH")
+    p = sub.add_parser("convert", help="convert documents to another format")
+    p.add_argument("--to", choices=sorted(FORMATS), required=True)
+    p.add_argument("--out", metavar="DIR", help="output directory (default: beside each input)")
+    p.add_argument("paths", nargs="+", metavar="PATH")
+    p = sub.add_parser("netlist", help="write the netlist of each document (see sch.netlist)")
+    p.add_argument("--out", metavar="DIR", help="output directory (default: beside each input)")
+    p.add_argument("paths", nargs="+", metavar="PATH")
+    args = parser.parse_args(argv)
+    if args.lib is None:
+        args.lib = ["./schlib/"]
+    if args.command == "validate":
+        args.validate = True
+    return args
+
+
+def main(argv=None):
+    return run(parseArgs(argv))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,19 @@
 from enum import Enum
+from itertools import chain, filterfalse
 from PyQt5.QtCore import *
 from PyQt5.QtGui import QPainter, QPen
-from sch.obj.line import LineTool, LineObj, LineEditor
+from sch.obj.line import LineObj
 import sch.obj.net
 import sch.obj.text
 import sch.obj.part
-from sch.view import Event
+import sch.obj.pin
+import sch.tools.line
+import sch.tools.net
+import sch.tools.text
+import sch.tools.part
+import sch.tools.proptext
+import sch.tools.pin
+from sch.event import Event
 from sch.utils import Layer, LayerType
 import sch.document
 from copy import copy
@@ -29,8 +37,22 @@ def getCtrl(doc):
         raise NotImplementedError()
 
 
+class JunctionDrawable(object):
+    """Draws the junctions of a page, see AbstractPage.junctions."""
+    def __init__(self, doc, rect=None):
+        self._doc = doc
+        self._rect = rect
+
+    def draw(self, painter):
+        sch.obj.net.NetObj.drawJunctions(self._doc, painter, self._rect)
+
+
 class Controller(QObject):
     sigUpdate = pyqtSignal()
+    # the document layer the view caches has to be drawn again, see layerDrawables
+    sigLayerUpdate = pyqtSignal()
+    # ... or only the given area of it (in document coordinates)
+    sigLayerDamaged = pyqtSignal(QRect)
     sigToolChanged = pyqtSignal(int)
     sigInspectorChanged = pyqtSignal()
 
@@ -42,6 +64,8 @@ class Controller(QObject):
         self._toolId = 0
         self._grid = 5000
         self.lib = lib
+        if self.lib is not None:
+            self.lib.sigSymbolChanged.connect(self._symbolChanged)
         # properties
         self.view = view
         self.doc = doc
@@ -96,6 +120,8 @@ class Controller(QObject):
     def view(self, view):
         self._view = view
         self.sigUpdate.connect(self._view.slotUpdate)
+        self.sigLayerUpdate.connect(self._view.slotLayerUpdate)
+        self.sigLayerDamaged.connect(self._view.slotLayerDamaged)
         self._installTool(SelectTool(self))
 
     @property
@@ -105,6 +131,7 @@ class Controller(QObject):
     @grid.setter
     def grid(self, value):
         self._grid = value
+        self.sigLayerUpdate.emit()
         self.sigUpdate.emit()
 
     @property
@@ -114,6 +141,7 @@ class Controller(QObject):
     @doc.setter
     def doc(self, doc):
         self._doc = doc
+        self._doc.sigDamaged.connect(self.sigLayerDamaged)
         self._doc.sigChanged.connect(self.sigUpdate)
         self.sigUpdate.emit()
 
@@ -121,13 +149,54 @@ class Controller(QObject):
     def inspector(self):
         return self._tool.inspector
 
-    def getDrawables(self):
-        class JunctionDrawable:
-            @staticmethod
-            def draw(painter):
-                sch.obj.net.NetObj.drawJunctions(self.doc, painter)
-        out = list(self.doc.objects())
-        out.append(JunctionDrawable())
+    @pyqtSlot('PyQt_PyObject')
+    def _symbolChanged(self, insts):
+        # only repaint if one of the affected instances is on our page
+        if self._doc is not None and any(self._doc.hasObject(i) for i in insts):
+            self.sigLayerUpdate.emit()
+            self.sigUpdate.emit()
+
+    def getDrawables(self, rect=None):
+        """Returns what to draw: with rect (in document coordinates), only what may show in it."""
+        return list(self.layerDrawables(rect)) + self.overlayDrawables()
+
+    def editedObjects(self):
+        """Returns the objects an editor may be changing; they are drawn with the overlay."""
+        objs = set()
+        if isinstance(self._tool, SelectTool):
+            for obj in self._tool.selection():
+                objs.add(obj)
+                objs.update(c for c in getattr(obj, "children", list)() if self.doc.hasObject(c))
+        return objs
+
+    def layerDrawables(self, rect=None):
+        """Returns the document objects and junctions, except the edited objects, to be gone
+        through once.  They only change with the document, so the view keeps them drawn (see
+        sigLayerUpdate)."""
+        objs = self.doc.objects() if rect is None else self.doc.objectsInView(rect)
+        edited = self.editedObjects()
+        # the objects come straight from the spatial index, without being collected
+        if edited:
+            objs = filterfalse(edited.__contains__, objs)
+        return chain(objs, (JunctionDrawable(self.doc, rect),))
+
+    def overlayRect(self):
+        """Returns the document area the overlay draws in, or None if the tool can't tell."""
+        rect = QRect()
+        for obj in self.editedObjects():
+            rect |= obj.bbox()
+        if self._tool is not None:
+            bbox = getattr(self._tool, "bbox", None)
+            r = bbox() if bbox is not None else None
+            if r is None:
+                return None
+            rect |= r
+        return rect
+
+    def overlayDrawables(self):
+        """Returns what is drawn over the document layer on every update: the edited objects
+        (which can be dragged anywhere) and the tool."""
+        out = list(self.editedObjects())
         if self._tool is not None:
             out.append(self._tool)
         return out
@@ -151,7 +220,7 @@ class SchController(Controller):
 
     @staticmethod
     def tools():
-        return SelectTool, LineTool, sch.obj.net.NetTool,  sch.obj.text.TextTool, sch.obj.part.PartTool
+        return SelectTool, sch.tools.line.LineTool, sch.tools.net.NetTool,  sch.tools.text.TextTool, sch.tools.part.PartTool
 
 
 class SymController(Controller):
@@ -160,7 +229,8 @@ class SymController(Controller):
 
     @staticmethod
     def tools():
-        return SelectTool, LineTool, sch.obj.text.TextTool, sch.obj.proptext.PropTextTool
+        return SelectTool, sch.tools.line.LineTool, sch.tools.text.TextTool, sch.tools.proptext.PropTextTool, \
+            sch.tools.pin.PinTool
 
 
 class SelectTool(QObject):
@@ -183,6 +253,18 @@ class SelectTool(QObject):
     def name():
         return "Select"
 
+    def selection(self):
+        return list(self._selection)
+
+    def bbox(self):
+        if self._editor is not None:
+            bbox = getattr(self._editor, "bbox", None)
+            return bbox() if bbox is not None else None
+        rect = QRect()
+        for obj in self._selection:
+            rect |= obj.bbox().marginsAdded(QMargins(500, 500, 500, 500))
+        return rect
+
     def finish(self):
         self.releaseSelection()
         self.sigUpdate.emit()
@@ -233,23 +315,27 @@ class SelectTool(QObject):
     def selectionChanged(self, event=None):
         self._editor = None
         if len(self._selection) == 1 and type(self._selection[0]) is LineObj:
-            self._editor = LineEditor(self._ctrl, self._selection[0])
+            self._editor = sch.tools.line.LineEditor(self._ctrl, self._selection[0])
             self._editor.sigUpdate.connect(self.sigUpdate)
             self._editor.sigDone.connect(self.releaseSelection)
         elif len(self._selection) == 1 and type(self._selection[0]) is sch.obj.net.NetObj:
-            self._editor = sch.obj.net.NetEditor(self._ctrl, self._selection[0])
+            self._editor = sch.tools.net.NetEditor(self._ctrl, self._selection[0])
             self._editor.sigUpdate.connect(self.sigUpdate)
             self._editor.sigDone.connect(self.releaseSelection)
         elif len(self._selection) == 1 and type(self._selection[0]) is sch.obj.text.TextObj:
-            self._editor = sch.obj.text.TextEditor(self._ctrl, self._selection[0])
+            self._editor = sch.tools.text.TextEditor(self._ctrl, self._selection[0])
             self._editor.sigUpdate.connect(self.sigUpdate)
             self._editor.sigDone.connect(self.releaseSelection)
         elif len(self._selection) == 1 and type(self._selection[0]) is sch.obj.part.PartObj:
-            self._editor = sch.obj.part.PartEditor(self._ctrl, self._selection[0])
+            self._editor = sch.tools.part.PartEditor(self._ctrl, self._selection[0])
+            self._editor.sigUpdate.connect(self.sigUpdate)
+            self._editor.sigDone.connect(self.releaseSelection)
+        elif len(self._selection) == 1 and type(self._selection[0]) is sch.obj.pin.PinObj:
+            self._editor = sch.tools.pin.PinEditor(self._ctrl, self._selection[0])
             self._editor.sigUpdate.connect(self.sigUpdate)
             self._editor.sigDone.connect(self.releaseSelection)
         elif len(self._selection) == 1 and type(self._selection[0]) is sch.obj.proptext.PropTextObj:
-            self._editor = sch.obj.proptext.PropTextEditor(self._ctrl, self._selection[0])
+            self._editor = sch.tools.proptext.PropTextEditor(self._ctrl, self._selection[0])
             self._editor.sigUpdate.connect(self.sigUpdate)
             self._editor.sigDone.connect(self.releaseSelection)
         self._ctrl.sigInspectorChanged.emit()
@@ -270,7 +356,7 @@ class EditHandle(QObject):
         self._moved = False
 
     def draw(self, painter: QPainter):
-        r = self._ctrl.view.hitRadius() * 0.7
+        r = self._ctrl.view.hitRadius() * 7 // 10
         x, y = self.pos.x(), self.pos.y()
         painter.drawRect(QRect(QPoint(x-r, y-r), QPoint(x+r, y+r)))
 
@@ -1,19 +1,270 @@
+import concurrent.futures
+import concurrent.futures.process
 import copy
+import hashlib
+import io
+import multiprocessing
+import os
+import pickle
+import re
+import stat
+import threading
+from enum import Enum
 from uuid import UUID, uuid4
 from PyQt5.QtCore import *
-from PyQt5.QtWidgets import QUndoStack, QUndoCommand
+from PyQt5.QtGui import QTransform
 from lxml import etree
 import sch.obj.line
 import sch.obj.net
 import sch.obj.text
 import sch.obj.part
+import sch.obj.pin
 import sch.obj.proptext
+import sch.journal
+import sch.binfmt
+import sch.project
+import sch.spatial
+from sch.undo import UndoStack, UndoCommand
+
+
+SCHEMA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "xml", "schschema.rng")
+_schema = None
+# lxml validators are not safe to share between threads
+_schemaLock = threading.Lock()
+
+
+class Validation(Enum):
+    strict = 0      # validate against the schema before building the document
+    deferred = 1    # validate on a background thread once the document is open
+    off = 2         # don't validate (trusted files, e.g. the part library)
+
+
+def schema():
+    """Returns the compiled RelaxNG schema; it is only read and compiled once per process."""
+    global _schema
+    with _schemaLock:
+        if _schema is None:
+            with open(SCHEMA_PATH, "rb") as f:
+                _schema = etree.RelaxNG(etree.parse(f))
+        return _schema
+
+
+def validate(doc):
+    rng = schema()
+    with _schemaLock:
+        rng.assertValid(doc)
+
+
+# helpers for the streaming writer; level is the nesting depth used for indentation
+def _newline(xf, level):
+    xf.write("\n" + "  " * level)
+
+
+def _writeObjs(xf, objs, level):
+    # objects still serialize themselves through toXml; each one is written out and
+    # dropped before the next is built, so only one object's subtree exists at a time
+    holder = etree.Element("objects")
+    for obj in objs:
+        obj.toXml(holder)
+        elem = holder[0]
+        etree.indent(elem, "  ", level=level)
+        _newline(xf, level)
+        xf.write(elem)
+        holder.clear()
+
+
+def _writePage(xf, level, name, objs):
+    with xf.element("page", name=name):
+        _newline(xf, level+1)
+        with xf.element("objects"):
+            _writeObjs(xf, objs, level+2)
+            _newline(xf, level+1)
+        _newline(xf, level)
+
+
+def _writeSymPart(xf, level, name, props, objs):
+    with xf.element("symPart", name=name):
+        _newline(xf, level+1)
+        with xf.element("props"):
+            for key, value in props.items():
+                _newline(xf, level+2)
+                with xf.element("prop", name=key):
+                    xf.write(value or "")
+            _newline(xf, level+1)
+        _newline(xf, level+1)
+        with xf.element("objects"):
+            _writeObjs(xf, objs, level+2)
+            _newline(xf, level+1)
+        _newline(xf, level)
+
+
+def _ownObjects(objs):
+    # property texts of pins (and parts) are written by their owner
+    return (obj for obj in objs if sch.journal.ownerOf(obj) is obj)
+
+
+def _copyObj(obj):
+    # much cheaper than copy.copy for plain objects; classes that need more define __copy__
+    cls = type(obj)
+    if hasattr(cls, "__copy__"):
+        return obj.__copy__()
+    c = cls.__new__(cls)
+    c.__dict__.update(obj.__dict__)
+    return c
+
+
+# markup that can hide a page tag, or the start / end tag of a page
+_PAGE_TAG = re.compile(rb'<!--.*?-->|<!\[CDATA\[.*?\]\]>|<[?!].*?>|<(/?)(page|symPart)(?=[\s/>])', re.S)
+_START_TAG_REST = re.compile(rb'(?:\s+[^\s=/>]+\s*=\s*(?:"[^"]*"|\'[^\']*\'))*\s*(/?)>')
+_END_TAG_REST = re.compile(rb'\s*>')
+_XML_DECL = re.compile(rb'<\?xml[^>]*encoding\s*=\s*["\']([^"\']*)')
+
+
+def scanPages(data):
+    """Finds the <page> and <symPart> elements in the bytes of a document without parsing it.
+
+    Returns a list of (start, contentStart, contentEnd, end) offsets, or None if the document
+    can't be split this way (an encoding other than UTF-8, or tags that don't pair up); such
+    documents have to go through the parser."""
+    decl = _XML_DECL.match(data)
+    if decl and decl.group(1).lower() not in (b"utf-8", b"utf8", b"us-ascii", b"ascii"):
+        return None
+    out = []
+    open_ = None
+    for m in _PAGE_TAG.finditer(data):
+        if m.group(2) is None:
+            continue    # comment, CDATA section, processing instruction or declaration
+        if m.group(1):
+            rest = _END_TAG_REST.match(data, m.end())
+            if open_ is None or rest is None or open_[1] != m.group(2):
+                return None
+            out.append((open_[0], open_[2], m.start(), rest.end()))
+            open_ = None
+        else:
+            rest = _START_TAG_REST.match(data, m.end())
+            if open_ is not None or rest is None:
+                return None
+            if rest.group(1):
+                out.append((m.start(), rest.end(), rest.end(), rest.end()))
+            else:
+                open_ = (m.start(), m.group(2), rest.end())
+    return out if open_ is None else None
+
+
+class XmlPageSource(object):
+    """The serialized <page> or <symPart> element of a page that hasn't been opened yet."""
+    def __init__(self, data):
+        self.data = data
+
+    def element(self):
+        return etree.fromstring(self.data)
+
+    def records(self):
+        return sch.binfmt.xmlPageRecords(self.element())
+
+    def digest(self):
+        return hashlib.blake2b(self.data, digest_size=16).digest()
+
+    def writeXml(self, xf, level, kind, name):
+        # parsed as it is written, one object at a time like _writeObjs
+        events = etree.iterparse(io.BytesIO(self.data), events=("start", "end"))
+        event, page = next(events)
+        with xf.element(page.tag, dict(page.attrib, name=name)):
+            for event, section in events:
+                if event == "end":
+                    break       # the page itself
+                _newline(xf, level+1)
+                with xf.element(section.tag, section.attrib):
+                    for event, elem in events:
+                        if elem is section:
+                            break
+                        if event == "end" and elem.getparent() is section:
+                            elem.tail = None
+                            etree.indent(elem, "  ", level=level+2)
+                            _newline(xf, level+2)
+                            xf.write(elem)
+                            elem.clear()
+                            while elem.getprevious() is not None:
+                                del section[0]
+                    _newline(xf, level+1)
+            _newline(xf, level)
+
+
+class BinaryPageSource(object):
+    """The page blob of a page of a binary document that hasn't been opened yet."""
+    def __init__(self, blob, strings):
+        self.blob = blob
+        self.strings = strings
+
+    def records(self):
+        return sch.binfmt.unpackPage(self.blob, self.strings)
+
+    def digest(self):
+        # string ids are only meaningful with the document's table
+        return recordsDigest(self.records())
+
+    def writeXml(self, xf, level, kind, name):
+        sch.binfmt.writeXmlPage(xf, level, kind, name, sch.binfmt.iterPage(self.blob, self.strings))
+
+
+def recordsDigest(recs):
+    return hashlib.blake2b(pickle.dumps(recs, protocol=pickle.HIGHEST_PROTOCOL), digest_size=16).digest()
+
+
+# what parsing a malformed page raises; reported as etree.DocumentInvalid, naming the page
+_PAGE_ERRORS = (KeyError, ValueError, etree.XMLSyntaxError)
+
+
+def _sourceRecords(source):
+    # runs in a loader worker process; records are plain tuples, cheap to send back
+    try:
+        return source.records()
+    except etree.XMLSyntaxError as e:
+        # lxml errors can't be pickled back to the main process
+        raise ValueError(str(e))
+
+
+def _createTemp(dirName, baseName):
+    # like mkstemp, but created 0666 less the umask, as a new file would be; reading the umask
+    # means setting it, which would change the mode of files other threads create meanwhile
+    while True:
+        tmp = os.path.join(dirName, ".{}.{}.tmp".format(baseName, uuid4().hex[:8]))
+        try:
+            return os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666), tmp
+        except FileExistsError:
+            continue
+
+
+def atomicWrite(file, write):
+    """Calls write(handle) on a temporary file next to file, then renames it over file."""
+    dirName, baseName = os.path.split(os.path.abspath(file))
+    fd, tmp = _createTemp(dirName, baseName)
+    h = os.fdopen(fd, "wb")
+    try:
+        with h:
+            # keep the permissions of the file being replaced
+            try:
+                os.chmod(tmp, stat.S_IMODE(os.stat(file).st_mode))
+            except FileNotFoundError:
+                pass
+            write(h)
+            h.flush()
+            os.fsync(h.fileno())
+        os.replace(tmp, file)
+    except BaseException:
+        os.unlink(tmp)
+        raise
 
 
 class MasterDocument(QObject):
     # indicates document structure has changed (NOT sub-documents; those have their own signals)
     sigChanged = pyqtSignal()
     sigCleanChanged = pyqtSignal()
+    # emitted (possibly from a worker thread) when deferred validation fails
+    sigValidationFailed = pyqtSignal(str)
+    # background save finished; argument is the file name or the error message
+    sigSaved = pyqtSignal(str)
+    sigSaveFailed = pyqtSignal(str)
 
     def __init__(self, lib):
         QObject.__init__(self)
@@ -23,6 +274,14 @@ class MasterDocument(QObject):
         self.lib = lib
         self.fileName = None
         self.symProps = {}
+        self._saveJob = None
+        # project directory last loaded or saved, and the file of each page in it
+        self._projectDir = None
+        self._projectFiles = {}
+        self._journal = None
+        self._replaying = False
+        # number of journaled edits replayed by the last loadFromFile
+        self.recoveredEdits = 0
 
     def name(self):
         if self.fileName is not None:
@@ -53,6 +312,7 @@ class MasterDocument(QObject):
         newp.sigChanged.connect(self.sigCleanChanged)
         newp.name = self._uniqueName(symNames, "symbol")
         self._symbols.append(newp)
+        self._journalRecord(["newsym", newp.name])
         self.sigChanged.emit()
 
     def appendNewPage(self):
@@ -61,6 +321,7 @@ class MasterDocument(QObject):
         newp.sigChanged.connect(self.sigCleanChanged)
         newp.name = self._uniqueName(pageNames, "Page")
         self._pages.append(newp)
+        self._journalRecord(["newpage", newp.name])
         self.sigChanged.emit()
 
     def isModified(self):
@@ -69,50 +330,349 @@ class MasterDocument(QObject):
                 return True
         return False
 
-    def loadFromFile(self, file=None):
+    # allowed child elements for each container element handled by the streaming loader;
+    # anything below "objects" belongs to an object and is checked by its fromXml
+    _STRUCTURE = {
+        "": {"xSchematic"},
+        "xSchematic": {"props", "symbol", "pages"},
+        "xSchematic/props": {"uuid", "prop"},
+        "xSchematic/symbol": {"props", "symPart"},
+        "xSchematic/symbol/props": {"prop", "pinMap"},
+        "xSchematic/symbol/symPart": {"props", "objects"},
+        "xSchematic/symbol/symPart/props": {"prop"},
+        "xSchematic/symbol/symPart/objects": {"line", "text", "proptext", "pin"},
+        "xSchematic/pages": {"page"},
+        "xSchematic/pages/page": {"objects"},
+        "xSchematic/pages/page/objects": {"line", "text", "part", "net"},
+    }
+
+    def _journalRecord(self, rec):
+        if self._journal is not None and not self._replaying:
+            self._journal.append(rec)
+
+    def _pageKey(self, page):
+        if page in self._symbols:
+            return ["s", self._symbols.index(page)]
+        elif page in self._pages:
+            return ["p", self._pages.index(page)]
+        return None
+
+    def journalPage(self, page, op):
+        if self._journal is None or self._replaying:
+            return
+        key = self._pageKey(page)
+        if key is not None:
+            self._journal.append(op[:1] + key + op[1:])
+
+    def journalCommand(self, page, cmd, undone=False):
+        if self._journal is None or self._replaying:
+            return
+        for op in sch.journal.commandOps(cmd, undone):
+            self.journalPage(page, op)
+
+    def _startJournal(self, file, keep=()):
+        if self._journal is not None and self._journal.path != sch.journal.Journal(file).path:
+            # edits up to now are saved under the new name
+            self._journal.remove()
+        self._journal = sch.journal.Journal(file)
+        self._journal.start(sch.journal.fileStamp(file), keep)
+
+    def discardJournal(self):
+        if self._journal is not None:
+            self._journal.remove()
+            self._journal = None
+
+    def _recover(self):
+        # replays edits journaled since the last full save on top of the loaded file;
+        # they go through the undo stacks, so the document shows as modified
+        j = sch.journal.Journal(self.fileName)
+        records = j.read(sch.journal.fileStamp(self.fileName))
+        self._replaying = True
+        try:
+            byXml = {}
+            for rec in records:
+                self._replayRecord(rec, byXml)
+        finally:
+            self._replaying = False
+        self._startJournal(self.fileName, records)
+        self.recoveredEdits = len(records)
+
+    def _replayRecord(self, rec, byXml):
+        op = rec[0]
+        if op == "newsym":
+            self.appendNewSymbol()
+            self._symbols[-1].name = rec[1]
+            return
+        elif op == "newpage":
+            self.appendNewPage()
+            self._pages[-1].name = rec[1]
+            return
+        page = (self._symbols if rec[1] == "s" else self._pages)[rec[2]]
+        if op == "rename":
+            page.name = rec[3]
+            return
+        if page not in byXml:
+            byXml[page] = {}
+            for obj in page.objects():
+                if sch.journal.ownerOf(obj) is obj:
+                    byXml[page].setdefault(sch.journal.objXml(obj), []).append(obj)
+        index = byXml[page]
+        cmd = UndoCommand()
+        if op in ("del", "chg"):
+            obj = index[rec[3]].pop()
+            for o in [obj] + [c for c in getattr(obj, "children", list)() if page.hasObject(c)]:
+                ObjDelCmd(o, doc=page, parent=cmd)
+        if op in ("add", "chg"):
+            xml = rec[-1]
+            objs = page.objsFromXml(etree.fromstring(xml))
+            index.setdefault(xml, []).append(objs[0])
+            for o in objs:
+                ObjAddCmd(o, doc=page, parent=cmd)
+        page.doCommand(cmd)
+
+    def loadFromFile(self, file=None, validation=Validation.strict, lazy=True, workers=None, recover=True):
+        """Loads the document; pages are parsed when first used unless lazy is False,
+        in which case they are all parsed up front (see loadPages).
+
+        Unless recover is False, edits journaled since the file was last saved are replayed and
+        further edits are journaled."""
         if file is None:
             file = self.fileName
-        with open("xml/schschema.rng", "rb") as f:
-            rngdoc = etree.parse(f)
-        rng = etree.RelaxNG(rngdoc)
-        with open(file, "rb") as f:
-            doc = etree.parse(f)
-        rng.assertValid(doc)
-        root = doc.getroot()
-        for child in root:
-            if child.tag == "props":
-                uuid = child.find("uuid")
-                self._uuid = UUID(uuid.text)
-            elif child.tag == "symbol":
-                for obj in child:
-                    if obj.tag == "symPart":
-                        newp = SymbolPage(self)
-                        newp.fromXml(obj)
-                        newp.sigChanged.connect(self.sigCleanChanged)
-                        self._symbols.append(newp)
-                    elif obj.tag == "props":
-                        for pr in obj:
-                            if pr.tag == 'prop':
-                                self.symProps[pr.attrib['name']] = pr.text
-            elif child.tag == "pages":
-                for pg in child:
-                    newp = DocPage(self)
-                    newp.fromXml(pg)
-                    newp.sigChanged.connect(self.sigCleanChanged)
-                    self._pages.append(newp)
+        projectDir = sch.project.projectDir(file)
+        binary = False
+        if projectDir is not None:
+            # page files are loaded like the pages of a single file, and checked the same way:
+            # the schema is applied to the document they make up together
+            file = os.path.normpath(projectDir)
+            if validation == Validation.strict:
+                validate(sch.project.documentTree(file))
+            elif validation == Validation.deferred:
+                threading.Thread(target=self._validateDeferred, args=(file,), daemon=True).start()
+            self._projectLoad(file)
+        else:
+            with open(file, "rb") as f:
+                binary = sch.binfmt.isBinaryFile(f)
+                if binary:
+                    # no schema applies; the record layouts fix the structure
+                    self._binaryLoad(f)
+        if projectDir is None and not binary:
+            if validation == Validation.strict:
+                # the schema can only check a complete tree; drop it before building objects
+                # so the tree and the object graph are never in memory at the same time
+                with open(file, "rb") as f:
+                    validate(etree.parse(f))
+            elif validation == Validation.deferred:
+                threading.Thread(target=self._validateDeferred, args=(file,), daemon=True).start()
+            with open(file, "rb") as f:
+                data = f.read()
+            pages = scanPages(data)
+            if pages is None:
+                self._streamLoad(io.BytesIO(data))
+            else:
+                # parse everything but the pages now; each page keeps its own bytes until opened
+                skeleton = []
+                pos = 0
+                for start, contentStart, contentEnd, end in pages:
+                    # the lines of the page are left blank, so errors still give the line in the file
+                    skeleton += [data[pos:contentStart], b"\n" * data.count(b"\n", contentStart, contentEnd)]
+                    pos = contentEnd
+                skeleton.append(data[pos:])
+                self._streamLoad(io.BytesIO(b"".join(skeleton)),
+                                 (XmlPageSource(data[start:end]) for start, _, _, end in pages))
+            del data
+        if not lazy:
+            self.loadPages(workers=workers)
         self.fileName = file
+        if recover:
+            self._recover()
         self.sigChanged.emit()
 
+    def _streamLoad(self, f, sources=None):
+        # builds objects as their elements are completed, then discards the elements;
+        # with sources (one per page element, in document order) the pages are left unparsed
+        # path holds the slash-joined element path of every open element, root first
+        path = [""]
+        page = None
+        for event, elem in etree.iterparse(f, events=("start", "end")):
+            if event == "start":
+                parent = path[-1]
+                if parent in self._STRUCTURE and elem.tag not in self._STRUCTURE[parent]:
+                    raise etree.DocumentInvalid("unexpected element <{}> in <{}>, line {}".format(
+                        elem.tag, parent.rpartition("/")[2], elem.sourceline))
+                path.append(parent + "/" + elem.tag if parent else elem.tag)
+                if elem.tag == "symPart" and parent == "xSchematic/symbol":
+                    page = SymbolPage(self)
+                elif elem.tag == "page" and parent == "xSchematic/pages":
+                    page = DocPage(self)
+                continue
+            path.pop()
+            parent = path[-1]
+            try:
+                if parent == "xSchematic/pages/page/objects" or parent == "xSchematic/symbol/symPart/objects":
+                    page.addXmlObj(elem)
+                elif parent == "xSchematic/props" and elem.tag == "uuid":
+                    self._uuid = UUID(elem.text)
+                elif parent == "xSchematic/symbol/props" and elem.tag == "prop":
+                    self.symProps[elem.attrib['name']] = elem.text
+                elif parent == "xSchematic/symbol/symPart/props":
+                    page.setProp(elem.attrib['name'], elem.text)
+                elif elem.tag == "symPart" and parent == "xSchematic/symbol" \
+                        or elem.tag == "page" and parent == "xSchematic/pages":
+                    page._name = elem.attrib["name"]
+                    if sources is not None:
+                        page._source = next(sources)
+                    page.sigChanged.connect(self.sigCleanChanged)
+                    (self._symbols if elem.tag == "symPart" else self._pages).append(page)
+                    page = None
+                else:
+                    continue
+            except (KeyError, ValueError) as e:
+                raise etree.DocumentInvalid("invalid <{}> element, line {}: {}".format(
+                    elem.tag, elem.sourceline, e))
+            # release the processed element and any siblings already handled before it
+            elem.clear()
+            while elem.getprevious() is not None:
+                del elem.getparent()[0]
+
+    def loadPages(self, pages=None, workers=None):
+        """Parses all (or the given) pages that aren't loaded yet.
+
+        Pages are parsed into records on up to workers processes (default: one per core) while
+        the main process builds their objects, page by page in document order, exactly as
+        loading them one at a time would."""
+        if pages is None:
+            pages = self._symbols + self._pages
+        pending = [p for p in pages if not p.isLoaded()]
+        if workers is None:
+            workers = os.cpu_count() or 1
+        # binary pages decode faster than they could be shipped to another process
+        workers = min(workers, sum(type(p._source) is XmlPageSource for p in pending))
+        if workers <= 1:
+            for page in pending:
+                page._ensureLoaded()
+            return
+        # spawn rather than fork: forking a process that runs Qt threads is not safe
+        ctx = multiprocessing.get_context("spawn")
+        with concurrent.futures.ProcessPoolExecutor(workers, mp_context=ctx) as pool:
+            results = pool.map(_sourceRecords, [p._source for p in pending])
+            for page in pending:
+                try:
+                    recs = next(results)
+                except _PAGE_ERRORS as e:
+                    raise etree.DocumentInvalid("invalid page {}: {}".format(page.name, e))
+                except concurrent.futures.process.BrokenProcessPool as e:
+                    raise RuntimeError("loading page {} failed: {}".format(page.name, e))
+                page._loadRecords(recs)
+
+    def _binaryLoad(self, f):
+        reader = sch.binfmt.BinaryReader(f)
+        self._uuid = reader.doc.uuid
+        self.symProps.update(reader.doc.symProps)
+        for i, (kind, name, offset, size) in enumerate(reader.pageTable):
+            page = SymbolPage(self) if kind == sch.binfmt.PAGE_SYMBOL else DocPage(self)
+            page._name = name
+            page._source = BinaryPageSource(reader.pageBlob(i), reader.strings)
+            page.sigChanged.connect(self.sigCleanChanged)
+            (self._symbols if kind == sch.binfmt.PAGE_SYMBOL else self._pages).append(page)
+
+    def _projectLoad(self, dirName):
+        m = sch.project.readManifest(dirName)
+        self._uuid = m.uuid
+        self.symProps.update(m.symProps)
+        for pageType, entries in ((SymbolPage, m.symbols), (DocPage, m.pages)):
+            for name, rel in entries:
+                page = pageType(self)
+                page._name = name
+                with open(os.path.join(dirName, rel), "rb") as f:
+                    page._source = XmlPageSource(f.read())
+                page.sigChanged.connect(self.sigCleanChanged)
+                (self._symbols if pageType is SymbolPage else self._pages).append(page)
+                self._projectFiles[page] = rel
+        self._projectDir = dirName
+
+    def _validateDeferred(self, file):
+        try:
+            if os.path.isdir(file):
+                tree = sch.project.documentTree(file)
+            else:
+                with open(file, "rb") as f:
+                    tree = etree.parse(f)
+            validate(tree)
+        except (etree.DocumentInvalid, etree.XMLSyntaxError, OSError) as e:
+            self.sigValidationFailed.emit(str(e))
+
     def saveToFile(self, file=None):
         if file is None:
             file = self.fileName
-        root = etree.Element("xSchematic")
-        self.toXml(root)
-        with open(file, "wb") as h:
-            h.write(etree.tostring(root, pretty_print=True))
+        if sch.project.isProjectName(file):
+            file = os.path.normpath(file)
+            snapshot = DocSnapshot(self, copyObjs=False, projectDir=file)
+            snapshot.writeProject(file)
+        else:
+            snapshot = None
+            atomicWrite(file, self.writeBinary if sch.binfmt.isBinaryName(file) else self.writeXml)
         for d in self._symbols+self._pages:
             d.undoStack.setClean()
+        self._setSaved(file, snapshot)
+        # the journal is compacted: everything in it is now in the file
+        self._startJournal(file)
+
+    def _setSaved(self, file, snapshot):
         self.fileName = file
+        # saving anywhere else ends the association with a project: the clean state of the
+        # undo stacks no longer says whether a page matches its project file
+        self._projectDir = file if snapshot is not None and sch.project.isProjectName(file) else None
+        self._projectFiles = snapshot.projectFiles if self._projectDir is not None else {}
+
+    def writeXml(self, h):
+        """Serializes the document to the file handle h page by page, without building a tree."""
+        DocSnapshot(self, copyObjs=False).writeXml(h)
+
+    def writeBinary(self, h):
+        DocSnapshot(self, copyObjs=False).writeBinary(h)
+
+    def snapshot(self):
+        return DocSnapshot(self)
+
+    def isSaving(self):
+        return self._saveJob is not None
+
+    def waitForSave(self):
+        if self._saveJob is not None:
+            self._saveJob.wait()
+            self._saveFinished()
+
+    def saveInBackground(self, file=None):
+        """Saves a snapshot of the document on a worker thread; returns the running SaveJob.
+
+        sigSaved or sigSaveFailed is emitted when the job is done."""
+        if file is None:
+            file = self.fileName
+        if sch.project.isProjectName(file):
+            file = os.path.normpath(file)
+            job = SaveJob(DocSnapshot(self, projectDir=file), file)
+        else:
+            job = SaveJob(self.snapshot(), file)
+        job.finished.connect(self._saveFinished)
+        self._saveJob = job
+        job.start()
+        return job
+
+    @pyqtSlot()
+    def _saveFinished(self):
+        job = self._saveJob
+        if job is None:
+            return      # already handled by waitForSave
+        self._saveJob = None
+        if not job.done:
+            self.sigSaveFailed.emit(job.error or "save did not finish")
+            return
+        job.snapshot.markClean()
+        self._setSaved(job.file, job.snapshot)
+        # compact the journal down to the edits made while the save was running
+        keep = self._journal.recordsSince(job.snapshot.journalMark) if self._journal is not None else []
+        self._startJournal(job.file, keep)
+        self.sigSaved.emit(job.file)
 
     def toXml(self, parentNode):
         props = etree.SubElement(parentNode, "props")
@@ -121,6 +681,9 @@ class MasterDocument(QObject):
         if self._symbols:
             sym = etree.SubElement(parentNode, "symbol")
             symProps = etree.SubElement(sym, "props")
+            for key, value in self.symProps.items():
+                pp = etree.SubElement(symProps, "prop", name=key)
+                pp.text = value
             for s in self._symbols:
                 s.toXml(sym)
         if self._pages:
@@ -129,15 +692,212 @@ class MasterDocument(QObject):
                 p.toXml(pages)
 
 
+class DocSnapshot(object):
+    """Contents of a MasterDocument frozen at one point in time.
+
+    With copyObjs (the default) every object is copied, so the snapshot can be serialized
+    on a worker thread while the document keeps being edited.  When it is going to be written
+    to projectDir, pages already saved there and unmodified since are left out."""
+    def __init__(self, doc: MasterDocument, copyObjs=True, projectDir=None):
+        cp = _copyObj if copyObjs else (lambda obj: obj)
+        self.uuid = doc._uuid
+        self.symProps = dict(doc.symProps)
+        if projectDir is not None and doc._projectDir is not None \
+                and os.path.abspath(projectDir) == os.path.abspath(doc._projectDir):
+            # page -> file within the project
+            self.projectFiles = dict(doc._projectFiles)
+        else:
+            self.projectFiles = {}
+        self._unchanged = {d for d in doc.symbols + doc.pages
+                           if d in self.projectFiles and not d.isModified()}
+        # pages that were never opened are written straight from their source
+        self.symbols = tuple((s.name, dict(s._pageProps),
+                              () if s in self._unchanged else tuple(cp(obj) for obj in _ownObjects(s._objs)), s._source)
+                             for s in doc.symbols)
+        # part property texts are written by their part
+        self.pages = tuple((p.name, () if p in self._unchanged else
+                            tuple(cp(obj) for obj in p._objs if type(obj) is not sch.obj.proptext.PropTextObj),
+                            p._source)
+                           for p in doc.pages)
+        # (page, undo index, last command applied) at the time of the snapshot
+        self._undoIndex = tuple((d, d.undoStack.index(), d.undoStack.command(d.undoStack.index() - 1))
+                                for d in doc.symbols + doc.pages)
+        self.journalMark = doc._journal.count if doc._journal is not None else 0
+
+    def writeXml(self, h, progress=None):
+        """Writes the snapshot to h; progress(done, total) is called after each page."""
+        total = len(self.symbols) + len(self.pages)
+        done = 0
+        with etree.xmlfile(h) as xf:
+            with xf.element("xSchematic"):
+                _newline(xf, 1)
+                with xf.element("props"):
+                    _newline(xf, 2)
+                    with xf.element("uuid"):
+                        xf.write(str(self.uuid))
+                    _newline(xf, 1)
+                if self.symbols:
+                    _newline(xf, 1)
+                    with xf.element("symbol"):
+                        _newline(xf, 2)
+                        with xf.element("props"):
+                            for key, value in self.symProps.items():
+                                _newline(xf, 3)
+                                with xf.element("prop", name=key):
+                                    xf.write(value or "")
+                            _newline(xf, 2)
+                        for name, props, objs, source in self.symbols:
+                            _newline(xf, 2)
+                            if source is not None:
+                                source.writeXml(xf, 2, sch.binfmt.PAGE_SYMBOL, name)
+                            else:
+                                _writeSymPart(xf, 2, name, props, objs)
+                            done += 1
+                            if progress:
+                                progress(done, total)
+                        _newline(xf, 1)
+                if self.pages:
+                    _newline(xf, 1)
+                    with xf.element("pages"):
+                        for name, objs, source in self.pages:
+                            _newline(xf, 2)
+                            if source is not None:
+                                source.writeXml(xf, 2, sch.binfmt.PAGE_SCHEMATIC, name)
+                            else:
+                                _writePage(xf, 2, name, objs)
+                            done += 1
+                            if progress:
+                                progress(done, total)
+                        _newline(xf, 1)
+                _newline(xf, 0)
+        h.write(b"\n")
+
+    def _entries(self):
+        # (kind, name, props, objs, source, page) for every symbol part and page
+        pages = [(sch.binfmt.PAGE_SYMBOL, name, props, objs, source) for name, props, objs, source in self.symbols]
+        pages += [(sch.binfmt.PAGE_SCHEMATIC, name, {}, objs, source) for name, objs, source in self.pages]
+        return [entry + (page,) for entry, (page, index, cmd) in zip(pages, self._undoIndex)]
+
+    def writeBinary(self, h, progress=None):
+        """Writes the snapshot to h in the binary format (see sch.binfmt)."""
+        total = len(self.symbols) + len(self.pages)
+        w = sch.binfmt.BinaryWriter(h)
+        doc = sch.binfmt.DocRecords()
+        doc.uuid = self.uuid
+        doc.symProps = [(key, value or "") for key, value in self.symProps.items()]
+        doc.hasSymbol = bool(self.symbols)
+        doc.hasPages = bool(self.pages)
+        for done, (kind, name, props, objs, source, page) in enumerate(self._entries(), 1):
+            if source is not None:
+                recs = source.records()
+            else:
+                recs = sch.binfmt.objectRecords(objs)
+                recs["prop"] += [(sch.binfmt.OWNER_PAGE, 0, key, value or "") for key, value in props.items()]
+            w.writePage(kind, name, recs)
+            if progress:
+                progress(done, total)
+        w.finish(doc)
+
+    def writeProject(self, dirName, progress=None):
+        """Writes the snapshot as a project directory (see sch.project).
+
+        Only pages that changed, or aren't in the project yet, get their file rewritten; the
+        manifest always is.  projectFiles is updated to the files of the written project."""
+        for sub in (sch.project.SYMBOL_DIR, sch.project.PAGE_DIR):
+            os.makedirs(os.path.join(dirName, sub), exist_ok=True)
+        entries = self._entries()
+        m = sch.project.Manifest()
+        m.uuid = self.uuid
+        m.symProps = list(self.symProps.items())
+        files = {}
+        used = set(self.projectFiles.values())
+        for done, (kind, name, props, objs, source, page) in enumerate(entries, 1):
+            rel = self.projectFiles.get(page)
+            if rel is None:
+                sub = sch.project.SYMBOL_DIR if kind == sch.binfmt.PAGE_SYMBOL else sch.project.PAGE_DIR
+                rel = sch.project.newFile(dirName, sub, used)
+                used.add(rel)
+            if page not in self._unchanged:
+                atomicWrite(os.path.join(dirName, rel),
+                            lambda h: self._writePageFile(h, kind, name, props, objs, source))
+            files[page] = rel
+            (m.symbols if kind == sch.binfmt.PAGE_SYMBOL else m.pages).append((name, rel))
+            if progress:
+                progress(done, len(entries))
+        atomicWrite(sch.project.manifestPath(dirName), lambda h: sch.project.writeManifest(h, m))
+        sch.project.removeStale(dirName, set(files.values()))
+        self.projectFiles = files
+
+    @staticmethod
+    def _writePageFile(h, kind, name, props, objs, source):
+        with etree.xmlfile(h) as xf:
+            if source is not None:
+                source.writeXml(xf, 0, kind, name)
+            elif kind == sch.binfmt.PAGE_SYMBOL:
+                _writeSymPart(xf, 0, name, props, objs)
+            else:
+                _writePage(xf, 0, name, objs)
+        h.write(b"\n")
+
+    def markClean(self):
+        # the snapshotted state of each page is what was written; it can still be reached
+        # by undo / redo unless the commands leading to it have been replaced since
+        for page, index, cmd in self._undoIndex:
+            if page.undoStack.command(index - 1) is cmd:
+                page.undoStack.setClean(index)
+            else:
+                page.undoStack.setClean(-1)
+
+
+class SaveJob(QThread):
+    """Writes a DocSnapshot to disk atomically on a worker thread."""
+    # pages written so far, total pages
+    sigProgress = pyqtSignal(int, int)
+
+    def __init__(self, snapshot: DocSnapshot, file):
+        super().__init__()
+        self.snapshot = snapshot
+        self.file = file
+        self.error = None
+        # set once the whole snapshot has been written
+        self.done = False
+
+    def run(self):
+        try:
+            if sch.project.isProjectName(self.file):
+                self.snapshot.writeProject(self.file, self.sigProgress.emit)
+            else:
+                write = self.snapshot.writeBinary if sch.binfmt.isBinaryName(self.file) else self.snapshot.writeXml
+                atomicWrite(self.file, lambda h: write(h, self.sigProgress.emit))
+            self.done = True
+        except Exception as e:
+            # anything escaping run() would abort the process
+            self.error = str(e) or type(e).__name__
+
+
 class AbstractPage(QObject):
     sigChanged = pyqtSignal()
+    # area (in document coordinates) where the drawing of the page changed; only emitted
+    # once the spatial index has been built, i.e. the page has been drawn
+    sigDamaged = pyqtSignal(QRect)
 
     def __init__(self, parent: MasterDocument):
         super().__init__()
         self._objs = set()
+        # unparsed contents (XmlPageSource / BinaryPageSource) of a page that hasn't been opened yet
+        self._source = None
         self._parent = parent
-        self.undoStack = QUndoStack()
+        self.undoStack = UndoStack()
         self._name = "untitled"
+        # sch.spatial.GridIndex of the objects, built on first use
+        self._spatial = None
+        # (x, y) -> number of nets ending there; built on first use, like the spatial index
+        self._netEnds = None
+        # net -> the points it is counted at
+        self._netEndPoints = {}
+        # symbol edits change the boxes (and pins) of the parts placed from them
+        if parent.lib is not None:
+            parent.lib.sigSymbolChanged.connect(self._symbolChanged)
 
     @property
     def name(self):
@@ -146,21 +906,70 @@ class AbstractPage(QObject):
     @name.setter
     def name(self, n):
         self._name = n
+        self._parent.journalPage(self, ["rename", n])
         self.sigChanged.emit()
 
     @property
     def parentDoc(self):
         return self._parent
 
+    def isLoaded(self):
+        return self._source is None
+
+    def _ensureLoaded(self):
+        # builds the objects of a lazily loaded page on first access
+        if self._source is not None:
+            self._loadRecords(self.records())
+
+    def records(self):
+        """Returns the contents of the page as sch.binfmt records.  A page that isn't loaded is
+        parsed, but stays unloaded: no objects are built for it."""
+        if self._source is not None:
+            try:
+                return self._source.records()
+            except _PAGE_ERRORS as e:
+                raise etree.DocumentInvalid("invalid page {}: {}".format(self.name, e))
+        return self._objectRecords()
+
+    def _objectRecords(self):
+        raise NotImplementedError()
+
+    def revision(self):
+        """A token that changes whenever the contents of the page may have changed."""
+        index = self.undoStack.index()
+        return self._source, index, self.undoStack.command(index - 1)
+
+    def digest(self):
+        """Hash of the contents of the page.  An unloaded page hashes its source, so the hash
+        changes once when the page is loaded."""
+        if self._source is not None:
+            return self._source.digest()
+        return recordsDigest(self._objectRecords())
+
+    def _loadRecords(self, recs):
+        # the source goes first: building the objects goes through the page's own accessors
+        self._source = None
+        self._objs.update(sch.binfmt.buildObjects(self, recs))
+
     def isModified(self):
         return not self.undoStack.isClean()
 
     def doCommand(self, cmd):
         cmd.doc = self
         self.undoStack.push(cmd)
+        self._parent.journalCommand(self, cmd)
+        self._commandApplied(cmd)
         self.sigChanged.emit()
 
+    def _commandApplied(self, cmd):
+        # called after cmd was done, undone or redone, before sigChanged
+        if isinstance(cmd, ObjChangeCmd) and cmd._obj in self._objs:
+            self._objChanged(cmd._obj)
+        for i in range(cmd.childCount()):
+            self._commandApplied(cmd.child(i))
+
     def objects(self, objType=None, exclude=None):
+        self._ensureLoaded()
         if not objType and not exclude:
             return set(self._objs)
         if exclude is None:
@@ -171,59 +980,241 @@ class AbstractPage(QObject):
             return {obj for obj in self._objs if not (type(obj) in exclude)}
 
     def hasObject(self, obj):
+        # an unloaded page has no objects anyone could hold
         return obj in self._objs
 
+    def _validSpatial(self):
+        self._ensureLoaded()
+        if self._spatial is None:
+            self._spatial = sch.spatial.GridIndex()
+            for obj in self._objs:
+                self._spatial.insert(obj, obj.bbox())
+        return self._spatial
+
+    def objectsInView(self, rect: QRect):
+        """Yields the objects that may show within rect: those whose box overlaps it.  The page
+        must not change while they are gone through."""
+        return self._validSpatial().iterQuery(rect)
+
     def findObjsInRect(self, rect: QRect, objType=None):
-        return {obj for obj in self.objects(objType) if rect.intersects(obj.bbox())}
+        return {obj for obj in self._validSpatial().query(rect)
+                if (not objType or type(obj) is objType) and rect.intersects(obj.bbox())}
 
     def findObjsNear(self, pt: QPoint, dist=1, objType=None):
-        hitRect = QRect(pt.x()-dist/2, pt.y()-dist/2, dist, dist)
+        hitRect = QRect(pt.x()-dist//2, pt.y()-dist//2, dist, dist)
         return {obj for obj in self.findObjsInRect(hitRect, objType) if obj.testHit(pt, dist)}
 
+    def pinsAt(self, pt: QPoint):
+        """Returns the (part, pin id) of the part pins at pt."""
+        return []
+
+    def _validNetEnds(self):
+        self._ensureLoaded()
+        if self._netEnds is None:
+            self._netEnds = {}
+            self._netEndPoints = {}
+            for obj in self._objs:
+                if type(obj) is sch.obj.net.NetObj:
+                    self._indexNet(obj)
+        return self._netEnds
+
+    def _indexNet(self, net):
+        pts = {(net.pt1.x(), net.pt1.y()), (net.pt2.x(), net.pt2.y())}
+        for pt in pts:
+            self._netEnds[pt] = self._netEnds.get(pt, 0) + 1
+        self._netEndPoints[net] = pts
+
+    def _unindexNet(self, net):
+        for pt in self._netEndPoints.pop(net, ()):
+            n = self._netEnds[pt] - 1
+            if n:
+                self._netEnds[pt] = n
+            else:
+                del self._netEnds[pt]
+
+    def junctions(self, rect: QRect = None):
+        """Returns the points where a junction is drawn: where two or more nets end, and at
+        least three nets and part pins meet.  With rect, only those of the nets in rect."""
+        ends = self._validNetEnds()
+        nets = self.objects(objType=sch.obj.net.NetObj) if rect is None else \
+            self.findObjsInRect(rect, objType=sch.obj.net.NetObj)
+        pts = set()
+        for net in nets:
+            for pt in self._netEndPoints[net]:
+                n = ends[pt]
+                if n > 2 or (n == 2 and self.pinsAt(QPoint(*pt))):
+                    pts.add(pt)
+        return [QPoint(*pt) for pt in pts]
+
     def addObj(self, obj):
+        self._ensureLoaded()
         self._objs.add(obj)
+        self._objAdded(obj)
         self.sigChanged.emit()
 
     def removeObj(self, obj):
+        self._ensureLoaded()
         self._objs.remove(obj)
+        self._objRemoved(obj)
         self.sigChanged.emit()
 
+    def _objAdded(self, obj):
+        if self._netEnds is not None and type(obj) is sch.obj.net.NetObj:
+            self._indexNet(obj)
+        if self._spatial is not None:
+            box = obj.bbox()
+            self._spatial.insert(obj, box)
+            self.sigDamaged.emit(box)
+
+    def _objRemoved(self, obj):
+        if self._netEnds is not None and type(obj) is sch.obj.net.NetObj:
+            self._unindexNet(obj)
+        if self._spatial is not None:
+            box = self._spatial.box(obj)
+            self._spatial.remove(obj)
+            if box is not None:
+                self.sigDamaged.emit(box)
+
+    def _objChanged(self, obj):
+        if self._netEnds is not None and type(obj) is sch.obj.net.NetObj:
+            self._unindexNet(obj)
+            self._indexNet(obj)
+        # obj was changed in place; so may its property texts have been
+        if self._spatial is not None:
+            for o in [obj] + list(getattr(obj, "children", list)()):
+                if o in self._objs:
+                    old = self._spatial.box(o)
+                    box = o.bbox()
+                    self._spatial.insert(o, box)
+                    if old is not None and old != box:
+                        self.sigDamaged.emit(old)
+                    self.sigDamaged.emit(box)
+
+    @pyqtSlot('PyQt_PyObject')
+    def _symbolChanged(self, insts):
+        # the library has given insts their new master; only those on this page are indexed again
+        for inst in insts:
+            if inst in self._objs:
+                self._objChanged(inst)
+
     @pyqtSlot()
     def undo(self):
-        self.undoStack.undo()
+        if self.undoStack.canUndo():
+            cmd = self.undoStack.command(self.undoStack.index()-1)
+            self.undoStack.undo()
+            self._parent.journalCommand(self, cmd, undone=True)
+            self._commandApplied(cmd)
         self.sigChanged.emit()
 
     @pyqtSlot()
     def redo(self):
-        self.undoStack.redo()
+        if self.undoStack.canRedo():
+            cmd = self.undoStack.command(self.undoStack.index())
+            self.undoStack.redo()
+            self._parent.journalCommand(self, cmd)
+            self._commandApplied(cmd)
         self.sigChanged.emit()
 
     def fromXml(self, pageNode):
         raise NotImplementedError()
 
+    def addXmlObj(self, obj):
+        self._objs.update(self.objsFromXml(obj))
+
+    def objsFromXml(self, obj):
+        """Returns the objects built from an object element: the object, then its children."""
+        raise NotImplementedError()
+
     def toXml(self, parentNode):
         raise NotImplementedError()
 
+    def writeXml(self, xf, level):
+        raise NotImplementedError()
+
 
 class DocPage(AbstractPage):
     def __init__(self, parent: MasterDocument):
         super().__init__(parent)
         self._name = "Page1"
+        # (x, y) -> [(part, pin id)] of every part pin on the page; built on first use
+        self._pinIndex = None
+        # part -> the points it is indexed under
+        self._pinPoints = {}
+
+    def _buildPinIndex(self):
+        self._pinIndex = {}
+        self._pinPoints = {}
+        for obj in self.objects(objType=sch.obj.part.PartObj):
+            self._indexPins(obj)
+
+    def _indexPins(self, part):
+        pts = []
+        for pinId, pos in part.pins():
+            pt = (pos.x(), pos.y())
+            self._pinIndex.setdefault(pt, []).append((part, pinId))
+            pts.append(pt)
+        self._pinPoints[part] = pts
+
+    def _unindexPins(self, part):
+        for pt in self._pinPoints.pop(part, ()):
+            pins = [pin for pin in self._pinIndex[pt] if pin[0] is not part]
+            if pins:
+                self._pinIndex[pt] = pins
+            else:
+                del self._pinIndex[pt]
+
+    def _validPinIndex(self):
+        # parts of an edited symbol have their pins indexed again by _symbolChanged
+        if self._pinIndex is None:
+            self._buildPinIndex()
+        return self._pinIndex
+
+    def pinsAt(self, pt: QPoint):
+        return list(self._validPinIndex().get((pt.x(), pt.y()), ()))
+
+    def netPins(self, net):
+        """Returns the (part, pin id) of the part pins at either end of net."""
+        index = self._validPinIndex()
+        return index.get((net.pt1.x(), net.pt1.y()), []) + index.get((net.pt2.x(), net.pt2.y()), [])
+
+    def _objAdded(self, obj):
+        super()._objAdded(obj)
+        if self._pinIndex is not None and type(obj) is sch.obj.part.PartObj:
+            self._indexPins(obj)
+
+    def _objRemoved(self, obj):
+        super()._objRemoved(obj)
+        if self._pinIndex is not None and type(obj) is sch.obj.part.PartObj:
+            self._unindexPins(obj)
+
+    def _objChanged(self, obj):
+        # parts may have been moved, rotated or given another master
+        super()._objChanged(obj)
+        if self._pinIndex is not None and type(obj) is sch.obj.part.PartObj:
+            self._unindexPins(obj)
+            self._indexPins(obj)
 
     def fromXml(self, pageNode):
         self._name = pageNode.attrib["name"]
         objs = pageNode.find("objects")
         for obj in objs:
-            if obj.tag == "line":
-                self._objs.add(sch.obj.line.LineObj.fromXml(obj))
-            elif obj.tag == "net":
-                self._objs.add(sch.obj.net.NetObj.fromXml(obj))
-            elif obj.tag == "text":
-                self._objs.add(sch.obj.text.TextObj.fromXml(obj))
-            elif obj.tag == "part":
-                part = sch.obj.part.PartObj.fromXml(obj, self._parent.lib)
-                self._objs.add(part)
-                self._objs |= set(part.children())
+            self.addXmlObj(obj)
+
+    def objsFromXml(self, obj):
+        if obj.tag == "line":
+            return [sch.obj.line.LineObj.fromXml(obj)]
+        elif obj.tag == "net":
+            return [sch.obj.net.NetObj.fromXml(obj)]
+        elif obj.tag == "text":
+            return [sch.obj.text.TextObj.fromXml(obj)]
+        elif obj.tag == "part":
+            part = sch.obj.part.PartObj.fromXml(obj, self._parent.lib)
+            return [part] + part.children()
+        return []
+
+    def _objectRecords(self):
+        # part property texts are recorded with their part
+        return sch.binfmt.objectRecords(obj for obj in self._objs if type(obj) is not sch.obj.proptext.PropTextObj)
 
     def toXml(self, parentNode):
         page = etree.SubElement(parentNode, "page", name=self.name)
@@ -231,6 +1222,14 @@ class DocPage(AbstractPage):
         for obj in self.objects(exclude={sch.obj.proptext.PropTextObj}):
             obj.toXml(objs)
 
+    def writeXml(self, xf, level):
+        if self._source is not None:
+            self._source.writeXml(xf, level, sch.binfmt.PAGE_SCHEMATIC, self.name)
+            return
+        # part property texts are written by their part
+        _writePage(xf, level, self.name,
+                   (obj for obj in self._objs if type(obj) is not sch.obj.proptext.PropTextObj))
+
 
 class SymbolPage(AbstractPage):
     def __init__(self, parent: MasterDocument):
@@ -238,13 +1237,22 @@ class SymbolPage(AbstractPage):
         self._name = "symbol"
         self._pageProps = {}
 
+    def transform(self):
+        # for the property texts placed on the symbol itself
+        return QTransform()
+
+    def inverseTransform(self):
+        return QTransform()
+
     def getProp(self, name):
+        self._ensureLoaded()
         if name in self._pageProps:
             return self._pageProps[name]
         else:
             return ''
 
     def setProp(self, name, value):
+        self._ensureLoaded()
         self._pageProps[name] = value
 
     def fromXml(self, symNode):
@@ -254,25 +1262,44 @@ class SymbolPage(AbstractPage):
             self._pageProps[prop.attrib['name']] = prop.text
         objs = symNode.find("objects")
         for obj in objs:
-            if obj.tag == "line":
-                self._objs.add(sch.obj.line.LineObj.fromXml(obj))
-            elif obj.tag == 'proptext':
-                self._objs.add(sch.obj.proptext.PropTextObj.fromXml(obj, self))
-            elif obj.tag == 'text':
-                self._objs.add(sch.obj.text.TextObj.fromXml(obj))
+            self.addXmlObj(obj)
+
+    def objsFromXml(self, obj):
+        if obj.tag == "line":
+            return [sch.obj.line.LineObj.fromXml(obj)]
+        elif obj.tag == 'proptext':
+            return [sch.obj.proptext.PropTextObj.fromXml(obj, self)]
+        elif obj.tag == 'text':
+            return [sch.obj.text.TextObj.fromXml(obj)]
+        elif obj.tag == 'pin':
+            pin = sch.obj.pin.PinObj.fromXml(obj)
+            return [pin] + pin.children()
+        return []
+
+    def _objectRecords(self):
+        recs = sch.binfmt.objectRecords(_ownObjects(self._objs))
+        recs["prop"] += [(sch.binfmt.OWNER_PAGE, 0, key, value or "") for key, value in self._pageProps.items()]
+        return recs
 
     def toXml(self, parentNode):
+        self._ensureLoaded()
         page = etree.SubElement(parentNode, "symPart", name=self.name)
         props = etree.SubElement(page, "props")
         for key, value in self._pageProps.items():
             pp = etree.SubElement(props, "prop", name=key)
             pp.text = value
         objs = etree.SubElement(page, "objects")
-        for obj in self._objs:
+        for obj in _ownObjects(self._objs):
             obj.toXml(objs)
 
+    def writeXml(self, xf, level):
+        if self._source is not None:
+            self._source.writeXml(xf, level, sch.binfmt.PAGE_SYMBOL, self.name)
+            return
+        _writeSymPart(xf, level, self.name, self._pageProps, _ownObjects(self._objs))
 
-class ObjAddCmd(QUndoCommand):
+
+class ObjAddCmd(UndoCommand):
     def __init__(self, obj, doc=None, parent=None):
         super().__init__(parent)
         self._doc = doc
@@ -293,8 +1320,14 @@ class ObjAddCmd(QUndoCommand):
     def undo(self):
         self._doc.removeObj(self._obj)
 
+    def journalOps(self):
+        # part children are journaled with their part
+        if sch.journal.ownerOf(self._obj) is not self._obj:
+            return []
+        return [["add", sch.journal.objXml(self._obj)]]
+
 
-class ObjDelCmd(QUndoCommand):
+class ObjDelCmd(UndoCommand):
     def __init__(self, obj, doc=None, parent=None):
         super().__init__(parent)
         self._doc = doc
@@ -315,8 +1348,13 @@ class ObjDelCmd(QUndoCommand):
     def undo(self):
         self._doc.addObj(self._obj)
 
+    def journalOps(self):
+        if sch.journal.ownerOf(self._obj) is not self._obj:
+            return []
+        return [["del", sch.journal.objXml(self._obj)]]
 
-class ObjChangeCmd(QUndoCommand):
+
+class ObjChangeCmd(UndoCommand):
     @staticmethod
     def _Memento(obj, deep=False):
         state = (copy.copy, copy.deepcopy)[bool(deep)](obj.__dict__)
@@ -324,6 +1362,7 @@ class ObjChangeCmd(QUndoCommand):
         def Restore():
             obj.__dict__.clear()
             obj.__dict__.update(state)
+        Restore.state = state
         return Restore
 
     # this should be called with the unmodified object, which is then changed
@@ -358,3 +1397,17 @@ class ObjChangeCmd(QUndoCommand):
     def undo(self):
         if not self._undone:
             self._restoreState()
+
+    def journalOps(self):
+        # the memento holds the old state until the command is undone, the new one after
+        owner = sch.journal.ownerOf(self._obj)
+        live = self._obj.__dict__
+        self._obj.__dict__ = self._restore.state
+        try:
+            saved = sch.journal.objXml(owner)
+        finally:
+            self._obj.__dict__ = live
+        current = sch.journal.objXml(owner)
+        if saved == current:
+            return []
+        return [["chg", current, saved] if self._undone else ["chg", saved, current]]
@@ -0,0 +1,20 @@
+from enum import Enum
+
+
+class Event(object):
+    class Type(Enum):
+        MouseMoved = 0
+        MousePressed = 1
+        MouseReleased = 2
+        Done = 3
+        Cancel = 4
+        KeyPressed = 5
+        KeyReleased = 6
+        MouseDblClicked = 7
+
+    def __init__(self, evType, pos=None, key=None):
+        super().__init__()
+        self.evType = evType
+        self.pos = pos
+        self.key = key
+        self.handled = False
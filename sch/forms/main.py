@@ -5,7 +5,7 @@ from sch.uic.ui_mainwindow import Ui_MainWindow
 from sch.uic.ui_toolsdock import Ui_ToolsDock
 from sch.view import SchView
 from sch.controller import getCtrl
-from sch.document import MasterDocument, AbstractPage
+from sch.document import MasterDocument, AbstractPage, Validation
 from sch.forms.projectdock import ProjectDock
 from sch.forms.inspector import InspectorDock
 from sch.library import PartLibrary
@@ -52,6 +52,11 @@ class MainWindow(QMainWindow):
 
     def closeEvent(self, e):
         if self.saveAll():
+            for doc in self.docs:
+                doc.waitForSave()
+                # keep the journal of a document whose save failed for recovery on next open
+                if not doc.isModified():
+                    doc.discardJournal()
             e.accept()
             self.saveSettings()
             super().closeEvent(e)
@@ -66,24 +71,47 @@ class MainWindow(QMainWindow):
             return self.activeTab.doc.parentDoc
         return None
 
+    def addDoc(self, doc: MasterDocument):
+        doc.sigSaved.connect(self.onDocSaved)
+        doc.sigSaveFailed.connect(self.onDocSaveFailed)
+        self.docs.append(doc)
+        self.docsChanged.emit()
+
     def saveDoc(self, doc: MasterDocument):
         if doc is None:
             return False
         if doc.fileName is None:
             return self.saveAsDoc(doc)
         else:
-            doc.saveToFile()
-            self.ui.statusbar.showMessage("Document saved", 5000)
-            return True
+            return self._startSave(doc, doc.fileName)
 
     def saveAsDoc(self, doc: MasterDocument):
         fn = QFileDialog.getSaveFileName(self)[0]
         if fn == "":
             return False
-        doc.saveToFile(fn)
-        self.ui.statusbar.showMessage("Document saved as {}".format(fn), 5000)
+        return self._startSave(doc, fn)
+
+    def _startSave(self, doc, fn):
+        if doc.isSaving():
+            self.ui.statusbar.showMessage("{} is already being saved".format(doc.name()), 5000)
+            return False
+        job = doc.saveInBackground(fn)
+        job.sigProgress.connect(partial(self.onSaveProgress, fn))
+        self.ui.statusbar.showMessage("Saving {}...".format(fn))
         return True
 
+    def onSaveProgress(self, fn, done, total):
+        self.ui.statusbar.showMessage("Saving {}: {}/{} pages".format(fn, done, total))
+
+    @pyqtSlot(str)
+    def onDocSaved(self, fn):
+        self.ui.statusbar.showMessage("Document saved as {}".format(fn), 5000)
+        self.docsChanged.emit()
+
+    @pyqtSlot(str)
+    def onDocSaveFailed(self, msg):
+        self.ui.statusbar.showMessage("Error saving document: {}".format(msg), 5000)
+
     def saveAll(self):
         for doc in self.docs:
             if doc.isModified():
@@ -94,6 +122,8 @@ class MainWindow(QMainWindow):
                                         QMessageBox.Save | QMessageBox.Discard | QMessageBox.Cancel)
                 if r == QMessageBox.Save:
                     return self.saveDoc(doc)
+                elif r == QMessageBox.Discard:
+                    doc.discardJournal()
                 elif r == QMessageBox.Cancel:
                     return False
         return True
@@ -112,8 +142,7 @@ class MainWindow(QMainWindow):
 
     @pyqtSlot()
     def on_actionNew_triggered(self):
-        self.docs.append(MasterDocument(self.lib))
-        self.docsChanged.emit()
+        self.addDoc(MasterDocument(self.lib))
 
     @pyqtSlot()
     def on_actionOpen_triggered(self):
@@ -123,16 +152,33 @@ class MainWindow(QMainWindow):
                 if d.fileName == fn:
                     self.ui.statusbar.showMessage("Document already open", 5000)
                     return
+            # symbols are edited in the library's own copy, so placed parts follow the edits
+            d = self.lib.document(fn)
+            if d is not None:
+                if d in self.docs:
+                    self.ui.statusbar.showMessage("Document already open", 5000)
+                    return
+                self.addDoc(d)
+                self.ui.statusbar.showMessage("Library document loaded", 5000)
+                return
             try:
                 d = MasterDocument(self.lib)
-                d.loadFromFile(fn)
-                self.docs.append(d)
-                self.docsChanged.emit()
-                self.ui.statusbar.showMessage("Document loaded", 5000)
+                d.sigValidationFailed.connect(self.onValidationFailed)
+                d.loadFromFile(fn, Validation.deferred)
+                self.addDoc(d)
+                if d.recoveredEdits:
+                    self.ui.statusbar.showMessage("Document loaded; recovered {} unsaved edits"
+                                                  .format(d.recoveredEdits), 5000)
+                else:
+                    self.ui.statusbar.showMessage("Document loaded", 5000)
             except Exception as e:
                 self.ui.statusbar.showMessage("Error loading document: {}: {}".format(str(type(e)), str(e)), 5000)
                 traceback.print_exc()
 
+    @pyqtSlot(str)
+    def onValidationFailed(self, msg):
+        self.ui.statusbar.showMessage("Document does not match schema: {}".format(msg), 5000)
+
     @pyqtSlot()
     def on_actionUndo_triggered(self):
         self.currentTab().undo()
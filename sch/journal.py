@@ -0,0 +1,144 @@
+import json
+import os
+from lxml import etree
+import sch.obj.part
+import sch.obj.pin
+import sch.project
+
+
+# Edit journal: an append-only log, kept beside a document, of the edits made since the
+# document was last fully saved.  Each line is a JSON array; the first line is a header that
+# ties the journal to one particular save of the document file.
+#
+# page records:     [op, kind, index, ...] with kind "s" (symbol) or "p" (page)
+#   ["add", kind, index, xml]
+#   ["del", kind, index, xml]
+#   ["chg", kind, index, oldXml, newXml]
+#   ["rename", kind, index, name]
+# document records:
+#   ["newsym", name]
+#   ["newpage", name]
+# Objects are identified by their XML serialization.
+
+
+def ownerOf(obj):
+    # property texts of a placed part or a pin are saved (and journaled) as part of it
+    parent = getattr(obj, "_parent", None)
+    if isinstance(parent, (sch.obj.part.PartObj, sch.obj.pin.PinObj)):
+        return parent
+    return obj
+
+
+def objXml(obj):
+    holder = etree.Element("objects")
+    obj.toXml(holder)
+    return etree.tostring(holder[0], encoding="unicode")
+
+
+def commandOps(cmd, undone=False):
+    """Returns the journal ops ([op, ...] without page) for applying (or, if undone, reverting) cmd."""
+    if hasattr(cmd, "journalOps"):
+        ops = cmd.journalOps()
+    else:
+        # macro command
+        ops = [op for i in range(cmd.childCount()) for op in commandOps(cmd.child(i))]
+    if undone:
+        ops = [_invert(op) for op in reversed(ops)]
+    return ops
+
+
+def _invert(op):
+    if op[0] == "add":
+        return ["del", op[1]]
+    elif op[0] == "del":
+        return ["add", op[1]]
+    elif op[0] == "chg":
+        return ["chg", op[2], op[1]]
+    return op
+
+
+def fileStamp(file):
+    if os.path.isdir(file):
+        # a project directory; its manifest is rewritten on every save
+        file = sch.project.manifestPath(file)
+    st = os.stat(file)
+    return [st.st_size, st.st_mtime_ns]
+
+
+class Journal(object):
+    VERSION = 1
+
+    def __init__(self, docFile):
+        self.path = docFile + ".journal"
+        self._h = None
+        self._header = None
+        # records written since start()
+        self.count = 0
+
+    def read(self, stamp):
+        """Returns the records of an existing journal for the document save identified by stamp.
+
+        A missing journal, or one written against a different save of the document, yields no
+        records.  A record cut short by a crash is dropped."""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                lines = f.read().split("\n")
+        except FileNotFoundError:
+            return []
+        try:
+            header = json.loads(lines[0])
+        except ValueError:
+            return []
+        if header.get("version") != self.VERSION or header.get("base") != stamp:
+            return []
+        out = []
+        for line in lines[1:]:
+            try:
+                out.append(json.loads(line))
+            except ValueError:
+                break
+        return out
+
+    def start(self, stamp, keep=()):
+        """Starts a new journal for the document save identified by stamp, keeping the given records.
+
+        The file itself is only created once there is something to record."""
+        self.close()
+        self._header = {"version": self.VERSION, "base": stamp}
+        self.count = 0
+        if keep:
+            self._open("w")
+            for rec in keep:
+                self.append(rec)
+        elif os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _open(self, mode):
+        self._h = open(self.path, mode, encoding="utf-8")
+        if mode == "w":
+            self._h.write(json.dumps(self._header) + "\n")
+
+    def append(self, rec):
+        if self._h is None:
+            self._open("w")
+        self._h.write(json.dumps(rec, separators=(",", ":")) + "\n")
+        # flushing is enough to survive an application crash; the OS keeps the data
+        self._h.flush()
+        self.count += 1
+
+    def recordsSince(self, count):
+        # records appended after the first count records of this journal
+        if self._h is None:
+            return []
+        self._h.flush()
+        return self.read(self._header["base"])[count:]
+
+    def close(self):
+        if self._h is not None:
+            self._h.close()
+            self._h = None
+
+    def remove(self):
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
@@ -1,12 +1,23 @@
 from PyQt5.QtCore import *
 from sch.document import *
+from collections import defaultdict
+from weakref import WeakSet
 
 
 class PartLibrary(QObject):
-    def __init__(self):
+    # emitted after a library symbol was edited; argument is the set of affected part instances
+    sigSymbolChanged = pyqtSignal('PyQt_PyObject')
+
+    def __init__(self, paths=None):
         QObject.__init__(self)
-        self.paths = ['./schlib/']
+        self.paths = list(paths) if paths is not None else ['./schlib/']
         self._docs = {}
+        # canonical file name -> key in _docs, see document()
+        self._files = {}
+        # symbol pages whose changes are followed
+        self._watched = set()
+        # reverse index: (path, symbol name) -> live PartObj instances referencing it
+        self._instances = defaultdict(WeakSet)
         self._rebuildCache()
 
     def _rebuildCache(self):
@@ -27,14 +38,18 @@ class PartLibrary(QObject):
             for dn in dirlist:
                 d = QDir(path + dn)
                 d.setFilter(QDir.Readable | QDir.Files)
-                d.setNameFilters(['*.xsch'])
+                d.setNameFilters(['*.xsch', '*.xschb'])
                 files = d.entryList()
                 for f in files:
                     try:
                         fp = d.filePath(f)
                         doc = MasterDocument(self)
-                        doc.loadFromFile(fp)
+                        # a journal left beside a library file is not replayed: nothing would
+                        # tell the user their symbols changed
+                        doc.loadFromFile(fp, Validation.off, recover=False)
                         self._docs[fp] = doc
+                        self._files[QFileInfo(fp).canonicalFilePath()] = fp
+                        self._watchDocument(fp, doc)
                     except Exception as e:
                         print("Exception loading {}: {}".format(f, str(e)))
 
@@ -51,4 +66,39 @@ class PartLibrary(QObject):
         for s in doc.symbols:
             if s.name == name:
                 return s
-        return None
\ No newline at end of file
+        return None
+
+    def document(self, fileName):
+        """Returns the library's own document for fileName, or None if it isn't a library file.
+        Parts are drawn from the symbols of this document, so it is the one to edit them in."""
+        path = self._files.get(QFileInfo(fileName).canonicalFilePath())
+        return self._docs.get(path) if path is not None else None
+
+    def _watchDocument(self, path, doc):
+        for sym in doc.symbols:
+            self._watchSymbol(path, sym)
+        # symbols added later
+        doc.sigChanged.connect(lambda: [self._watchSymbol(path, sym) for sym in doc.symbols])
+
+    def _watchSymbol(self, path, sym):
+        if sym in self._watched:
+            return
+        self._watched.add(sym)
+        sym.sigChanged.connect(lambda: self._symbolChanged(path, sym.name))
+
+    def _symbolChanged(self, path, name):
+        insts = self.instances(path, name)
+        for inst in insts:
+            inst.masterChanged()
+        if insts:
+            self.sigSymbolChanged.emit(insts)
+
+    def registerInstance(self, inst):
+        # instances stay registered under every (path, name) they have ever referenced, since undo
+        # can restore an old master without going through the setters; instances() filters them
+        self._instances[(inst.path, inst.name)].add(inst)
+
+    def instances(self, path, name):
+        if (path, name) not in self._instances:
+            return set()
+        return {i for i in self._instances[(path, name)] if i.path == path and i.name == name}
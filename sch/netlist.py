@@ -0,0 +1,281 @@
+import json
+import re
+import weakref
+from PyQt5.QtCore import QPoint
+import sch.binfmt
+import sch.obj.part
+
+
+# Netlist extraction.  Connectivity is computed from the records of one page at a time (see
+# AbstractPage.records), so pages that haven't been opened are never built into objects.
+#
+# Net segments join the points at their two ends; a part pin joins whatever ends at its
+# position on the page, including the pins of other parts.  Nets are expected to be
+# normalized (see sch.obj.net.normalizeNets): a segment ending in the middle of another one
+# doesn't connect to it.
+#
+# Nets given a name (the "name" property of any of their segments) are joined with the nets
+# of the same name on every page.  Other nets are local to their page, and are only nets if
+# they connect at least two pins; they are numbered N$1, N$2, ...
+
+EXTENSION = ".net"
+
+
+class SymbolPins(object):
+    """Reference prefix and pins of library symbols, looked up once per symbol."""
+    def __init__(self, lib):
+        self._lib = lib
+        # (path, name) -> (symbol page, its revision, (ref, pins))
+        self._cache = {}
+
+    def get(self, path, name):
+        key = (path, name)
+        if key not in self._cache:
+            sym = self._lib.getSym(path, name) if self._lib is not None else None
+            if sym is None:
+                self._cache[key] = (None, None, ("", ()))
+            else:
+                self._cache[key] = (sym, sym.revision(), self._lookup(sym))
+        return self._cache[key][2]
+
+    @staticmethod
+    def _lookup(sym):
+        recs = sym.records()
+        ref = next((value for kind, _, prop, value in recs["prop"]
+                    if kind == sch.binfmt.OWNER_PAGE and prop == "ref"), "")
+        # sorted: the records of an opened page come in no particular order
+        return ref, tuple(sorted((pinId, x, y) for pinId, _, x, y, _ in recs["pin"]))
+
+    def refresh(self):
+        """Looks again at the symbols changed since they were looked up (loading one counts);
+        returns True if the reference or pins of any of them changed."""
+        changed = False
+        for key, (sym, revision, result) in list(self._cache.items()):
+            if sym is not None and sym.revision() != revision:
+                new = self._lookup(sym)
+                self._cache[key] = (sym, sym.revision(), new)
+                changed = changed or new != result
+        return changed
+
+
+# (rot, mirror) -> (a, b, c, d) of a part transform, see _placement
+_placements = {}
+
+
+def _placement(rot, mirror):
+    # a symbol point (x, y) lands on (a*x + c*y, b*x + d*y) relative to the part position
+    key = (rot, mirror)
+    if key not in _placements:
+        tr = sch.obj.part.partTransform(QPoint(0, 0), rot, mirror)
+        _placements[key] = (tr.m11(), tr.m12(), tr.m21(), tr.m22())
+    return _placements[key]
+
+
+def partRefs(recs, symbols, pageNo):
+    """Returns the reference designator of every part record of a page.
+
+    Parts without one of their own get the symbol's; references that are still unassigned
+    (contain '?') are made unique with the page number and part index."""
+    own = {owner: value for kind, owner, prop, value in recs["prop"]
+           if kind == sch.binfmt.OWNER_PART and prop == "ref"}
+    refs = []
+    for i, (path, partId, *_) in enumerate(recs["part"]):
+        ref = own.get(i) or symbols.get(path, partId)[0] or "?"
+        if "?" in ref:
+            ref = "{}@{}.{}".format(ref, pageNo, i + 1)
+        refs.append(ref)
+    return refs
+
+
+def pageNets(recs, symbols, pageNo=1):
+    """Returns the nets of one page as (names, pins) pairs in a stable order: the sorted names
+    given to the net's segments (usually none or one) and its (ref, pin id) list."""
+    index = {}      # point -> node
+    parent = []     # union-find forest over the nodes
+
+    def node(pt):
+        n = index.get(pt)
+        if n is None:
+            n = index[pt] = len(parent)
+            parent.append(n)
+        return n
+
+    def find(n):
+        while parent[n] != n:
+            parent[n] = parent[parent[n]]
+            n = parent[n]
+        return n
+
+    netNodes = []
+    for x1, y1, x2, y2 in recs["net"]:
+        a = find(node((x1, y1)))
+        b = find(node((x2, y2)))
+        if a != b:
+            parent[b] = a
+        netNodes.append(a)
+    pinNodes = []
+    pinKeys = {}
+    refs = partRefs(recs, symbols, pageNo)
+    for ref, (path, partId, x, y, rot, mirror) in zip(refs, recs["part"]):
+        pins = symbols.get(path, partId)[1]
+        if not pins:
+            continue
+        refKey = _natural(ref)
+        a, b, c, d = _placement(rot, mirror)
+        for pinId, px, py in pins:
+            pt = (round(a*px + c*py) + x, round(b*px + d*py) + y)
+            if pinId not in pinKeys:
+                pinKeys[pinId] = _natural(pinId)
+            pinNodes.append((node(pt), (refKey, pinKeys[pinId]), (ref, pinId)))
+    nets = {}
+    for n, key, pin in pinNodes:
+        nets.setdefault(find(n), []).append((key, pin))
+    names = {}
+    for kind, owner, prop, value in recs["prop"]:
+        if kind == sch.binfmt.OWNER_NET and prop == "name" and value:
+            names.setdefault(find(netNodes[owner]), set()).add(value)
+    # pins in natural order (R2 before R10), nets in the order of their first pin
+    out = sorted((sorted(pins), n) for n, pins in nets.items() if len(pins) > 1 or n in names)
+    out = [(tuple(sorted(names.get(n, ()))), [pin for _, pin in pins]) for pins, n in out]
+    # names on wires without pins still join the other nets of those names
+    out += [(tuple(sorted(names[n])), []) for n in sorted(names, key=lambda n: min(names[n])) if n not in nets]
+    return out
+
+
+_DIGITS = re.compile(r"(\d+)")
+
+
+def _natural(s):
+    # text and numbers alternate, so keys compare element by element
+    return tuple(int(t) if i % 2 else t for i, t in enumerate(_DIGITS.split(s)))
+
+
+def mergeNets(pages):
+    """Joins the nets of all pages (lists of pageNets() results, in page order) by name.
+
+    Returns (net name, [(ref, pin id)]) pairs: the named nets in name order, then the unnamed
+    nets of each page in turn."""
+    # union-find over the names: a net with several names joins them all
+    parent = {}
+
+    def find(name):
+        while parent[name] != name:
+            parent[name] = parent[parent[name]]
+            name = parent[name]
+        return name
+
+    for nets in pages:
+        for names, _ in nets:
+            for name in names:
+                parent.setdefault(name, name)
+            for name in names[1:]:
+                a, b = find(names[0]), find(name)
+                if a != b:
+                    parent[b] = a
+    named = {}
+    for nets in pages:
+        for names, pins in nets:
+            if names:
+                named.setdefault(find(names[0]), []).extend(pins)
+    groups = {}
+    for name in parent:
+        groups.setdefault(find(name), []).append(name)
+    out = []
+    for root in sorted(named, key=lambda r: min(map(_natural, groups[r]))):
+        name = min(groups[root], key=_natural)
+        out.append((name, sorted(set(named[root]), key=lambda pin: (_natural(pin[0]), _natural(pin[1])))))
+    n = 0
+    for nets in pages:
+        for names, pins in nets:
+            if not names:
+                n += 1
+                while "N${}".format(n) in parent:
+                    n += 1
+                out.append(("N${}".format(n), pins))
+    return out
+
+
+class NetlistCache(object):
+    """Netlist of a document that keeps the nets of every page, and only extracts them again
+    for pages whose contents changed (see AbstractPage.revision and digest)."""
+    def __init__(self, doc):
+        self._doc = doc
+        self._symbols = SymbolPins(doc.lib)
+        # page -> (revision, digest) when it was last looked at
+        self._digests = weakref.WeakKeyDictionary()
+        # (digest, page number) -> pageNets() result
+        self._nets = {}
+        # number of pages extracted, as opposed to found in the cache
+        self.extracted = 0
+
+    def pageNets(self, page, pageNo):
+        revision = page.revision()
+        known = self._digests.get(page)
+        if known is not None and known[0] == revision:
+            digest = known[1]
+        else:
+            digest = page.digest()
+            self._digests[page] = (revision, digest)
+        # unassigned references are numbered by page, so the page number is part of the key
+        key = (digest, pageNo)
+        nets = self._nets.get(key)
+        if nets is None:
+            nets = self._nets[key] = pageNets(page.records(), self._symbols, pageNo)
+            self.extracted += 1
+        return key, nets
+
+    def nets(self):
+        """Returns the (net name, [(ref, pin id)]) pairs of the whole document."""
+        if self._symbols.refresh():
+            # pins may have moved on any page
+            self._nets.clear()
+        keys, pages = [], []
+        for pageNo, page in enumerate(self._doc.pages, 1):
+            key, nets = self.pageNets(page, pageNo)
+            keys.append(key)
+            pages.append(nets)
+        # forget pages that have changed since
+        for key in self._nets.keys() - set(keys):
+            del self._nets[key]
+        return mergeNets(pages)
+
+
+def _token(s):
+    # names are written bare unless they would not read back as one token
+    if s and not re.search(r'[\s"]', s):
+        return s
+    return json.dumps(s)
+
+
+class NetlistWriter(object):
+    """Writes a plain text netlist: '#' comment lines, then one line per net with the net
+    name followed by its pins as ref.pin, separated by spaces."""
+    def __init__(self, h):
+        self._h = h
+        self.count = 0
+
+    def begin(self, source=None):
+        self._h.write("# pyschem netlist\n")
+        if source:
+            self._h.write("# source: {}\n".format(source))
+
+    def writeNet(self, name, pins):
+        self._h.write(" ".join([_token(name)] + [_token("{}.{}".format(ref, pin)) for ref, pin in pins]))
+        self._h.write("\n")
+        self.count += 1
+
+    def finish(self):
+        self._h.write("# {} nets\n".format(self.count))
+
+
+def writeNetlist(doc, h, cache=None):
+    """Writes the netlist of doc to the text file handle h; returns the number of nets.
+    Passing the NetlistCache used last time only extracts the pages changed since."""
+    if cache is None:
+        cache = NetlistCache(doc)
+    w = NetlistWriter(h)
+    w.begin(doc.fileName)
+    for name, pins in cache.nets():
+        w.writeNet(name, pins)
+    w.finish()
+    return w.count
@@ -1,17 +1,27 @@
 from PyQt5.QtCore import *
-from PyQt5.QtGui import QPainter, QPen, QTransform
-from PyQt5.QtWidgets import QWidget, QListWidgetItem
+from PyQt5.QtGui import QPainter, QTransform
 import sch.document
-import sch.controller
+import sch.obj.pin
 import sch.obj.proptext
-from sch.uic.ui_partinspector import Ui_PartInspector
-from sch.utils import LayerType, Layer, Geom
+import sch.render
+from sch.utils import LayerType
 from lxml import etree
-from sch.view import Event
 import copy
 
 
+def partTransform(pos, rot, mirror):
+    """Maps symbol coordinates to page coordinates for a part placed at pos."""
+    tr = QTransform()
+    tr.translate(pos.x(), pos.y())
+    tr.scale(-1 if mirror else 1, 1)
+    tr.rotate(-rot)
+    return tr
+
+
 class PartObj(object):
+    # layer of lodRect(), see sch.render
+    LAYER = LayerType.symbol
+
     def __init__(self, lib, path=None, name=None, pos=QPoint(0, 0), rot=0, mirror=False):
         self._lib = lib
         self._master = None
@@ -22,12 +32,17 @@ class PartObj(object):
         self._mirror = None
         self._pos = None
         self._tr = None
+        # (transform, its inverse)
+        self._itr = None
         self._bb = None
+        self._pins = None
         self.pos = QPoint(pos)
         self.rot = rot
         self.mirror = mirror
         self._masterBbox = None
         self._proptexts = []
+        # property values set on this instance; the others come from the master symbol
+        self._props = {}
 
     def children(self):
         return self._proptexts
@@ -41,6 +56,7 @@ class PartObj(object):
         self._pos = new
         self._tr = None
         self._bb = None
+        self._pins = None
 
     @property
     def rot(self):
@@ -51,6 +67,7 @@ class PartObj(object):
         self._rot = new
         self._tr = None
         self._bb = None
+        self._pins = None
 
     @property
     def mirror(self):
@@ -61,6 +78,7 @@ class PartObj(object):
         self._mirror = new
         self._tr = None
         self._bb = None
+        self._pins = None
 
     @property
     def path(self):
@@ -83,20 +101,46 @@ class PartObj(object):
 
     def _updateMaster(self):
         self._master = self._lib.getSym(self.path, self.name)
+        self._lib.registerInstance(self)
         self._updateMasterBbox()
         self._bb = None
+        self._pins = None
+
+    def masterChanged(self):
+        # called by the library when the master symbol has been edited
+        self._updateMaster()
+        self._tr = None
+        for txt in self._proptexts:
+            txt._dirty = True
+
+    def __copy__(self):
+        obj = PartObj.__new__(PartObj)
+        obj.__dict__.update(self.__dict__)
+        # property texts are edited in place, so the copy needs its own
+        obj._proptexts = []
+        for txt in self._proptexts:
+            c = copy.copy(txt)
+            if c._parent is self:
+                c._parent = obj
+            obj._proptexts.append(c)
+        self._lib.registerInstance(obj)
+        return obj
 
     def _updateTransform(self):
         if self._tr is None:
-            self._tr = QTransform()
-            self._tr.translate(self.pos.x(), self.pos.y())
-            self._tr.scale(-1 if self.mirror else 1, 1)
-            self._tr.rotate(-self.rot)
+            self._tr = partTransform(self.pos, self.rot, self.mirror)
 
     def transform(self):
         self._updateTransform()
         return self._tr
 
+    def inverseTransform(self):
+        # kept for as long as the transform itself
+        self._updateTransform()
+        if self._itr is None or self._itr[0] is not self._tr:
+            self._itr = self._tr, self._tr.inverted()[0]
+        return self._itr[1]
+
     def _updateMasterBbox(self):
         bb = None
         if self._master:
@@ -104,7 +148,8 @@ class PartObj(object):
                 if bb is not None:
                     bb |= obj.bbox()
                 else:
-                    bb = obj.bbox()
+                    # objects may hand out the box they keep
+                    bb = QRect(obj.bbox())
         self._masterBbox = bb
 
     def _updateBbox(self):
@@ -116,12 +161,24 @@ class PartObj(object):
         self._bb = QRect(self._tr.map(self._masterBbox.topLeft()),
                          self._tr.map(self._masterBbox.bottomRight())).normalized()
 
+    def pins(self):
+        """Returns the (pin id, page position) of every pin of the master symbol."""
+        if self._pins is None:
+            self._updateTransform()
+            if self._master is None:
+                self._pins = []
+            else:
+                self._pins = [(pin.pinId, self._tr.map(pin.pos))
+                              for pin in self._master.objects(objType=sch.obj.pin.PinObj)]
+        return self._pins
+
     def _resetProps(self):
         self._proptexts = []
         if self._master:
             for prop in self._master.objects(objType=sch.obj.proptext.PropTextObj):
                 c = copy.copy(prop)
-                c.doc = self
+                # placed on the part: drawn, hit and valued like those read from a file
+                c.parent = self
                 self._proptexts.append(c)
 
     def draw(self, painter: QPainter):
@@ -130,10 +187,20 @@ class PartObj(object):
         self._updateTransform()
         painter.save()
         painter.setTransform(self._tr, True)
-        for obj in self._master.objects(exclude={sch.obj.proptext.PropTextObj}):
-            obj.draw(painter)
+        objs = list(self._master.objects(exclude={sch.obj.proptext.PropTextObj}))
+        for obj in objs[:]:
+            if type(obj) is sch.obj.pin.PinObj:
+                objs.extend(txt for txt in obj.children() if txt.vis)
+        sch.render.drawObjects(painter, objs)
         painter.restore()
 
+    def lodRect(self, scale):
+        # zoomed out, the part is a box
+        bb = self.bbox()
+        if max(bb.width(), bb.height()) * scale < sch.render.LOD_PART:
+            return bb
+        return None
+
     def bbox(self):
         if self._bb is None:
             self._updateBbox()
@@ -142,16 +209,26 @@ class PartObj(object):
     def testHit(self, pt: QPoint, radius: int):
         if self._bb is None:
             self._updateBbox()
+        # property text boxes are in page coordinates already
         for txt in self._proptexts:
-            if txt.bbox().contains(self._tr.inverted()[0].map(pt)):
+            if txt.bbox().contains(pt):
                 return True
         return self.bbox().contains(pt)
 
     def getProp(self, attr):
-        return "default"
+        if attr in self._props:
+            return self._props[attr]
+        if self._master is not None:
+            return self._master.getProp(attr)
+        return ''
 
     def setProp(self, attr, value):
-        pass
+        # replaced rather than updated: copies and undo mementos share the dict
+        self._props = dict(self._props)
+        self._props[attr] = value
+
+    def props(self):
+        return self._props
 
     def toXml(self, parent):
         part = etree.SubElement(parent, "part",
@@ -164,6 +241,8 @@ class PartObj(object):
                          )
         for pt in self._proptexts:
             pt.toXml(part)
+        for name, value in self._props.items():
+            etree.SubElement(part, "prop", name=name).text = value
 
     @staticmethod
     def fromXml(elem, lib):
@@ -174,183 +253,9 @@ class PartObj(object):
         obj.mirror = (elem.attrib['mirror'] == '1')
         obj.path = elem.attrib['schPath']
         obj._proptexts = []
-        for sub in elem:
-            if sub.tag == 'proptext':
-                obj._proptexts.append(sch.obj.proptext.PropTextObj.fromXml(sub, obj))
+        # properties first, the property texts show their values
+        for sub in elem.iterfind('prop'):
+            obj._props[sub.attrib['name']] = sub.text or ''
+        for sub in elem.iterfind('proptext'):
+            obj._proptexts.append(sch.obj.proptext.PropTextObj.fromXml(sub, obj))
         return obj
-
-
-class PartTool(QObject):
-    sigUpdate = pyqtSignal()
-
-    def __init__(self, ctrl):
-        QObject.__init__(self)
-        self._ctrl = ctrl
-        self._pos = QPoint()
-        self._obj = PartObj(lib=self._ctrl.lib)
-        self._inspector = PartInspector(self._ctrl)
-        self._inspector.masterChanged.connect(self.onMasterChanged)
-
-    def finish(self):
-        self._obj = None
-        self.sigUpdate.emit()
-
-    @property
-    def inspector(self):
-        return self._inspector
-
-    @staticmethod
-    def name():
-        return "Place Part"
-
-    def draw(self, painter):
-        if self._obj:
-            self._obj.draw(painter)
-
-    def handleEvent(self, e):
-        if e.evType == sch.controller.Event.Type.MouseMoved:
-            self._obj.pos = self._ctrl.snapPt(e.pos) - (self._obj.bbox().topLeft() - self._obj.pos)
-            self.sigUpdate.emit()
-            e.handled = True
-        elif e.evType == sch.controller.Event.Type.MouseReleased:
-            cmd = sch.document.ObjAddCmd(self._obj)
-            self._ctrl.doc.doCommand(cmd)
-            self._obj = copy.copy(self._obj)
-            self._inspector.obj = self._obj
-            e.handled = True
-
-    @pyqtSlot(str, str)
-    def onMasterChanged(self, path, sym):
-        self._obj.name = sym
-        self._obj.path = path
-
-
-class PartInspector(QWidget):
-    edited = pyqtSignal()
-    masterChanged = pyqtSignal(str, str)
-
-    def __init__(self, ctrl, obj=None, parent=None):
-        super().__init__(parent)
-        self.ui = Ui_PartInspector()
-        self.ui.setupUi(self)
-        self._ctrl = ctrl
-        self._populateList()
-        self._obj = None
-        self.obj = obj
-
-    @property
-    def obj(self):
-        return self._obj
-
-    @obj.setter
-    def obj(self, new):
-        self._obj = new
-        self._loadProperties(new)
-
-    def _populateList(self):
-        for i in self._ctrl.lib.getSymList():
-            for j in i[1]:
-                item = QListWidgetItem()
-                item.setText("{} : {}".format(i[0], j))
-                item.setData(Qt.UserRole, (i[0], j))
-                self.ui.masterList.addItem(item)
-
-    def _loadProperties(self, obj: PartObj):
-        if obj is None:
-            return
-        for i in range(0, self.ui.masterList.count()):
-            path, name = self.ui.masterList.item(i).data(Qt.UserRole)
-            if path == obj.path and name == obj.name:
-                self.ui.masterList.setCurrentRow(i)
-                break
-
-    @pyqtSlot(QListWidgetItem, QListWidgetItem)
-    def on_masterList_currentItemChanged(self, curr, prev):
-        d = curr.data(Qt.UserRole)
-        self.masterChanged.emit(d[0], d[1])
-
-
-class PartEditor(QObject):
-    sigUpdate = pyqtSignal()
-    sigDone = pyqtSignal()
-
-    def __init__(self, ctrl, obj):
-        super().__init__()
-        self._ctrl = ctrl
-        self._obj = obj
-        self._ctrl.doc.sigChanged.connect(self._docChanged)
-        self._cmd = sch.document.ObjChangeCmd(obj)
-        self._inspector = PartInspector(ctrl, obj)
-        self._inspector.edited.connect(self._commit)
-        self._inspector.masterChanged.connect(self._masterChanged)
-        self._dragging = False
-        self._startPos = QPoint()
-        self._grabOffset = QPoint()
-
-    def testHit(self, pt):
-        return self._obj.testHit(pt, 0)
-
-    def draw(self, painter):
-        pen = QPen(Layer.color(LayerType.selection))
-        pen.setCapStyle(Qt.RoundCap)
-        pen.setJoinStyle(Qt.RoundJoin)
-        pen.setWidth(0)
-        painter.setPen(pen)
-        painter.setBrush(Qt.NoBrush)
-        painter.drawRect(self._obj.bbox().marginsAdded(QMargins(500,500,500,500)))
-
-    def handleEvent(self, event: Event):
-        if event.evType == Event.Type.MouseMoved:
-            if self._dragging:
-                self._obj.pos = self._ctrl.snapPt(self._grabOffset + event.pos)
-                event.handled = True
-                self.sigUpdate.emit()
-        elif event.evType == Event.Type.MousePressed:
-            if self.testHit(event.pos):
-                self._dragging = True
-                self._startPos = self._obj.pos
-                self._grabOffset = self._obj.pos - event.pos
-                event.handled = True
-        elif event.evType == Event.Type.MouseReleased:
-            if self._dragging:
-                self._dragging = False
-                if self._startPos != self._obj.pos:
-                    self._commit()
-                event.handled = True
-        elif event.evType == Event.Type.KeyPressed:
-            if event.key == Qt.Key_R:
-                rot = -90 if self._obj.mirror else 90
-                self._obj.rot = (self._obj.rot + rot) % 360
-                self._commit()
-            if event.key == Qt.Key_H:
-                self._obj.rot = (self._obj.rot + 180) % 360
-                self._obj.mirror = not self._obj.mirror
-                self._commit()
-            if event.key == Qt.Key_V:
-                # self._obj.rot = (self._obj.rot + 180) % 360
-                self._obj.mirror = not self._obj.mirror
-                self._commit()
-
-    @property
-    def inspector(self):
-        return self._inspector
-
-    @pyqtSlot(str, str)
-    def _masterChanged(self, path, name):
-        self._obj.path = path
-        self._obj.name = name
-        self._commit()
-
-    @pyqtSlot()
-    def _commit(self):
-        self._ctrl.doc.doCommand(self._cmd)
-        self._cmd = sch.document.ObjChangeCmd(self._obj)
-        self.sigUpdate.emit()
-
-    @pyqtSlot()
-    def _docChanged(self):
-        # if document changed, it might be because the object got deleted; update state
-        # check that object is still part of the document
-        if not self._ctrl.doc.hasObject(self._obj):
-            self.sigDone.emit()
-            return
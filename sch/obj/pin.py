@@ -0,0 +1,84 @@
+from PyQt5.QtCore import *
+from PyQt5.QtGui import QPainter, QTransform
+from sch.utils import LayerType, Layer
+import sch.obj.proptext
+from lxml import etree
+import copy
+
+
+class PinObj(object):
+    # side of the square marking the connection point
+    SIZE = 1000
+    # labels are placed in symbol coordinates, like the other symbol objects
+    _IDENTITY = QTransform()
+
+    def __init__(self, pinId="1", desc="", pos=QPoint(0, 0), rot=0):
+        self.pinId = pinId
+        self.desc = desc
+        self.pos = QPoint(pos)
+        self.rot = rot
+        # property texts showing the pin id or description
+        self._proptexts = []
+
+    def children(self):
+        return self._proptexts
+
+    def __copy__(self):
+        obj = PinObj.__new__(PinObj)
+        obj.__dict__.update(self.__dict__)
+        obj._proptexts = []
+        for txt in self._proptexts:
+            c = copy.copy(txt)
+            if c._parent is self:
+                c._parent = obj
+            obj._proptexts.append(c)
+        return obj
+
+    def transform(self):
+        return self._IDENTITY
+
+    def inverseTransform(self):
+        return self._IDENTITY
+
+    def getProp(self, attr):
+        if attr == "id":
+            return self.pinId
+        elif attr == "desc":
+            return self.desc
+        return ''
+
+    def setProp(self, attr, value):
+        if attr == "id":
+            self.pinId = value
+        elif attr == "desc":
+            self.desc = value
+
+    def draw(self, painter: QPainter):
+        painter.setPen(Layer.pen(LayerType.symbol))
+        painter.setBrush(Qt.NoBrush)
+        painter.drawRect(self.bbox())
+
+    def bbox(self):
+        d = self.SIZE // 2
+        return QRect(self.pos - QPoint(d, d), QSize(self.SIZE, self.SIZE))
+
+    def testHit(self, pt: QPoint, radius: int):
+        return self.bbox().adjusted(-radius, -radius, radius, radius).contains(pt)
+
+    def toXml(self, parent):
+        pin = etree.SubElement(parent, "pin",
+                               id=self.pinId,
+                               desc=self.desc,
+                               x=str(self.pos.x()),
+                               y=str(self.pos.y()),
+                               rot=str(self.rot))
+        for txt in self._proptexts:
+            txt.toXml(pin)
+
+    @staticmethod
+    def fromXml(elem):
+        pos = QPoint(int(elem.attrib["x"]), int(elem.attrib["y"]))
+        obj = PinObj(elem.attrib["id"], elem.attrib["desc"], pos, int(elem.attrib["rot"]))
+        for sub in elem.iterfind("proptext"):
+            obj._proptexts.append(sch.obj.proptext.PropTextObj.fromXml(sub, obj))
+        return obj
@@ -1,18 +1,88 @@
 from PyQt5.QtCore import *
 from PyQt5.QtGui import *
-from PyQt5.QtWidgets import QUndoCommand, QWidget
-from enum import Enum
 from lxml import etree
 from sch.utils import *
-import sch.controller
-import sch.document
-from sch.view import Event
-from sch.uic.ui_textinspector import Ui_TextInspector
-import copy
+import sch.render
 import math
+from collections import OrderedDict
+
+
+class LayoutCache(object):
+    """Prepared text layouts, shared by all texts of the same string, font, size, rotation and
+    alignment.  A layout is prepared without translation, which drawStaticText applies for
+    free, so panning reuses it as is.  The least recently used layouts are dropped once they
+    take more than about maxBytes."""
+    # rough memory taken by a layout, and by each of its characters (glyphs and positions)
+    LAYOUT_BYTES = 1024
+    CHAR_BYTES = 64
+
+    def __init__(self, maxBytes=16 << 20):
+        self.maxBytes = maxBytes
+        # key -> (font, width, height, QStaticText), least recently used first
+        self._layouts = OrderedDict()
+        self._bytes = 0
+
+    def __len__(self):
+        return len(self._layouts)
+
+    def _cost(self, key):
+        return self.LAYOUT_BYTES + self.CHAR_BYTES * len(key[0])
+
+    def get(self, text, family, size, angle, alignment):
+        """Returns (font, width, height, static text) of text in a font of the given family and
+        size, rotated by angle degrees.  Sizes are whole points, and at least 1: zoomed far out a
+        text's size rounds to 0, for which QFont would pick a default size instead."""
+        size = max(1, size)
+        key = (text, family, size, angle, int(alignment))
+        layout = self._layouts.get(key)
+        if layout is not None:
+            self._layouts.move_to_end(key)
+            return layout
+        font = QFont(family, size)
+        fm = QFontMetrics(font)
+        st = QStaticText(text)
+        st.setTextOption(QTextOption(alignment))
+        matrix = QTransform()
+        matrix.rotate(angle)
+        st.prepare(font=font, matrix=matrix)
+        layout = self._layouts[key] = (font, fm.width(text), fm.height(), st)
+        self._bytes += self._cost(key)
+        while self._bytes > self.maxBytes and len(self._layouts) > 1:
+            old, _ = self._layouts.popitem(last=False)
+            self._bytes -= self._cost(old)
+        return layout
+
+
+# shared by all texts
+layouts = LayoutCache()
+
+# point size fonts are measured at; other sizes are scaled from it
+METRICS_SIZE = 100
+# family -> QFontMetricsF at METRICS_SIZE
+_metrics = {}
+
+
+def textExtent(text, family, size):
+    """Returns the QSize of text in document units, in a font of the given family and size,
+    without laying it out.  A text of size s is drawn in an s * scale point font.
+
+    Fonts can only be measured once a QGuiApplication exists; without one (say, a script that
+    only made a QCoreApplication) this raises RuntimeError rather than guess, as the boxes of
+    texts and parts would then differ from those the GUI finds for the same file.  The offscreen
+    platform (QT_QPA_PLATFORM=offscreen) needs no display; sch.cli uses it."""
+    if not isinstance(QCoreApplication.instance(), QGuiApplication):
+        raise RuntimeError("measuring text takes a QGuiApplication")
+    fm = _metrics.get(family)
+    if fm is None:
+        fm = _metrics[family] = QFontMetricsF(QFont(family, METRICS_SIZE))
+    k = size / METRICS_SIZE
+    return QSize(math.ceil(fm.width(text) * k), math.ceil(fm.height() * k))
 
 
 class TextBase(object):
+    # layer of lodRect(), see sch.render
+    LAYER = LayerType.annotate
+
     def __init__(self, text, pos, alignment, family, size, rot, parent=None):
         self._text = text
         self.pos = pos
@@ -27,6 +97,14 @@ class TextBase(object):
         self._dirty = True
         self._statictext = QStaticText()
         self._parent = parent
+        # (placement, rect) of the bar drawn for the text when zoomed out, see lodRect
+        self._bar = None
+        # ((text, family, size), extent) of the text, see textExtent
+        self._ext = None
+        # (placement, box), see bbox
+        self._bb = None
+        # (view and placement, device position, rotation, scale), see draw
+        self._device = None
 
     def _getOffset(self):
         # 0, 0 = lower left when rot <= 180
@@ -51,7 +129,7 @@ class TextBase(object):
 
     def setPosGlobal(self, pos):
         if self._parent:
-            self.pos = self._parent.transform().inverted()[0].map(pos)
+            self.pos = self._parent.inverseTransform().map(pos)
         else:
             self.pos = pos
         self._dirty = True
@@ -70,33 +148,33 @@ class TextBase(object):
         self._scale = scale
         self._alignment = self.alignment
         self._rot = self.rot
-        self._font = QFont(self.family, self.ptSize*scale)
-        self._fm = QFontMetrics(self._font)
+        angle = -((self.rot+rot) % 180)
+        self._font, width, height, self._statictext = layouts.get(self._text or '', self.family,
+                                                                  int(self.ptSize*scale), angle, self.alignment)
         self._pos = pos
         self._tr = QTransform()
         self._tr.translate(pos.x(), pos.y())
-        self._tr.rotate(-((self.rot+rot) % 180))
+        self._tr.rotate(angle)
         osx, osy = self._getOffset()
-        self._tr.translate(-self._fm.width(self._text)*osx, self._fm.height()*(osy-1))
-        self._statictext = QStaticText(self._text)
-        self._statictext.setTextOption(QTextOption(self.alignment))
-        self._statictext.prepare(font=self._font, matrix=self._tr)
+        self._tr.translate(-width*osx, height*(osy-1))
 
     def draw(self, painter: QPainter):
         painter.save()
-        tr = painter.transform()
-        if self._parent:
-            tr = self._parent.transform() * tr
-        pen = QPen(Layer.color(LayerType.annotate))
-        brush = QBrush(Layer.color(LayerType.annotate))
-        painter.setPen(pen)
-        painter.setBrush(brush)
-        pos = tr.map(self.pos)
-        pt0 = tr.map(QPointF(0, 0))
-        pt1 = tr.map(QPointF(1, 0))
-        delta = pt1-pt0
-        rot = int(math.atan2(delta.y(), delta.x())/math.pi*180)
-        scale = abs(delta.x() + delta.y())
+        view = painter.transform()
+        parentTr = self._parent.transform() if self._parent else None
+        # device position, rotation and scale, worked out again when the view, the parent or
+        # the position changes
+        key = (view, parentTr, self.pos.x(), self.pos.y())
+        if self._device is None or self._device[0] != key:
+            tr = parentTr * view if parentTr is not None else view
+            pt0 = tr.map(QPointF(0, 0))
+            pt1 = tr.map(QPointF(1, 0))
+            delta = pt1-pt0
+            rot = int(math.atan2(delta.y(), delta.x())/math.pi*180)
+            self._device = key, tr.map(self.pos), rot, abs(delta.x() + delta.y())
+        _, pos, rot, scale = self._device
+        painter.setPen(Layer.pen(LayerType.annotate))
+        painter.setBrush(Layer.brush(LayerType.annotate))
         self._updateStaticText(scale=scale, pos=pos, rot=rot)
         painter.setTransform(self._tr)
         painter.setFont(self._font)
@@ -104,8 +182,36 @@ class TextBase(object):
         painter.restore()
 
 
+    def lodRect(self, scale):
+        # small text is a bar half as high, and left out altogether when even smaller
+        size = self._ptSize * scale
+        if size >= sch.render.LOD_TEXT:
+            return None
+        if size < sch.render.LOD_TEXT_SKIP:
+            return QRect()
+        key = self._placement()
+        if self._bar is None or self._bar[0] != key:
+            self._bar = key, self._box(QSize(self._extent().width(), self._ptSize // 2))
+        return self._bar[1]
+
+    def _extent(self):
+        key = (self._text or '', self._family, self._ptSize)
+        if self._ext is None or self._ext[0] != key:
+            self._ext = key, textExtent(*key)
+        return self._ext[1]
+
+    def _placement(self):
+        # what the box of the text depends on: boxes are kept until it changes
+        return (self.pos.x(), self.pos.y(), self.rot, self.alignment, self._text, self._family,
+                self._ptSize, self._parent.transform() if self._parent else None)
+
     def bbox(self):
-        sz = (self._statictext.size() / self._scale).toSize().expandedTo(QSize(5000, 5000))
+        key = self._placement()
+        if self._bb is None or self._bb[0] != key:
+            self._bb = key, self._box(self._extent().expandedTo(QSize(5000, 5000)))
+        return self._bb[1]
+
+    def _box(self, sz):
         tr = QTransform()
         tr.translate(self.pos.x(), self.pos.y())
         tr.rotate(self.rot % 180)
@@ -176,7 +282,8 @@ class TextObj(TextBase):
 
     @staticmethod
     def fromXml(elem):
-        text = elem.text
+        # an empty element has no text at all; read it as empty, like the binary format does
+        text = elem.text or ""
         pos = QPoint(int(elem.attrib['x']), int(elem.attrib['y']))
         ha = elem.attrib['hAlign']
         va = elem.attrib['vAlign']
@@ -185,199 +292,3 @@ class TextObj(TextBase):
         alignment = hd[ha] | vd[va]
         rot = int(elem.attrib['rot'])
         return TextObj(text, pos, alignment, elem.attrib['fontFamily'], int(elem.attrib['fontSize']), rot)
-
-
-class TextTool(QObject):
-    sigUpdate = pyqtSignal()
-
-    def __init__(self, ctrl):
-        QObject.__init__(self)
-        self._ctrl = ctrl
-        self._pos = QPoint()
-        self._obj = TextObj("Text")
-        self._inspector = TextInspector(self._obj)
-        # self._inspector.edited.connect(self._commit)
-
-    def finish(self):
-        self._obj = None
-        self.sigUpdate.emit()
-        pass
-
-    @property
-    def inspector(self):
-        return self._inspector
-
-    @staticmethod
-    def name():
-        return "Add Text"
-
-    def draw(self, painter):
-        if self._obj is not None:
-            self._obj.draw(painter)
-
-    def handleEvent(self, e):
-        if e.evType == sch.controller.Event.Type.MouseMoved:
-            self._obj.pos = self._ctrl.snapPt(e.pos)
-            self.sigUpdate.emit()
-            e.handled = True
-        elif e.evType == sch.controller.Event.Type.MouseReleased:
-            cmd = sch.document.ObjAddCmd(self._obj)
-            self._ctrl.doc.doCommand(cmd)
-            self._obj = copy.copy(self._obj)
-            self._inspector.obj = self._obj
-            e.handled = True
-
-
-class TextEditor(QObject):
-    sigUpdate = pyqtSignal()
-    sigDone = pyqtSignal()
-
-    def __init__(self, ctrl, obj):
-        super().__init__()
-        self._ctrl = ctrl
-        self._obj = obj
-        self._handle = sch.controller.TextHandle(self._ctrl, self._obj)
-        self._handle.sigDragged.connect(self._drag)
-        self._handle.sigMoved.connect(self._commit)
-        self._ctrl.doc.sigChanged.connect(self._docChanged)
-        self._cmd = sch.document.ObjChangeCmd(obj)
-        self._inspector = TextInspector(obj)
-        self._inspector.edited.connect(self._commit)
-
-    @property
-    def inspector(self):
-        return self._inspector
-
-    def testHit(self, pt):
-        return self._handle.testHit(pt)
-
-    def handleEvent(self, e):
-        if e.evType == Event.Type.KeyPressed:
-            if e.key == Qt.Key_R:
-                self._obj.rot = (self._obj.rot + 90) % 360
-                self._commit()
-        elif e.evType == Event.Type.MouseDblClicked:
-            print("dbl click event")
-        self._handle.handleEvent(e)
-
-    def draw(self, painter):
-        pen = QPen(Layer.color(LayerType.selection))
-        # pen.setCapStyle(Qt.RoundCap)
-        # pen.setJoinStyle(Qt.RoundJoin)
-        pen.setWidth(0)
-        painter.setPen(pen)
-        painter.setBrush(Qt.NoBrush)
-        self._handle.draw(painter)
-
-    @pyqtSlot('QPoint')
-    def _drag(self, pos):
-        self._obj.pos = pos
-        self.sigUpdate.emit()
-
-    @pyqtSlot()
-    def _commit(self):
-        self._obj.pos = self._handle.pos
-        self._ctrl.doc.doCommand(self._cmd)
-        self._cmd = sch.document.ObjChangeCmd(self._obj)
-        self.sigUpdate.emit()
-
-    @pyqtSlot()
-    def _docChanged(self):
-        # if document changed, it might be because the object got deleted; update state
-        # check that object is still part of the document
-        if not self._ctrl.doc.hasObject(self._obj):
-            self.sigDone.emit()
-            return
-        # object still there, just update handle positions
-        self._handle.pos = self._obj.pos
-
-
-class TextInspector(QWidget):
-    edited = pyqtSignal()
-
-    def __init__(self, obj, parent=None):
-        super().__init__(parent)
-        self.ui = Ui_TextInspector()
-        self.ui.setupUi(self)
-        self._obj = None
-        fontSizes = list(range(6, 16)) + list(range(16, 34, 2)) + list(range(36, 48, 4)) + \
-            list(range(48, 66, 6)) + list(range(66, 98, 8))
-        self.ui.fontSize.addItems([str(i) for i in fontSizes])
-        self._obj = obj
-        self._loadProperties(obj)
-
-    @property
-    def obj(self):
-        return self._obj
-
-    @obj.setter
-    def obj(self, new):
-        self._obj = new
-        self._loadProperties(new)
-
-    def _loadProperties(self, obj: TextObj):
-        self.ui.text.setText(obj.text)
-        if obj.alignment & Qt.AlignLeft:
-            if obj.alignment & Qt.AlignTop:
-                self.ui.btnTopLeft.setChecked(True)
-            elif obj.alignment & Qt.AlignBottom:
-                self.ui.btnBotLeft.setChecked(True)
-            else:
-                self.ui.btnMidLeft.setChecked(True)
-        elif obj.alignment & Qt.AlignRight:
-            if obj.alignment & Qt.AlignTop:
-                self.ui.btnTopRight.setChecked(True)
-            elif obj.alignment & Qt.AlignBottom:
-                self.ui.btnBotRight.setChecked(True)
-            else:
-                self.ui.btnMidRight.setChecked(True)
-        else:
-            if obj.alignment & Qt.AlignTop:
-                self.ui.btnTopCtr.setChecked(True)
-            elif obj.alignment & Qt.AlignBottom:
-                self.ui.btnBotCtr.setChecked(True)
-            else:
-                self.ui.btnMidCtr.setChecked(True)
-        self.ui.fontFace.setCurrentText(obj.family)
-        self.ui.fontSize.setCurrentText("{:g}".format(obj.ptSize/500))
-
-    @pyqtSlot(int)
-    def on_alignGroup_buttonClicked(self, id):
-        if self.ui.btnTopLeft.isChecked():
-            align = Qt.AlignTop | Qt.AlignLeft
-        elif self.ui.btnTopCtr.isChecked():
-            align = Qt.AlignTop | Qt.AlignVCenter
-        elif self.ui.btnTopRight.isChecked():
-            align = Qt.AlignTop | Qt.AlignRight
-        elif self.ui.btnMidLeft.isChecked():
-            align = Qt.AlignHCenter | Qt.AlignLeft
-        elif self.ui.btnMidCtr.isChecked():
-            align = Qt.AlignHCenter | Qt.AlignVCenter
-        elif self.ui.btnMidRight.isChecked():
-            align = Qt.AlignHCenter | Qt.AlignRight
-        elif self.ui.btnBotLeft.isChecked():
-            align = Qt.AlignBottom| Qt.AlignLeft
-        elif self.ui.btnBotCtr.isChecked():
-            align = Qt.AlignBottom | Qt.AlignVCenter
-        else:
-            align = Qt.AlignBottom | Qt.AlignRight
-        self.obj.alignment = align
-        self.edited.emit()
-
-    @pyqtSlot(str)
-    def on_text_textEdited(self, text):
-        if self.obj:
-            self.obj.text = text
-            self.edited.emit()
-
-    @pyqtSlot(QFont)
-    def on_fontFace_currentFontChanged(self, font):
-        if self.obj:
-            self.obj.family = font.family()
-            self.edited.emit()
-
-    @pyqtSlot(str)
-    def on_fontSize_editTextChanged(self, text):
-        if self.obj:
-            self.obj.ptSize = int(float(text)*500)
-            self.edited.emit()
@@ -0,0 +1,127 @@
+import os
+from uuid import UUID
+from lxml import etree
+
+
+# Project directories: a document split into one file per symbol part and per page, so that
+# saving only has to rewrite what changed.
+#
+#   name.xschp/
+#     project.xml       manifest: document properties, and the name and file of every page
+#     symbols/s1.xml    one <symPart> element per file, as in the xSchematic format
+#     pages/p1.xml      one <page> element per file
+#
+# The manifest is authoritative for page names and order; the name attribute inside a page
+# file is only updated when the page itself is rewritten.
+
+EXTENSION = ".xschp"
+MANIFEST = "project.xml"
+SYMBOL_DIR = "symbols"
+PAGE_DIR = "pages"
+VERSION = "1"
+
+
+def projectDir(path):
+    """Returns the project directory for path (the directory itself or its manifest), or None."""
+    if os.path.basename(path) == MANIFEST:
+        path = os.path.dirname(path)
+    if os.path.isfile(os.path.join(path, MANIFEST)):
+        return path
+    return None
+
+
+def isProjectName(path):
+    return path.rstrip("/\\").endswith(EXTENSION) or projectDir(path) is not None
+
+
+def manifestPath(dirName):
+    return os.path.join(dirName, MANIFEST)
+
+
+class Manifest(object):
+    def __init__(self):
+        self.uuid = None
+        self.symProps = []      # (name, value)
+        self.symbols = []       # (name, file relative to the project directory)
+        self.pages = []         # (name, file)
+
+
+def readManifest(dirName):
+    root = etree.parse(manifestPath(dirName)).getroot()
+    if root.tag != "xSchematicProject":
+        raise etree.DocumentInvalid("not a project manifest: {}".format(manifestPath(dirName)))
+    m = Manifest()
+    m.uuid = UUID(root.findtext("props/uuid"))
+    for prop in root.iterfind("symbol/props/prop"):
+        m.symProps.append((prop.attrib["name"], prop.text))
+    for elem in root.iterfind("symbol/symPart"):
+        m.symbols.append((elem.attrib["name"], elem.attrib["file"]))
+    for elem in root.iterfind("pages/page"):
+        m.pages.append((elem.attrib["name"], elem.attrib["file"]))
+    return m
+
+
+def writeManifest(h, m):
+    root = etree.Element("xSchematicProject", version=VERSION)
+    props = etree.SubElement(root, "props")
+    etree.SubElement(props, "uuid").text = str(m.uuid)
+    if m.symbols:
+        sym = etree.SubElement(root, "symbol")
+        symProps = etree.SubElement(sym, "props")
+        for name, value in m.symProps:
+            etree.SubElement(symProps, "prop", name=name).text = value
+        for name, file in m.symbols:
+            etree.SubElement(sym, "symPart", name=name, file=file)
+    if m.pages:
+        pages = etree.SubElement(root, "pages")
+        for name, file in m.pages:
+            etree.SubElement(pages, "page", name=name, file=file)
+    etree.indent(root, "  ")
+    h.write(etree.tostring(root, xml_declaration=True, encoding="utf-8"))
+    h.write(b"\n")
+
+
+def documentTree(dirName, m=None):
+    """Returns the project as the equivalent xSchematic tree, with the contents of every page
+    file in place, e.g. to check it against the schema."""
+    if m is None:
+        m = readManifest(dirName)
+    root = etree.Element("xSchematic")
+    props = etree.SubElement(root, "props")
+    etree.SubElement(props, "uuid").text = str(m.uuid)
+    if m.symbols:
+        sym = etree.SubElement(root, "symbol")
+        symProps = etree.SubElement(sym, "props")
+        for name, value in m.symProps:
+            etree.SubElement(symProps, "prop", name=name).text = value
+        for name, file in m.symbols:
+            sym.append(etree.parse(os.path.join(dirName, file)).getroot())
+    if m.pages:
+        pages = etree.SubElement(root, "pages")
+        for name, file in m.pages:
+            pages.append(etree.parse(os.path.join(dirName, file)).getroot())
+    return etree.ElementTree(root)
+
+
+def newFile(dirName, sub, used):
+    """Picks an unused file name for a new page in the sub directory of the project."""
+    prefix = "s" if sub == SYMBOL_DIR else "p"
+    n = 1
+    while True:
+        rel = "{}/{}{}.xml".format(sub, prefix, n)
+        if rel not in used and not os.path.exists(os.path.join(dirName, rel)):
+            return rel
+        n += 1
+
+
+def removeStale(dirName, used):
+    """Deletes page files no longer referenced by the manifest."""
+    for sub in (SYMBOL_DIR, PAGE_DIR):
+        try:
+            names = os.listdir(os.path.join(dirName, sub))
+        except FileNotFoundError:
+            continue
+        for name in names:
+            rel = sub + "/" + name
+            if name.endswith(".xml") and rel not in used:
+                os.remove(os.path.join(dirName, sub, name))
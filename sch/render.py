@@ -0,0 +1,66 @@
+import math
+from collections import defaultdict
+from PyQt5.QtCore import Qt
+from sch.utils import Layer
+
+
+# Batched drawing.  Objects made of a single straight segment (nets, lines) give it through
+# line(), with the layer it is drawn on as their LAYER, instead of drawing themselves: the
+# segments of a whole list of objects then take one setPen and one drawLines per layer,
+# rather than a setPen and a drawLine each.
+#
+# Zoomed out, objects are drawn with less detail the fewer pixels they cover (level of detail).
+# Objects with a lodRect(scale) method, given the pixels per unit, return a rect to fill on
+# their LAYER instead of drawing themselves (an empty one to be left out), or None to be drawn
+# in full.  Parts smaller than LOD_PART pixels are filled boxes, texts less than LOD_TEXT
+# pixels tall are bars, and less than LOD_TEXT_SKIP are left out, as are junction dots less
+# than LOD_JUNCTION pixels across.  The rects are batched like the segments.
+
+LOD_PART = 8
+LOD_TEXT = 4
+LOD_TEXT_SKIP = 1
+LOD_JUNCTION = 1
+
+# type -> (has line(), has lodRect())
+_kinds = {}
+
+
+def pixelScale(painter):
+    """Returns the number of device pixels one unit of the painter's coordinates covers."""
+    t = painter.transform()
+    return math.hypot(t.m11(), t.m12())
+
+
+def drawObjects(painter, objs):
+    """Draws objs: the segments and reduced objects of all of them first, batched by layer,
+    then the objects that draw themselves, in order."""
+    scale = pixelScale(painter)
+    # batches are kept by type, which hashes faster than the layer
+    lines = defaultdict(list)
+    rects = defaultdict(list)
+    rest = []
+    for obj in objs:
+        t = type(obj)
+        kind = _kinds.get(t)
+        if kind is None:
+            kind = _kinds[t] = (hasattr(obj, "line"), hasattr(obj, "lodRect"))
+        if kind[0]:
+            lines[t].append(obj.line())
+            continue
+        if kind[1]:
+            rect = obj.lodRect(scale)
+            if rect is not None:
+                if not rect.isEmpty():
+                    rects[t].append(rect)
+                continue
+        rest.append(obj)
+    for t, batch in lines.items():
+        painter.setPen(Layer.pen(t.LAYER))
+        painter.drawLines(batch)
+    if rects:
+        painter.setPen(Qt.NoPen)
+        for t, batch in rects.items():
+            painter.setBrush(Layer.brush(t.LAYER))
+            painter.drawRects(batch)
+    for obj in rest:
+        obj.draw(painter)
@@ -0,0 +1,93 @@
+from PyQt5.QtCore import QPoint, QRect
+
+
+# Spatial index of the objects of a page: a uniform grid of square cells, each holding the
+# objects whose box overlaps it.  Objects spanning a lot of cells (long wires, a frame around
+# the page) are kept in a separate list that every query looks at.
+
+# side of a cell, in database units (50 mm)
+CELL = 50000
+# objects overlapping more cells than this go to the list of large objects
+MAX_CELLS = 64
+
+
+class GridIndex(object):
+    def __init__(self, cell=CELL):
+        self._cell = cell
+        # (column, row) -> set of objects
+        self._cells = {}
+        # object -> (x1, y1, x2, y2) it was indexed with
+        self._boxes = {}
+        self._large = set()
+
+    def __len__(self):
+        return len(self._boxes)
+
+    def __contains__(self, obj):
+        return obj in self._boxes
+
+    def box(self, obj):
+        """Returns the rect obj was indexed with, or None."""
+        box = self._boxes.get(obj)
+        if box is None:
+            return None
+        x1, y1, x2, y2 = box
+        return QRect(QPoint(x1, y1), QPoint(x2, y2))
+
+    def _range(self, x1, y1, x2, y2):
+        c = self._cell
+        return x1 // c, y1 // c, x2 // c, y2 // c
+
+    def insert(self, obj, rect: QRect):
+        if obj in self._boxes:
+            self.remove(obj)
+        box = (rect.left(), rect.top(), rect.right(), rect.bottom())
+        self._boxes[obj] = box
+        cx1, cy1, cx2, cy2 = self._range(*box)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > MAX_CELLS:
+            self._large.add(obj)
+            return
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                self._cells.setdefault((cx, cy), set()).add(obj)
+
+    def remove(self, obj):
+        box = self._boxes.pop(obj, None)
+        if box is None:
+            return
+        if obj in self._large:
+            self._large.discard(obj)
+            return
+        cx1, cy1, cx2, cy2 = self._range(*box)
+        for cx in range(cx1, cx2 + 1):
+            for cy in range(cy1, cy2 + 1):
+                objs = self._cells[(cx, cy)]
+                objs.discard(obj)
+                if not objs:
+                    del self._cells[(cx, cy)]
+
+    def query(self, rect: QRect):
+        """Returns the set of objects whose indexed box intersects rect."""
+        return set(self.iterQuery(rect))
+
+    def iterQuery(self, rect: QRect):
+        """Yields the objects whose indexed box intersects rect, without collecting them.  The
+        index must not change while they are gone through."""
+        qx1, qy1, qx2, qy2 = rect.left(), rect.top(), rect.right(), rect.bottom()
+        boxes = self._boxes
+        cx1, cy1, cx2, cy2 = self._range(qx1, qy1, qx2, qy2)
+        if (cx2 - cx1 + 1) * (cy2 - cy1 + 1) > len(self._cells):
+            # most of the page is in view; going through the cells wouldn't save anything
+            candidates = boxes
+        else:
+            candidates = set(self._large)
+            cells = self._cells
+            for cx in range(cx1, cx2 + 1):
+                for cy in range(cy1, cy2 + 1):
+                    objs = cells.get((cx, cy))
+                    if objs:
+                        candidates |= objs
+        for obj in candidates:
+            x1, y1, x2, y2 = boxes[obj]
+            if x1 <= qx2 and qx1 <= x2 and y1 <= qy2 and qy1 <= y2:
+                yield obj
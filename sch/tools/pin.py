@@ -0,0 +1,110 @@
+from PyQt5.QtCore import *
+from PyQt5.QtGui import QPen
+import sch.document
+import sch.controller
+from sch.utils import LayerType, Layer
+from sch.event import Event
+from sch.obj.pin import PinObj
+
+
+class PinTool(QObject):
+    sigUpdate = pyqtSignal()
+
+    def __init__(self, ctrl):
+        QObject.__init__(self)
+        self._ctrl = ctrl
+        self._obj = PinObj(self._nextId())
+
+    @property
+    def inspector(self):
+        return None
+
+    @staticmethod
+    def name():
+        return "Place Pin"
+
+    def _nextId(self):
+        # pins are numbered 1, 2, ... in the order they are placed
+        used = {pin.pinId for pin in self._ctrl.doc.objects(objType=PinObj)}
+        n = 1
+        while str(n) in used:
+            n += 1
+        return str(n)
+
+    def finish(self):
+        self._obj = None
+        self.sigUpdate.emit()
+
+    def draw(self, painter):
+        if self._obj:
+            self._obj.draw(painter)
+
+    def bbox(self):
+        if not self._obj:
+            return QRect()
+        return self._obj.bbox()
+
+    def handleEvent(self, e):
+        if e.evType == sch.controller.Event.Type.MouseMoved:
+            self._obj.pos = self._ctrl.snapPt(e.pos)
+            self.sigUpdate.emit()
+            e.handled = True
+        elif e.evType == sch.controller.Event.Type.MouseReleased:
+            self._ctrl.doc.doCommand(sch.document.ObjAddCmd(self._obj))
+            self._obj = PinObj(self._nextId(), pos=self._obj.pos)
+            e.handled = True
+
+
+class PinEditor(QObject):
+    sigUpdate = pyqtSignal()
+    sigDone = pyqtSignal()
+
+    def __init__(self, ctrl, obj):
+        super().__init__()
+        self._ctrl = ctrl
+        self._obj = obj
+        self._handle = sch.controller.EditHandle(self._ctrl, obj.pos)
+        self._handle.sigDragged.connect(self._drag)
+        self._handle.sigMoved.connect(self._commit)
+        self._ctrl.doc.sigChanged.connect(self._docChanged)
+        self._cmd = sch.document.ObjChangeCmd(obj)
+
+    def testHit(self, pt):
+        return self._handle.testHit(pt)
+
+    def draw(self, painter):
+        pen = QPen(Layer.color(LayerType.selection))
+        pen.setWidth(0)
+        painter.setPen(pen)
+        painter.setBrush(Qt.NoBrush)
+        self._handle.draw(painter)
+        painter.drawRect(self._obj.bbox())
+
+    def bbox(self):
+        return self._obj.bbox()
+
+    def handleEvent(self, event: Event):
+        self._handle.handleEvent(event)
+
+    @property
+    def inspector(self):
+        return None
+
+    @pyqtSlot('QPoint')
+    def _drag(self, pos):
+        self._obj.pos = pos
+        self.sigUpdate.emit()
+
+    @pyqtSlot('QPoint')
+    def _commit(self, pos):
+        self._obj.pos = pos
+        self._ctrl.doc.doCommand(self._cmd)
+        self._cmd = sch.document.ObjChangeCmd(self._obj)
+        self.sigUpdate.emit()
+
+    @pyqtSlot()
+    def _docChanged(self):
+        if not self._ctrl.doc.hasObject(self._obj):
+            self.sigDone.emit()
+            return
+        self._handle.pos = self._obj.pos
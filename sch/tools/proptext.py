@@ -0,0 +1,233 @@
+from PyQt5.QtCore import *
+from PyQt5.QtGui import *
+from PyQt5.QtWidgets import QWidget
+from sch.utils import *
+import sch.controller
+import sch.document
+from sch.event import Event
+from sch.obj.proptext import PropTextObj
+from sch.uic.ui_proptextinspector import Ui_PropTextInspector
+import copy
+
+
+class PropTextTool(QObject):
+    sigUpdate = pyqtSignal()
+
+    def __init__(self, ctrl):
+        QObject.__init__(self)
+        self._ctrl = ctrl
+        self._pos = QPoint()
+        self._obj = PropTextObj(self._ctrl.doc)
+        self._inspector = PropTextInspector(self._obj)
+        # self._inspector.edited.connect(self._commit)
+
+    def finish(self):
+        self._obj = None
+        self.sigUpdate.emit()
+        pass
+
+    @property
+    def inspector(self):
+        return self._inspector
+
+    @staticmethod
+    def name():
+        return "Add Attribute Display"
+
+    def draw(self, painter):
+        if self._obj is not None:
+            self._obj.draw(painter)
+
+    def bbox(self):
+        if self._obj is None:
+            return QRect()
+        return self._obj.bbox()
+
+    def handleEvent(self, e):
+        if e.evType == sch.controller.Event.Type.MouseMoved:
+            self._obj.pos = self._ctrl.snapPt(e.pos)
+            self.sigUpdate.emit()
+            e.handled = True
+        elif e.evType == sch.controller.Event.Type.MouseReleased:
+            cmd = sch.document.ObjAddCmd(self._obj)
+            self._ctrl.doc.doCommand(cmd)
+            self._obj = copy.copy(self._obj)
+            self._inspector.obj = self._obj
+            e.handled = True
+
+
+class PropTextEditor(QObject):
+    sigUpdate = pyqtSignal()
+    sigDone = pyqtSignal()
+
+    def __init__(self, ctrl, obj):
+        super().__init__()
+        self._ctrl = ctrl
+        self._obj = obj
+        self._handle = sch.controller.TextHandle(self._ctrl, self._obj)
+        self._handle.sigDragged.connect(self._drag)
+        self._handle.sigMoved.connect(self._commit)
+        self._ctrl.doc.sigChanged.connect(self._docChanged)
+        self._cmd = sch.document.ObjChangeCmd(obj)
+        self._inspector = PropTextInspector(obj)
+        self._inspector.edited.connect(self._commit)
+
+    @property
+    def inspector(self):
+        return self._inspector
+
+    def testHit(self, pt):
+        return self._handle.testHit(pt)
+
+    def handleEvent(self, e):
+        if e.evType == Event.Type.KeyPressed:
+            if e.key == Qt.Key_R:
+                self._obj.rot = (self._obj.rot + 90) % 360
+                self._commit()
+        self._handle.handleEvent(e)
+
+    def draw(self, painter):
+        pen = QPen(Layer.color(LayerType.selection))
+        # pen.setCapStyle(Qt.RoundCap)
+        # pen.setJoinStyle(Qt.RoundJoin)
+        pen.setWidth(0)
+        painter.setPen(pen)
+        painter.setBrush(Qt.NoBrush)
+        self._handle.draw(painter)
+
+    def bbox(self):
+        return self._obj.bbox()
+
+    @pyqtSlot('QPoint')
+    def _drag(self, pos):
+        self._obj.setPosGlobal(pos)
+        self.sigUpdate.emit()
+
+    @pyqtSlot()
+    def _commit(self):
+        self._obj.setPosGlobal(self._handle.pos)
+        self._ctrl.doc.doCommand(self._cmd)
+        self._cmd = sch.document.ObjChangeCmd(self._obj)
+        self.sigUpdate.emit()
+
+    @pyqtSlot()
+    def _docChanged(self):
+        # if document changed, it might be because the object got deleted; update state
+        # check that object is still part of the document
+        if not self._ctrl.doc.hasObject(self._obj):
+            self.sigDone.emit()
+            return
+        # object still there, just update handle positions
+        self._handle.pos = self._obj.posGlobal()
+
+
+class PropTextInspector(QWidget):
+    edited = pyqtSignal()
+
+    def __init__(self, obj, parent=None):
+        super().__init__(parent)
+        self.ui = Ui_PropTextInspector()
+        self.ui.setupUi(self)
+        self._obj = None
+        fontSizes = list(range(6, 16)) + list(range(16, 34, 2)) + list(range(36, 48, 4)) + \
+            list(range(48, 66, 6)) + list(range(66, 98, 8))
+        self.ui.fontSize.addItems([str(i) for i in fontSizes])
+        self._obj = obj
+        self._loadProperties(obj)
+
+    @property
+    def obj(self):
+        return self._obj
+
+    @obj.setter
+    def obj(self, new):
+        self._obj = new
+        self._loadProperties(new)
+
+    def _loadProperties(self, obj: PropTextObj):
+        self.ui.cbProp.setCurrentText(obj.name)
+        self.ui.leValue.setText(obj.value)
+        self.ui.cbVis.setChecked(obj.vis)
+        self.ui.cbShowName.setChecked(obj.showName)
+        if obj.alignment & Qt.AlignLeft:
+            if obj.alignment & Qt.AlignTop:
+                self.ui.btnTopLeft.setChecked(True)
+            elif obj.alignment & Qt.AlignBottom:
+                self.ui.btnBotLeft.setChecked(True)
+            else:
+                self.ui.btnMidLeft.setChecked(True)
+        elif obj.alignment & Qt.AlignRight:
+            if obj.alignment & Qt.AlignTop:
+                self.ui.btnTopRight.setChecked(True)
+            elif obj.alignment & Qt.AlignBottom:
+                self.ui.btnBotRight.setChecked(True)
+            else:
+                self.ui.btnMidRight.setChecked(True)
+        else:
+            if obj.alignment & Qt.AlignTop:
+                self.ui.btnTopCtr.setChecked(True)
+            elif obj.alignment & Qt.AlignBottom:
+                self.ui.btnBotCtr.setChecked(True)
+            else:
+                self.ui.btnMidCtr.setChecked(True)
+        self.ui.fontFace.setCurrentText(obj.family)
+        self.ui.fontSize.setCurrentText("{:g}".format(obj.ptSize/500))
+
+    @pyqtSlot(int)
+    def on_alignGroup_buttonClicked(self, id):
+        if self.ui.btnTopLeft.isChecked():
+            align = Qt.AlignTop | Qt.AlignLeft
+        elif self.ui.btnTopCtr.isChecked():
+            align = Qt.AlignTop | Qt.AlignVCenter
+        elif self.ui.btnTopRight.isChecked():
+            align = Qt.AlignTop | Qt.AlignRight
+        elif self.ui.btnMidLeft.isChecked():
+            align = Qt.AlignHCenter | Qt.AlignLeft
+        elif self.ui.btnMidCtr.isChecked():
+            align = Qt.AlignHCenter | Qt.AlignVCenter
+        elif self.ui.btnMidRight.isChecked():
+            align = Qt.AlignHCenter | Qt.AlignRight
+        elif self.ui.btnBotLeft.isChecked():
+            align = Qt.AlignBottom| Qt.AlignLeft
+        elif self.ui.btnBotCtr.isChecked():
+            align = Qt.AlignBottom | Qt.AlignVCenter
+        else:
+            align = Qt.AlignBottom | Qt.AlignRight
+        self.obj.alignment = align
+        self.edited.emit()
+
+    @pyqtSlot(QFont)
+    def on_fontFace_currentFontChanged(self, font):
+        if self.obj:
+            self.obj.family = font.family()
+            self.edited.emit()
+
+    @pyqtSlot(str)
+    def on_fontSize_editTextChanged(self, text):
+        if self.obj:
+            self.obj.ptSize = int(float(text)*500)
+            self.edited.emit()
+
+    @pyqtSlot(str)
+    def on_cbProp_currentTextChanged(self, text):
+        if self.obj:
+            self.obj.name = text
+            self.edited.emit()
+
+    @pyqtSlot(str)
+    def on_leValue_textEdited(self, text):
+        if self.obj:
+            self.obj.value = text
+            self.edited.emit()
+
+    @pyqtSlot(bool)
+    def on_cbVis_toggled(self, chkd):
+        if self.obj:
+            self.obj.vis = chkd
+            self.edited.emit()
+
+    @pyqtSlot(bool)
+    def on_cbShowName_toggled(self, chkd):
+        if self.obj:
+            self.obj.showName = chkd
+            self.edited.emit()
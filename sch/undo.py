@@ -0,0 +1,117 @@
+from PyQt5.QtCore import QObject, pyqtSignal
+
+
+# Undo framework for the document model.  It follows the QUndoCommand / QUndoStack API that
+# the model used before, but only needs QtCore, so documents can be used without QtWidgets.
+
+
+class UndoCommand(object):
+    """A command on an UndoStack.  Commands created with a parent are its children; the default
+    redo() / undo() run the children in order / in reverse order, which makes a plain
+    UndoCommand a macro."""
+    def __init__(self, parent=None):
+        self._children = []
+        self._text = ""
+        if parent is not None:
+            parent._children.append(self)
+
+    def text(self):
+        return self._text
+
+    def setText(self, text):
+        self._text = text
+
+    def childCount(self):
+        return len(self._children)
+
+    def child(self, index):
+        if 0 <= index < len(self._children):
+            return self._children[index]
+        return None
+
+    def redo(self):
+        for c in self._children:
+            c.redo()
+
+    def undo(self):
+        for c in reversed(self._children):
+            c.undo()
+
+
+class UndoStack(QObject):
+    canUndoChanged = pyqtSignal(bool)
+    canRedoChanged = pyqtSignal(bool)
+    cleanChanged = pyqtSignal(bool)
+    indexChanged = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cmds = []
+        self._index = 0
+        self._cleanIndex = 0
+
+    def count(self):
+        return len(self._cmds)
+
+    def index(self):
+        return self._index
+
+    def command(self, index):
+        if 0 <= index < len(self._cmds):
+            return self._cmds[index]
+        return None
+
+    def canUndo(self):
+        return self._index > 0
+
+    def canRedo(self):
+        return self._index < len(self._cmds)
+
+    def isClean(self):
+        return self._index == self._cleanIndex
+
+    def cleanIndex(self):
+        # -1 if the clean state can no longer be reached
+        return self._cleanIndex
+
+    def push(self, cmd):
+        cmd.redo()
+        self._change(lambda: self._push(cmd))
+
+    def _push(self, cmd):
+        del self._cmds[self._index:]
+        if self._cleanIndex > self._index:
+            # the clean state was among the commands just discarded
+            self._cleanIndex = -1
+        self._cmds.append(cmd)
+        self._index += 1
+
+    def undo(self):
+        if self.canUndo():
+            self._cmds[self._index - 1].undo()
+            self._change(lambda: self._setIndex(self._index - 1))
+
+    def redo(self):
+        if self.canRedo():
+            self._cmds[self._index].redo()
+            self._change(lambda: self._setIndex(self._index + 1))
+
+    def _setIndex(self, index):
+        self._index = index
+
+    def setClean(self, index=None):
+        """Marks the state after the first index commands (default: the current state) as clean."""
+        self._change(lambda: setattr(self, "_cleanIndex", self._index if index is None else index))
+
+    def _change(self, update):
+        # runs update() and emits the signals for whatever it changed
+        before = (self.canUndo(), self.canRedo(), self.isClean(), self._index)
+        update()
+        if before[0] != self.canUndo():
+            self.canUndoChanged.emit(self.canUndo())
+        if before[1] != self.canRedo():
+            self.canRedoChanged.emit(self.canRedo())
+        if before[2] != self.isClean():
+            self.cleanChanged.emit(self.isClean())
+        if before[3] != self._index:
+            self.indexChanged.emit(self._index)
@@ -1,6 +1,6 @@
 from enum import Enum
-from PyQt5.QtCore import QPoint
-from PyQt5.QtGui import QColor
+from PyQt5.QtCore import Qt, QPoint
+from PyQt5.QtGui import QColor, QPen, QBrush
 
 
 # hashable version of QPoint
@@ -161,6 +161,28 @@ class Layer:
               LayerType.attribute:      QColor(214, 222, 144)
               }
 
+    # pens and brushes made once per layer; painters copy them, so they can be shared
+    _pens = {}
+    _brushes = {}
+
     @staticmethod
     def color(t):
         return Layer.COLORS[t]
+
+    @staticmethod
+    def pen(t):
+        """Returns the cosmetic pen of layer t, with round caps and joins.  Don't change it."""
+        pen = Layer._pens.get(t)
+        if pen is None:
+            pen = Layer._pens[t] = QPen(Layer.COLORS[t])
+            pen.setCapStyle(Qt.RoundCap)
+            pen.setJoinStyle(Qt.RoundJoin)
+            pen.setWidth(0)
+        return pen
+
+    @staticmethod
+    def brush(t):
+        brush = Layer._brushes.get(t)
+        if brush is None:
+            brush = Layer._brushes[t] = QBrush(Layer.COLORS[t])
+        return brush
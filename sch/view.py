@@ -1,31 +1,16 @@
 from PyQt5.QtCore import *
-from PyQt5.QtGui import QTransform, QPainter, QPen, QBrush, QCursor, QPolygon, QKeyEvent
+from PyQt5.QtGui import QTransform, QPainter, QBrush, QCursor, QPolygon, QKeyEvent, QPixmap, QRegion
 from PyQt5.QtWidgets import *
 from sch.utils import Coord, Layer, LayerType
+from sch.event import Event
+import sch.render
 from itertools import product
-from enum import Enum
-
-
-class Event(object):
-    class Type(Enum):
-        MouseMoved = 0
-        MousePressed = 1
-        MouseReleased = 2
-        Done = 3
-        Cancel = 4
-        KeyPressed = 5
-        KeyReleased = 6
-        MouseDblClicked = 7
-
-    def __init__(self, evType, pos=None, key=None):
-        super().__init__()
-        self.evType = evType
-        self.pos = pos
-        self.key = key
-        self.handled = False
 
 
 class SchView(QWidget):
+    # grid points per side of the block the grid is drawn with
+    GRID_TILE = 32
+
     def __init__(self, parent=None):
         QWidget.__init__(self, parent)
         self._transform = QTransform()
@@ -36,6 +21,22 @@ class SchView(QWidget):
         self._mousePos = QPoint()
         self._wheelAngle = 0
         self._ctrl = None
+        # background, grid and document drawn once for the current transform and size (see
+        # _updateLayer); tools and edited objects are painted over it
+        self._layer = None
+        self._layerKey = None
+        # part of the layer (in widget coordinates) that has to be drawn again
+        self._layerDamage = QRegion()
+        # objects that were being edited, so left out of the layer, when it was last drawn
+        self._layerEdited = set()
+        # document area of the overlay when it was last updated; None if unknown
+        self._overlayRect = None
+        # view transform the inverse was taken of, and the inverse (see _inverse)
+        self._inverseOf = None
+        self._inverseTr = None
+        # grid size and points of the grid block (see _gridTile)
+        self._gridTileKey = None
+        self._gridTilePts = None
         self.setMouseTracking(True)
         self.setFocusPolicy(Qt.StrongFocus)
 
@@ -44,58 +45,127 @@ class SchView(QWidget):
 
     def paintEvent(self, event):
         painter = QPainter(self)
-        # erase background
-        painter.setBackground(QBrush(Layer.color(LayerType.background)))
-        painter.setClipping(True)
-        painter.eraseRect(self.rect())
-        # draw document
-        if self._ctrl is not None:
-            # draw grid
-            painter.setRenderHint(QPainter.Antialiasing, False)
-            pen = QPen(Layer.color(LayerType.grid))
-            pen.setCapStyle(Qt.RoundCap)
-            pen.setJoinStyle(Qt.RoundJoin)
-            pen.setWidth(0)
-            painter.setTransform(self._transform)
-            painter.setPen(pen)
-            self._drawGrid(painter)
-            self._drawOrigin(painter)
-            # draw drawables
+        if self._ctrl is None:
+            painter.setBackground(QBrush(Layer.color(LayerType.background)))
+            painter.eraseRect(self.rect())
+        else:
+            self._updateLayer()
+            painter.drawPixmap(QRectF(event.rect()), self._layer, self._pixmapRect(event.rect()))
             # painter.setRenderHint(QPainter.Antialiasing)
-            for d in self._ctrl.getDrawables():
+            painter.setTransform(self._transform)
+            for d in self._ctrl.overlayDrawables():
                 d.draw(painter)
         painter.end()
 
-    def _drawGrid(self, painter):
+    def _pixmapRect(self, rect):
+        r = self._layer.devicePixelRatio()
+        return QRectF(rect.x() * r, rect.y() * r, rect.width() * r, rect.height() * r)
+
+    def _updateLayer(self):
+        # redraws the cached layer if anything it was drawn with changed (see slotLayerUpdate),
+        # or the damaged part of it (see slotLayerDamaged)
+        t = self._transform
+        key = ((t.m11(), t.m12(), t.m21(), t.m22(), t.dx(), t.dy()), self.size(), self.devicePixelRatioF(),
+               self._ctrl.grid)
+        edited = self._ctrl.editedObjects()
+        if self._layer is None or key != self._layerKey:
+            self._layerKey = key
+            ratio = self.devicePixelRatioF()
+            self._layer = QPixmap(self.size() * ratio)
+            self._layer.setDevicePixelRatio(ratio)
+            self._layerDamage = QRegion()
+            self._layerEdited = edited
+            self._drawLayer(self.rect())
+            return
+        # objects that started or stopped being edited move between the layer and the overlay
+        for obj in edited ^ self._layerEdited:
+            self._damageLayer(obj.bbox())
+        self._layerEdited = edited
+        if not self._layerDamage.isEmpty():
+            rect = self._layerDamage.boundingRect() & self.rect()
+            self._layerDamage = QRegion()
+            if not rect.isEmpty():
+                self._drawLayer(rect)
+
+    def _drawLayer(self, rect):
+        painter = QPainter(self._layer)
+        painter.setClipRect(rect)
+        # erase background
+        painter.setBackground(QBrush(Layer.color(LayerType.background)))
+        painter.eraseRect(rect)
+        # draw grid
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.setTransform(self._transform)
+        painter.setPen(Layer.pen(LayerType.grid))
+        self._drawGrid(painter, rect)
+        self._drawOrigin(painter)
+        # draw the document; only what may show in rect
+        sch.render.drawObjects(painter, self._ctrl.layerDrawables(self._exposedRect(rect)))
+        painter.end()
+
+    def _deviceRect(self, rect):
+        # widget area covering the document rect, with a margin for cosmetic pens, edit handles
+        # and junction dots (radius 500)
+        r = self._transform.mapRect(rect.marginsAdded(QMargins(500, 500, 500, 500)))
+        return r.marginsAdded(QMargins(8, 8, 8, 8))
+
+    def _damageLayer(self, rect):
+        if not rect.isEmpty():
+            self._layerDamage = self._layerDamage.united(self._deviceRect(rect))
+
+    def _exposedRect(self, rect):
+        # document area under rect, with a margin for cosmetic pens and junction dots (radius 500)
+        m = self.hitRadius() + 500
+        return self._inverse().mapRect(rect).marginsAdded(QMargins(m, m, m, m))
+
+    def _gridTile(self, g):
+        # points of one GRID_TILE x GRID_TILE block of the grid, built once per grid size and
+        # drawn translated over the view
+        if self._gridTileKey != g:
+            self._gridTileKey = g
+            n = self.GRID_TILE
+            self._gridTilePts = QPolygon([QPoint(x * g, y * g) for x, y in product(range(n), range(n))])
+        return self._gridTilePts
+
+    def _drawGrid(self, painter, rect):
         g = self._ctrl.grid
         if self._transform.map(QLine(QPoint(0, 0), QPoint(g, 0))).dx() <= 5:
             return  # grid points too close, don't draw grid
-        viewport = self._transform.inverted()[0].mapRect(self.rect())
-        startX = int(viewport.x() / g) * g
-        startY = int(viewport.y() / g) * g
-        endX = viewport.x() + viewport.width()
-        endY = viewport.y() + viewport.height()
-        pts = QPolygon((QPoint(i[0], i[1]) for i in product(range(startX, endX, g),
-                                                            range(startY, endY, g))))
-        painter.drawPoints(pts)
+        pts = self._gridTile(g)
+        size = self.GRID_TILE * g
+        viewport = self._inverse().mapRect(rect)
+        base = painter.transform()
+        for x in range(viewport.left() // size * size, viewport.right() + 1, size):
+            for y in range(viewport.top() // size * size, viewport.bottom() + 1, size):
+                painter.setTransform(QTransform.fromTranslate(x, y) * base)
+                painter.drawPoints(pts)
+        painter.setTransform(base)
 
     def _drawOrigin(self, painter):
         painter.drawLine(-2000, 0, 2000, 0)
         painter.drawLine(0, -2000, 0, 2000)
 
+    def _inverse(self):
+        # inverse of the view transform, kept until the transform changes (it is changed in
+        # place, so a copy is kept to compare with)
+        if self._inverseOf is None or self._inverseOf != self._transform:
+            self._inverseOf = QTransform(self._transform)
+            self._inverseTr = self._transform.inverted()[0]
+        return self._inverseTr
+
     def _handleEvent(self, event: Event):
         if self._ctrl is not None:
             self._ctrl.handleEvent(event)
 
     def zoom(self, factor, pos):
-        p = self._transform.inverted()[0].map(pos)
+        p = self._inverse().map(pos)
         # test = QTransform(self._transform)
         # test.scale(factor, factor)
         # check if the bounding rectangle does not enclose the view
         # refuse to zoom out (factor < 1) if this is the case
         # XXX TODO
         self._transform.scale(factor, factor)
-        p2 = self._transform.inverted()[0].map(pos)
+        p2 = self._inverse().map(pos)
         delta = p2 - p
         self._transform.translate(delta.x(), delta.y())
         self.update()
@@ -103,9 +173,9 @@ class SchView(QWidget):
     def recenter(self, pt=None, world=False):
         if pt is None:
             pt = self._mousePos
-        ctr = self._transform.inverted()[0].map(self.rect().center())
+        ctr = self._inverse().map(self.rect().center())
         if not world:
-            pt = self._transform.inverted()[0].map(pt)
+            pt = self._inverse().map(pt)
         ctr -= pt
         self._transform.translate(ctr.x(), ctr.y())
         # move cursor to center of window
@@ -115,30 +185,30 @@ class SchView(QWidget):
     def mouseMoveEvent(self, e):
         if e.buttons() & Qt.MidButton:
             dl = QLine(QPoint(0, 0), e.pos() - self._mousePos)
-            dl = self._transform.inverted()[0].map(dl)
+            dl = self._inverse().map(dl)
             self._transform.translate(dl.dx(), dl.dy())
             self.update()
         self._handleEvent(Event(evType=Event.Type.MouseMoved,
-                                pos=self._transform.inverted()[0].map(e.pos())))
+                                pos=self._inverse().map(e.pos())))
         self._mousePos = e.pos()
 
     def mousePressEvent(self, e):
         if e.button() == Qt.LeftButton:
             self._handleEvent(Event(evType=Event.Type.MousePressed,
-                                    pos=self._transform.inverted()[0].map(e.pos())))
+                                    pos=self._inverse().map(e.pos())))
 
     def mouseReleaseEvent(self, e):
         if e.button() == Qt.LeftButton:
             self._handleEvent(Event(evType=Event.Type.MouseReleased,
-                                    pos=self._transform.inverted()[0].map(e.pos())))
+                                    pos=self._inverse().map(e.pos())))
 
     def mouseDoubleClickEvent(self, e):
         if e.button() == Qt.LeftButton:
             self._handleEvent(Event(evType=Event.Type.MouseDblClicked,
-                                    pos=self._transform.inverted()[0].map(e.pos())))
+                                    pos=self._inverse().map(e.pos())))
 
     def hitRadius(self):
-        return self._transform.inverted()[0].m11()*6     # 6 pixels
+        return int(self._inverse().m11()*6)     # 6 pixels
 
     def keyPressEvent(self, e):
         self._handleEvent(Event(evType=Event.Type.KeyPressed,
@@ -165,4 +235,26 @@ class SchView(QWidget):
 
     @pyqtSlot()
     def slotUpdate(self):
+        # repaints where the overlay was drawn, and where it is now
+        rect = self._ctrl.overlayRect() if self._ctrl is not None else None
+        if rect is None or self._overlayRect is None:
+            self.update()
+        else:
+            damage = rect | self._overlayRect
+            if not damage.isEmpty():
+                self.update(self._deviceRect(damage))
+        self._overlayRect = rect
+
+    @pyqtSlot()
+    def slotLayerUpdate(self):
+        self._layerKey = None
         self.update()
+
+    @pyqtSlot(QRect)
+    def slotLayerDamaged(self, rect):
+        # rect is in document coordinates; a null rect stands for everything
+        if rect.isNull():
+            self.slotLayerUpdate()
+            return
+        self._damageLayer(rect)
+        self.update(self._deviceRect(rect))
@@ -0,0 +1,124 @@
+"""Load, save, conversion and netlist timings on a synthetic design.
+
+    python tests/benchmark.py [--pages 10] [--parts 10000] [--dir DIR] [OPERATION...]
+
+The design is pages of resistors in rows of 100, each chained to the next by a net.  Every
+operation runs in a fresh process; the time and peak memory reported are those of the
+operation alone, after the imports (and, where it says so, after loading)."""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from conftest import SYMBOL
+
+
+def generate(file, pages, parts):
+    ref = 0
+    with open(file, "w") as f:
+        f.write('<xSchematic>\n  <props>\n    <uuid>{}</uuid>\n  </props>\n  <pages>\n'.format(uuid.uuid4()))
+        for p in range(pages):
+            f.write('    <page name="Page{}">\n      <objects>\n'.format(p + 1))
+            for i in range(parts):
+                x, y = (i % 100) * 20000, (i // 100) * 20000
+                ref += 1
+                f.write('        <part schPath="./schlib/res.xsch" partId="R" x="{}" y="{}" rot="0" mirror="0">'
+                        '<proptext x="0" y="3000" rot="0" hAlign="left" vAlign="bottom" fontFamily="Helvetica" '
+                        'fontSize="6000" visible="1" showName="0" prop="ref"/><prop name="ref">R{}</prop>'
+                        '</part>\n'.format(x, y, ref))
+                if i % 100 != 99:
+                    f.write('        <net x1="{}" y1="{}" x2="{}" y2="{}"/>\n'.format(x + 10000, y, x + 20000, y))
+            f.write('      </objects>\n    </page>\n')
+        f.write('  </pages>\n</xSchematic>\n')
+
+
+# name -> (description, file loaded beforehand or None, whether it is loaded lazily)
+OPERATIONS = {
+    "load": ("load, building every page", None, False),
+    "save-xml": ("save opened pages as XML", "design.xsch", False),
+    "save-binary": ("save opened pages as binary", "design.xsch", False),
+    "copy-xml": ("save unopened XML pages as XML", "design.xsch", True),
+    "copy-binary": ("save unopened binary pages as XML", "design.xschb", True),
+    "xml-to-binary": ("sch.binfmt.xmlToBinary", None, True),
+    "binary-to-xml": ("sch.binfmt.binaryToXml", None, True),
+    "netlist": ("netlist of unopened pages", "design.xsch", True),
+}
+
+
+def run(op):
+    # in the working directory of the design, in a process of its own
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtGui import QGuiApplication
+    import sch.binfmt
+    import sch.library
+    import sch.netlist
+    from sch.document import MasterDocument, Validation
+    app = QGuiApplication(["benchmark"])
+    lib = sch.library.PartLibrary(["./schlib/"])
+    desc, file, lazy = OPERATIONS[op]
+    doc = MasterDocument(lib)
+    if file is not None:
+        doc.loadFromFile(file, Validation.off, lazy=lazy)
+    base = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t = time.perf_counter()
+    if op == "load":
+        doc.loadFromFile("design.xsch", Validation.off, lazy=False)
+    elif op == "save-xml" or op.startswith("copy-"):
+        doc.saveToFile("out.xsch")
+    elif op == "save-binary":
+        doc.saveToFile("out.xschb")
+    elif op == "xml-to-binary":
+        sch.binfmt.xmlToBinary("design.xsch", "out.xschb")
+    elif op == "binary-to-xml":
+        sch.binfmt.binaryToXml("design.xschb", "out.xsch")
+    elif op == "netlist":
+        with open("out.net", "w") as h:
+            sch.netlist.writeNetlist(doc, h)
+    t = time.perf_counter() - t
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(t, peak - base, peak)
+
+
+def main():
+    p = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    p.add_argument("--pages", type=int, default=10)
+    p.add_argument("--parts", type=int, default=10000, help="parts per page")
+    p.add_argument("--dir", help="where to write the design (default: a temporary directory)")
+    p.add_argument("--run", help=argparse.SUPPRESS)
+    p.add_argument("ops", nargs="*", metavar="OPERATION",
+                   help="operations to run (default: all of {})".format(", ".join(OPERATIONS)))
+    args = p.parse_args()
+    for op in args.ops:
+        if op not in OPERATIONS:
+            p.error("unknown operation {}".format(op))
+    if args.run:
+        run(args.run)
+        return
+    with tempfile.TemporaryDirectory() as tmp:
+        d = args.dir or tmp
+        os.makedirs(os.path.join(d, "schlib"), exist_ok=True)
+        with open(os.path.join(d, "schlib", "res.xsch"), "w") as f:
+            f.write(SYMBOL)
+        generate(os.path.join(d, "design.xsch"), args.pages, args.parts)
+        subprocess.run([sys.executable, __file__, "--run", "xml-to-binary"], cwd=d, check=True,
+                       stdout=subprocess.DEVNULL)
+        os.rename(os.path.join(d, "out.xschb"), os.path.join(d, "design.xschb"))
+        print("{} parts on {} pages, {:.1f} MB of XML".format(
+            args.pages * args.parts, args.pages, os.path.getsize(os.path.join(d, "design.xsch")) / 2**20))
+        print("{:36} {:>8} {:>10} {:>10}".format("", "time", "op peak", "peak"))
+        for op in args.ops or OPERATIONS:
+            desc = OPERATIONS[op][0]
+            out = subprocess.run([sys.executable, __file__, "--run", op], cwd=d, check=True,
+                                 stdout=subprocess.PIPE, universal_newlines=True).stdout.split()
+            t, delta, peak = float(out[-3]), int(out[-2]), int(out[-1])
+            print("{:36} {:7.2f}s {:7.0f} MB {:7.0f} MB".format(desc, t, delta / 1024, peak / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+import os
+import pytest
+
+# no display is required
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt5.QtWidgets import QApplication
+from lxml import etree
+
+SYMBOL = """<xSchematic>
+  <props><uuid>2e919486-0320-43b4-899d-be4fd0950f8b</uuid></props>
+  <symbol>
+    <props/>
+    <symPart name="R">
+      <props><prop name="ref">R?</prop></props>
+      <objects>
+        <line weight="1" x1="0" y1="0" x2="10000" y2="0"/>
+        <line weight="1" x1="0" y1="-2000" x2="10000" y2="2000"/>
+        <proptext x="0" y="3000" rot="0" hAlign="left" vAlign="bottom" fontFamily="Helvetica" fontSize="6000" visible="1" showName="0" prop="ref"/>
+        <pin id="1" desc="A" x="0" y="0" rot="180"/>
+        <pin id="2" desc="B" x="10000" y="0" rot="0"/>
+      </objects>
+    </symPart>
+  </symbol>
+</xSchematic>
+"""
+
+# a document with a symbol and two pages, using every kind of object
+DOC = """<xSchematic>
+  <props><uuid>08a1d1bd-bd55-41e8-bbb1-24381c7e2771</uuid></props>
+  <symbol>
+    <props><prop name="footprint">0603</prop></props>
+    <symPart name="A">
+      <props><prop name="ref">U?</prop></props>
+      <objects>
+        <line weight="1" x1="0" y1="0" x2="10000" y2="0"/>
+        <proptext x="0" y="3000" rot="0" hAlign="left" vAlign="bottom" fontFamily="Helvetica" fontSize="6000" visible="1" showName="1" prop="ref"/>
+        <pin id="1" desc="IN" x="0" y="0" rot="180"/>
+        <text x="5000" y="-3000" rot="90" hAlign="center" vAlign="middle" fontFamily="Helvetica" fontSize="4000">A</text>
+      </objects>
+    </symPart>
+  </symbol>
+  <pages>
+    <page name="Page1">
+      <objects>
+        <part schPath="./schlib/res.xsch" partId="R" x="0" y="0" rot="90" mirror="1"><proptext x="0" y="3000" rot="0" hAlign="left" vAlign="bottom" fontFamily="Helvetica" fontSize="6000" visible="1" showName="0" prop="ref"/><prop name="ref">R1</prop></part>
+        <net x1="10000" y1="0" x2="20000" y2="0"/>
+        <line weight="1" x1="0" y1="20000" x2="30000" y2="20000"/>
+        <text x="0" y="-10000" rot="0" hAlign="right" vAlign="top" fontFamily="Helvetica" fontSize="6000">note</text>
+        <text x="0" y="-20000" rot="0" hAlign="left" vAlign="bottom" fontFamily="Helvetica" fontSize="6000"/>
+      </objects>
+    </page>
+    <page name="Page2">
+      <objects>
+        <net x1="0" y1="0" x2="0" y2="10000"/>
+      </objects>
+    </page>
+  </pages>
+</xSchematic>
+"""
+
+
+@pytest.fixture(scope="session")
+def app():
+    # the document model only needs a QGuiApplication, views a QApplication
+    return QApplication.instance() or QApplication([])
+
+
+@pytest.fixture
+def lib(app, tmp_path, monkeypatch):
+    """A part library holding a resistor symbol, with the working directory set to tmp_path
+    so that parts can refer to it as ./schlib/res.xsch."""
+    import sch.library
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "schlib").mkdir()
+    (tmp_path / "schlib" / "res.xsch").write_text(SYMBOL)
+    return sch.library.PartLibrary(["./schlib/"])
+
+
+@pytest.fixture
+def docFile(lib, tmp_path):
+    """The sample document DOC, saved as tmp_path/a.xsch."""
+    file = tmp_path / "a.xsch"
+    file.write_text(DOC)
+    return file
+
+
+@pytest.fixture
+def canonical():
+    """Returns a function giving the canonical form of an xSchematic file, for comparisons."""
+    def canonical(file):
+        # object order within a page is not significant
+        tree = etree.parse(str(file), etree.XMLParser(remove_blank_text=True))
+        for objs in tree.iter("objects"):
+            for obj in sorted(objs, key=lambda e: etree.tostring(e, method="c14n")):
+                objs.append(obj)
+        return etree.tostring(tree, method="c14n")
+    return canonical
@@ -0,0 +1,109 @@
+import io
+import json
+import pytest
+import sch.cli
+from sch.document import MasterDocument
+
+# a net ending halfway along another one; normalizing splits the long one in two
+T_JUNCTION = """<xSchematic>
+  <props><uuid>6f0e1a3c-34a5-4a61-8e2f-0c1b9d7c2b55</uuid></props>
+  <pages>
+    <page name="Page1">
+      <objects>
+        <net x1="0" y1="0" x2="20000" y2="0"/>
+        <net x1="10000" y1="0" x2="10000" y2="10000"/>
+      </objects>
+    </page>
+  </pages>
+</xSchematic>
+"""
+
+
+def cli(*argv):
+    """Runs the CLI in this process; returns the exit status and the result lines."""
+    out = io.StringIO()
+    status = sch.cli.run(sch.cli.parseArgs(["-j", "1"] + list(argv)), out=out)
+    return status, [json.loads(line) for line in out.getvalue().splitlines()]
+
+
+@pytest.fixture
+def tree(docFile, tmp_path):
+    """tmp_path/docs holding a.xsch, sub/b.xsch and a file that isn't a document."""
+    docs = tmp_path / "docs"
+    (docs / "sub").mkdir(parents=True)
+    (docs / "a.xsch").write_text(docFile.read_text())
+    (docs / "sub" / "b.xsch").write_text(T_JUNCTION)
+    (docs / "notes.txt").write_text("not a document")
+    return docs
+
+
+def test_find_documents(tree, tmp_path):
+    MasterDocument(None).saveToFile(str(tree / "sub" / "c.xschp"))
+    assert list(sch.cli.findDocuments([str(tree), str(tmp_path / "a.xsch")])) == [
+        (str(tree / "a.xsch"), str(tree)),
+        (str(tree / "sub" / "c.xschp"), str(tree)),
+        (str(tree / "sub" / "b.xsch"), str(tree)),
+        (str(tmp_path / "a.xsch"), str(tmp_path / "a.xsch")),
+    ]
+
+
+def test_output_name_keeps_the_tree():
+    assert sch.cli.outputName("in/sub/b.xsch", "in", ".net") == "in/sub/b.net"
+    assert sch.cli.outputName("in/sub/b.xsch", "in", ".net", "out") == "out/sub/b.net"
+    assert sch.cli.outputName("in/sub/b.xsch", "in/sub/b.xsch", ".net", "out") == "out/b.net"
+
+
+def test_validate(tree):
+    (tree / "bad.xsch").write_text(T_JUNCTION.replace("<objects>", "<objects><bogus/>"))
+    status, lines = cli("validate", str(tree))
+    assert status == 1
+    results = {line["file"]: line for line in lines[:-1]}
+    assert results[str(tree / "a.xsch")]["ok"]
+    assert results[str(tree / "a.xsch")]["pages"] == 2
+    assert not results[str(tree / "bad.xsch")]["ok"]
+    assert "DocumentInvalid" in results[str(tree / "bad.xsch")]["error"]
+    assert lines[-1]["summary"] and lines[-1]["files"] == 3 and lines[-1]["failed"] == 1
+    assert [line["done"] for line in lines[:-1]] == [1, 2, 3]
+
+
+def test_normalize(tree):
+    before = (tree / "sub" / "b.xsch").read_text()
+    status, lines = cli("normalize", "--check", str(tree))
+    assert status == 1
+    assert [line["changed"] for line in lines[:-1]] == [[], ["Page1"]]
+    assert (tree / "sub" / "b.xsch").read_text() == before
+    assert cli("normalize", str(tree))[0] == 0
+    assert cli("normalize", "--check", str(tree))[0] == 0
+
+
+def test_convert(tree, tmp_path, canonical):
+    status, lines = cli("convert", "--to", "binary", "--out", str(tmp_path / "out"), str(tree))
+    assert status == 0
+    assert [line["output"] for line in lines[:-1]] == [str(tmp_path / "out" / "a.xschb"),
+                                                       str(tmp_path / "out" / "sub" / "b.xschb")]
+    status, lines = cli("convert", "--to", "xml", str(tmp_path / "out" / "a.xschb"))
+    assert status == 0
+    assert canonical(tmp_path / "out" / "a.xsch") == canonical(tree / "a.xsch")
+    status, lines = cli("convert", "--to", "xml", str(tree / "a.xsch"))
+    assert lines[0]["skipped"] == "already xml"
+
+
+def test_netlist(tree, tmp_path):
+    # clear of the wires already on the page
+    parts = "".join('<part schPath="./schlib/res.xsch" partId="R" x="{}" y="50000" rot="0" mirror="0">'
+                    '<prop name="ref">{}</prop></part>'.format(x, ref) for x, ref in ((0, "R1"), (10000, "R2")))
+    (tree / "sub" / "r.xsch").write_text(T_JUNCTION.replace("<objects>", "<objects>" + parts))
+    status, lines = cli("netlist", "--out", str(tmp_path / "out"), str(tree))
+    assert status == 0
+    assert [line["nets"] for line in lines[:-1]] == [0, 0, 1]
+    assert (tmp_path / "out" / "sub" / "r.net").read_text().splitlines()[2:] == ["N$1 R1.2 R2.1", "# 1 nets"]
+
+
+def test_worker_pool(tree):
+    # documents are spread over spawned worker processes; results come back as they finish
+    out = io.StringIO()
+    status = sch.cli.run(sch.cli.parseArgs(["-j", "2", "validate", str(tree)]), out=out)
+    lines = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert status == 0
+    assert sorted(line["file"] for line in lines[:-1]) == [str(tree / "a.xsch"), str(tree / "sub" / "b.xsch")]
+    assert lines[-1]["workers"] == 2
@@ -0,0 +1,124 @@
+import pytest
+from PyQt5.QtCore import QPoint, QRect
+from PyQt5.QtGui import QImage
+import sch.controller
+import sch.view
+from sch.document import MasterDocument, ObjAddCmd, ObjChangeCmd, ObjDelCmd
+from sch.event import Event
+from sch.obj.net import NetObj
+from sch.obj.part import PartObj
+
+
+def placedPart(lib, pos):
+    part = PartObj(lib)
+    part.name = "R"
+    part.path = "./schlib/res.xsch"
+    part.pos = pos
+    return part
+
+
+@pytest.fixture
+def page(lib):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    page = doc.pages[0]
+    page.doCommand(ObjAddCmd(NetObj(QPoint(20000, -20000), QPoint(60000, -20000))))
+    # with its property texts, as when loaded
+    part = placedPart(lib, QPoint(20000, -50000))
+    for obj in [part] + part.children():
+        page.doCommand(ObjAddCmd(obj))
+    return page
+
+
+def damage(page):
+    rects = []
+    page.sigDamaged.connect(rects.append)
+    return rects
+
+
+def test_edits_damage_old_and_new_boxes(page):
+    # damage is worked out from the spatial index, built once the page is looked at
+    list(page.objectsInView(QRect(0, -100000, 100000, 100000)))
+    rects = damage(page)
+    net = NetObj(QPoint(0, 0), QPoint(10000, 0))
+    page.doCommand(ObjAddCmd(net))
+    assert rects == [net.bbox()]
+    rects.clear()
+    old = net.bbox()
+    cmd = ObjChangeCmd(net)
+    net.pt2 = QPoint(0, 10000)
+    page.doCommand(cmd)
+    assert rects == [old, net.bbox()]
+    rects.clear()
+    page.doCommand(ObjDelCmd(net))
+    assert rects == [net.bbox()]
+
+
+def test_part_edits_damage_its_texts(page):
+    list(page.objectsInView(QRect(0, -100000, 100000, 100000)))
+    part = next(o for o in page.objects() if type(o) is PartObj)
+    before = [part.bbox()] + [t.bbox() for t in part.children()]
+    rects = damage(page)
+    cmd = ObjChangeCmd(part)
+    part.pos = QPoint(40000, -50000)
+    page.doCommand(cmd)
+    for box in before + [part.bbox()] + [t.bbox() for t in part.children()]:
+        assert box in rects
+
+
+@pytest.fixture
+def view(page, lib, monkeypatch):
+    """A view of page, painted once; update() calls are collected in view.updates."""
+    v = sch.view.SchView()
+    v.resize(400, 300)
+    ctrl = sch.controller.SchController(page, v, lib)
+    v.setCtrl(ctrl)
+    v.image = QImage(v.size(), QImage.Format_ARGB32)
+    v.render(v.image)
+    # the first update repaints everything; from then on the overlay area is known
+    v.slotUpdate()
+    v.updates = []
+    monkeypatch.setattr(v, "update", lambda *rect: v.updates.append(rect[0] if rect else None))
+    return v
+
+
+def repainted(view):
+    """The union of the update() rects, after checking that the view redraws as if from scratch."""
+    assert view.updates and None not in view.updates
+    union = QRect()
+    for rect in view.updates:
+        union |= rect
+    view.render(view.image)
+    view.slotLayerUpdate()
+    full = QImage(view.image.size(), QImage.Format_ARGB32)
+    view.render(full)
+    assert view.image == full
+    return union
+
+
+def test_edit_repaints_the_damage_only(page, view):
+    net = next(o for o in page.objects() if type(o) is NetObj)
+    old = net.bbox()
+    cmd = ObjChangeCmd(net)
+    net.pt2 = QPoint(60000, -40000)
+    page.doCommand(cmd)
+    union = repainted(view)
+    tr = view._transform
+    assert union.contains(tr.mapRect(old)) and union.contains(tr.mapRect(net.bbox()))
+    assert union.width() * union.height() < view.width() * view.height() / 2
+
+
+def test_tool_repaints_where_it_draws(page, view):
+    ctrl = view._ctrl
+    ctrl.changeTool(2)      # nets
+
+    def event(evType, x, y):
+        ctrl.handleEvent(Event(evType=evType, pos=QPoint(x, y)))
+    event(Event.Type.MouseMoved, 10000, -70000)
+    event(Event.Type.MouseReleased, 10000, -70000)
+    event(Event.Type.MouseMoved, 30000, -70000)
+    view.updates.clear()
+    event(Event.Type.MouseMoved, 40000, -70000)
+    union = repainted(view)
+    assert union.contains(view._transform.mapRect(ctrl.overlayRect()))
+    assert union.width() * union.height() < view.width() * view.height() / 2
@@ -0,0 +1,32 @@
+import pytest
+import sch.binfmt
+from sch.document import MasterDocument, Validation
+
+
+def load(lib, file, **kwargs):
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(file), Validation.strict, recover=False, **kwargs)
+    return doc
+
+
+def test_converter_round_trip(docFile, tmp_path, canonical):
+    sch.binfmt.xmlToBinary(str(docFile), str(tmp_path / "a.xschb"))
+    sch.binfmt.binaryToXml(str(tmp_path / "a.xschb"), str(tmp_path / "b.xsch"))
+    assert canonical(tmp_path / "b.xsch") == canonical(docFile)
+
+
+def test_document_round_trip(lib, docFile, tmp_path, canonical):
+    load(lib, docFile).saveToFile(str(tmp_path / "b.xschb"))
+    load(lib, tmp_path / "b.xschb").saveToFile(str(tmp_path / "c.xsch"))
+    assert canonical(tmp_path / "c.xsch") == canonical(docFile)
+
+
+@pytest.mark.parametrize("ext", [".xsch", ".xschb"])
+def test_unopened_pages_round_trip(lib, docFile, tmp_path, canonical, ext):
+    load(lib, docFile).saveToFile(str(tmp_path / ("b" + ext)))
+    doc = load(lib, tmp_path / ("b" + ext))
+    # written straight from the file, a page at a time
+    assert all(p._source is not None for p in doc.symbols + doc.pages)
+    doc.saveToFile(str(tmp_path / "c.xsch"))
+    assert canonical(tmp_path / "c.xsch") == canonical(docFile)
+
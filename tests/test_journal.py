@@ -0,0 +1,73 @@
+import shutil
+from PyQt5.QtCore import QPoint
+import sch.journal
+from sch.document import MasterDocument, ObjAddCmd, ObjChangeCmd, ObjDelCmd
+from sch.library import PartLibrary
+from sch.obj.line import LineObj
+from sch.obj.net import NetObj
+from sch.obj.part import PartObj
+from sch.obj.text import TextObj
+
+
+def state(doc):
+    return [(p.name, sorted(sch.journal.objXml(o) for o in p.objects() if sch.journal.ownerOf(o) is o))
+            for p in doc.symbols + doc.pages]
+
+
+def load(lib, file):
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(file))
+    return doc
+
+
+def test_journal_replay(lib, docFile):
+    doc = load(lib, docFile)
+    page = doc.pages[0]
+    net = NetObj(QPoint(0, 30000), QPoint(5000, 30000))
+    page.doCommand(ObjAddCmd(net))
+    part = PartObj(lib)
+    part.name = "R"
+    part.path = "./schlib/res.xsch"
+    page.doCommand(ObjAddCmd(part))
+    cmd = ObjChangeCmd(net)
+    net.pt2 = QPoint(10000, 30000)
+    page.doCommand(cmd)
+    cmd = ObjChangeCmd(part)
+    part.pos = QPoint(50000, 0)
+    page.doCommand(cmd)
+    text = next(o for o in page.objects() if type(o) is TextObj and not o.text)
+    page.doCommand(ObjDelCmd(text))
+    page.undo()
+    page.undo()
+    page.redo()
+    page.name = "Main"
+    doc.appendNewPage()
+    doc.pages[-1].doCommand(ObjAddCmd(NetObj(QPoint(1000, 1000), QPoint(2000, 1000))))
+    expected = state(doc)
+
+    # reopening without saving replays the journal
+    recovered = load(lib, docFile)
+    assert recovered.recoveredEdits
+    assert state(recovered) == expected
+
+    # saving folds the edits into the file and starts an empty journal
+    recovered.saveToFile()
+    reopened = load(lib, docFile)
+    assert not reopened.recoveredEdits
+    assert state(reopened) == expected
+
+
+def test_library_ignores_journal(lib, tmp_path):
+    # a journal beside a library file, left by an editing session that never saved
+    doc = load(lib, tmp_path / "schlib" / "res.xsch")
+    sym = doc.symbols[0]
+    sym.doCommand(ObjAddCmd(LineObj(QPoint(0, 0), QPoint(0, 50000))))
+    shutil.copy(sch.journal.Journal(str(tmp_path / "schlib" / "res.xsch")).path, tmp_path / "journal")
+    doc.discardJournal()
+    shutil.copy(tmp_path / "journal", sch.journal.Journal(str(tmp_path / "schlib" / "res.xsch")).path)
+
+    fresh = PartLibrary(["./schlib/"])
+    libDoc = fresh.document("./schlib/res.xsch")
+    assert not libDoc.recoveredEdits
+    assert len(libDoc.symbols[0].objects(objType=LineObj)) == 2
+    assert not libDoc.symbols[0].isModified()
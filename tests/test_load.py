@@ -0,0 +1,97 @@
+import os
+import pytest
+from lxml import etree
+import sch.journal
+from sch.document import MasterDocument, Validation, XmlPageSource, scanPages
+
+BAD_VALUE = '<net x1="0" y1="zero" x2="0" y2="10000"/>'
+BAD_SYNTAX = '<net x1="0" y1="0" x2="0" y2="10000"></objects>'
+
+
+def state(doc):
+    return [(p.name, sorted(sch.journal.objXml(o) for o in p.objects())) for p in doc.symbols + doc.pages]
+
+
+def load(lib, file, **kwargs):
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(file), Validation.off, recover=False, **kwargs)
+    return doc
+
+
+def spoil(file, bad):
+    # the second page gets a bad object; the rest of the file stays well-formed
+    file.write_text(file.read_text().replace('<net x1="0" y1="0" x2="0" y2="10000"/>', bad, 1))
+
+
+def test_pages_load_when_used(lib, docFile):
+    doc = load(lib, docFile)
+    assert not any(p.isLoaded() for p in doc.symbols + doc.pages)
+    assert len(doc.pages[1].objects()) == 1
+    assert doc.pages[1].isLoaded() and not doc.pages[0].isLoaded()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_eager_load_matches_lazy(lib, docFile, workers):
+    eager = load(lib, docFile, lazy=False, workers=workers)
+    assert all(p.isLoaded() for p in eager.symbols + eager.pages)
+    assert state(eager) == state(load(lib, docFile))
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+@pytest.mark.parametrize("bad", [BAD_VALUE, BAD_SYNTAX])
+def test_invalid_page_is_named(lib, docFile, workers, bad):
+    spoil(docFile, bad)
+    with pytest.raises(etree.DocumentInvalid, match="invalid page Page2"):
+        load(lib, docFile, lazy=False, workers=workers)
+
+
+class DyingSource(XmlPageSource):
+    def records(self):
+        os._exit(1)
+
+
+def test_dead_worker_is_named(lib, docFile):
+    doc = load(lib, docFile)
+    # the first page waited for, so the pool is known to be broken by then
+    page = doc.symbols[0]
+    page._source = DyingSource(page._source.data)
+    with pytest.raises(RuntimeError, match="loading page A failed"):
+        doc.loadPages(workers=2)
+
+
+
+def test_errors_after_unopened_pages_give_the_line_in_the_file(lib, docFile):
+    # the pages are cut out of what is parsed at once; the lines after them still count
+    lines = docFile.read_text().splitlines()
+    lines.insert(lines.index("  </pages>"), "  <bogus/>")
+    docFile.write_text("\n".join(lines))
+    with pytest.raises(etree.DocumentInvalid, match="line {}$".format(lines.index("  <bogus/>") + 1)):
+        load(lib, docFile)
+
+
+def test_scan_pages_skips_markup():
+    data = (b'<xSchematic><!-- <page name="c"> --><pages><page name="a"><objects>'
+            b'<text x="0" y="0" rot="0" hAlign="left" vAlign="top" fontFamily="f" fontSize="1">'
+            b'<![CDATA[</page>]]></text></objects></page><page name="b"/></pages></xSchematic>')
+    pages = scanPages(data)
+    assert [etree.fromstring(data[start:end]).get("name") for start, _, _, end in pages] == ["a", "b"]
+    assert scanPages(data.replace(b'<page name="b"/>', b'<page name="b">')) is None
+
+
+def test_structure_is_checked_while_streaming(lib, docFile):
+    # without the schema, elements out of place are still caught
+    docFile.write_text(docFile.read_text().replace("<pages>", "<pages>\n    <bogus/>"))
+    with pytest.raises(etree.DocumentInvalid, match="unexpected element <bogus> in <pages>"):
+        load(lib, docFile)
+
+
+def test_documents_that_cannot_be_split_are_streamed(lib, docFile, tmp_path):
+    # pages can only be cut out of UTF-8 documents; others are built as they are parsed
+    text = docFile.read_text().replace(">note<", ">caf\xe9<")
+    latin1 = tmp_path / "latin1.xsch"
+    latin1.write_bytes(b'<?xml version="1.0" encoding="ISO-8859-1"?>\n' + text.encode("latin-1"))
+    assert scanPages(latin1.read_bytes()) is None
+    doc = load(lib, latin1)
+    assert all(p.isLoaded() for p in doc.symbols + doc.pages)
+    docFile.write_text(text)
+    assert state(doc) == state(load(lib, docFile))
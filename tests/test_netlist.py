@@ -0,0 +1,157 @@
+import io
+import pytest
+from PyQt5.QtCore import QPoint
+import sch.netlist
+from sch.document import MasterDocument, ObjAddCmd, ObjChangeCmd, Validation
+from sch.obj.net import NetObj
+from sch.obj.part import PartObj
+from sch.obj.pin import PinObj
+
+
+def part(x, y, ref=None, rot=0, mirror=0):
+    prop = '<prop name="ref">{}</prop>'.format(ref) if ref else ""
+    return '<part schPath="./schlib/res.xsch" partId="R" x="{}" y="{}" rot="{}" mirror="{}">{}</part>'.format(
+        x, y, rot, mirror, prop)
+
+
+def net(x1, y1, x2, y2, name=None):
+    prop = '<prop name="name">{}</prop>'.format(name) if name else ""
+    return '<net x1="{}" y1="{}" x2="{}" y2="{}">{}</net>'.format(x1, y1, x2, y2, prop)
+
+
+def design(lib, tmp_path, *pages):
+    """Loads a document with a page holding the given objects for each argument."""
+    file = tmp_path / "d.xsch"
+    file.write_text('<xSchematic><props><uuid>c5d3c8e4-52d4-4d25-9d3b-7a08e03c0f4c</uuid></props><pages>{}'
+                    '</pages></xSchematic>'.format("".join('<page name="P{}"><objects>{}</objects></page>'.format(
+                        i, "".join(objs)) for i, objs in enumerate(pages, 1))))
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(file), Validation.strict, recover=False)
+    return doc
+
+
+def nets(lib, page, pageNo=1):
+    return sch.netlist.pageNets(page.records(), sch.netlist.SymbolPins(lib), pageNo)
+
+
+def test_nets_join_pins_through_segments(lib, tmp_path):
+    # R1.2 - R2.1 through two segments; R2.2 only has a dangling wire
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), part(30000, 0, "R2"),
+                                 net(10000, 0, 20000, 0), net(20000, 0, 30000, 0), net(40000, 0, 50000, 0)])
+    assert nets(lib, doc.pages[0]) == [((), [("R1", "2"), ("R2", "1")])]
+
+
+def test_pins_touching_join_without_wires(lib, tmp_path):
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), part(10000, 0, "R2")])
+    assert nets(lib, doc.pages[0]) == [((), [("R1", "2"), ("R2", "1")])]
+
+
+def test_segments_only_join_at_their_ends(lib, tmp_path):
+    # nets are normalized; a segment ending halfway along another doesn't connect to it
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), part(0, 20000, "R2"),
+                                 net(10000, 0, 30000, 0), net(20000, 0, 20000, 20000),
+                                 net(10000, 20000, 20000, 20000)])
+    assert nets(lib, doc.pages[0]) == []
+
+
+@pytest.mark.parametrize("rot", [0, 90, 180, 270])
+@pytest.mark.parametrize("mirror", [0, 1])
+def test_pin_positions_match_the_model(lib, tmp_path, rot, mirror):
+    placed = PartObj(lib, pos=QPoint(30000, 40000), rot=rot, mirror=bool(mirror))
+    placed.name = "R"
+    placed.path = "./schlib/res.xsch"
+    pins = dict(placed.pins())
+    doc = design(lib, tmp_path, [part(30000, 40000, "R1", rot, mirror),
+                                 net(pins["2"].x(), pins["2"].y(), 0, 0), part(0, 0, "R2")])
+    assert nets(lib, doc.pages[0]) == [((), [("R1", "2"), ("R2", "1")])]
+
+
+def test_names_and_references(lib, tmp_path):
+    # a named net is kept even without pins; parts without a reference get the symbol's,
+    # made unique by page and part number
+    doc = design(lib, tmp_path, [part(0, 0), part(10000, 0, "R10"), part(100000, 0, "R2"),
+                                 net(0, 0, 0, 10000, "GND"), net(0, 50000, 0, 60000, "VCC")])
+    assert nets(lib, doc.pages[0], 3) == [
+        ((), [("R10", "1"), ("R?@3.1", "2")]),
+        (("GND",), [("R?@3.1", "1")]),
+        (("VCC",), []),
+    ]
+
+
+def test_pins_in_natural_order(lib, tmp_path):
+    doc = design(lib, tmp_path, [part(0, 0, "R10"), part(10000, 0, "R9"), part(10000, 20000, "R100"),
+                                 net(10000, 0, 10000, 20000)])
+    assert nets(lib, doc.pages[0]) == [((), [("R9", "1"), ("R10", "2"), ("R100", "1")])]
+
+
+def test_unopened_pages_are_not_built(lib, tmp_path):
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), part(10000, 0, "R2")])
+    sch.netlist.NetlistCache(doc).nets()
+    assert doc.pages[0]._source is not None
+
+
+def test_write_netlist(lib, tmp_path):
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), part(10000, 0, "R2"), net(20000, 0, 30000, 0, "my net")])
+    h = io.StringIO()
+    assert sch.netlist.writeNetlist(doc, h) == 2
+    assert h.getvalue().splitlines() == [
+        "# pyschem netlist",
+        "# source: {}".format(tmp_path / "d.xsch"),
+        '"my net" R2.2',
+        "N$1 R1.2 R2.1",
+        "# 2 nets",
+    ]
+
+
+def test_merge_joins_names_across_pages():
+    pages = [
+        [(("A", "B"), [("R1", "1")]), ((), [("R1", "2"), ("R2", "1")])],
+        [(("B",), [("R3", "1")]), (("N$1",), [("R4", "1")]), ((), [("R3", "2"), ("R4", "2")])],
+    ]
+    # a net with several names goes by the first; unnamed nets are numbered past the names in use
+    assert sch.netlist.mergeNets(pages) == [
+        ("A", [("R1", "1"), ("R3", "1")]),
+        ("N$1", [("R4", "1")]),
+        ("N$2", [("R1", "2"), ("R2", "1")]),
+        ("N$3", [("R3", "2"), ("R4", "2")]),
+    ]
+
+
+def test_named_nets_join_across_pages(lib, tmp_path):
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), net(10000, 0, 20000, 0, "SIG")],
+                 [part(0, 0, "R2"), net(0, 0, 0, 10000, "SIG")])
+    assert sch.netlist.NetlistCache(doc).nets() == [("SIG", [("R1", "2"), ("R2", "1")])]
+
+
+def test_cache_extracts_changed_pages_only(lib, tmp_path):
+    doc = design(lib, tmp_path, *[[part(0, 0, "R{}".format(2*i + 1)), part(10000, 0, "R{}".format(2*i + 2))]
+                                  for i in range(3)])
+    cache = sch.netlist.NetlistCache(doc)
+    before = cache.nets()
+    assert cache.extracted == 3
+    assert cache.nets() == before
+    assert cache.extracted == 3
+    page = doc.pages[1]
+    page.doCommand(ObjAddCmd(NetObj(QPoint(20000, 0), QPoint(30000, 0))))
+    page.doCommand(ObjAddCmd(NetObj(QPoint(30000, 0), QPoint(0, 0))))
+    # a second net on the page, from R4.2 round to R3.1
+    assert cache.nets() == before[:1] + [("N$2", [("R3", "1"), ("R4", "2")]), ("N$3", [("R3", "2"), ("R4", "1")]),
+                                         ("N$4", [("R5", "2"), ("R6", "1")])]
+    assert cache.extracted == 4
+    page.undo()
+    page.undo()
+    assert cache.nets() == before
+
+
+def test_cache_sees_symbol_edits(lib, tmp_path):
+    doc = design(lib, tmp_path, [part(0, 0, "R1"), part(20000, 0, "R2")])
+    cache = sch.netlist.NetlistCache(doc)
+    assert cache.nets() == []
+    sym = lib.getSym("./schlib/res.xsch", "R")
+    pin = next(p for p in sym.objects(objType=PinObj) if p.pinId == "2")
+    cmd = ObjChangeCmd(pin)
+    pin.pos = QPoint(20000, 0)
+    sym.doCommand(cmd)
+    assert cache.nets() == [("N$1", [("R1", "2"), ("R2", "1")])]
+    sym.undo()
+    assert cache.nets() == []
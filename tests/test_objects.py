@@ -0,0 +1,43 @@
+from PyQt5.QtCore import QPoint
+from sch.document import ObjChangeCmd
+from sch.obj.part import PartObj
+from sch.obj.proptext import PropTextObj
+
+
+def placedPart(lib, pos, rot=0):
+    part = PartObj(lib)
+    part.name = "R"
+    part.path = "./schlib/res.xsch"
+    part.pos = pos
+    part.rot = rot
+    return part
+
+
+def test_move_proptext_on_symbol(lib):
+    # as the symbol editor's property text handle does
+    sym = lib.getSym("./schlib/res.xsch", "R")
+    txt = next(t for t in sym.objects(objType=PropTextObj) if t.parent is sym)
+    cmd = ObjChangeCmd(txt)
+    txt.setPosGlobal(QPoint(2000, 5000))
+    sym.doCommand(cmd)
+    assert txt.pos == QPoint(2000, 5000)
+    assert txt.posGlobal() == QPoint(2000, 5000)
+    sym.undo()
+    assert txt.pos == QPoint(0, 3000)
+
+
+def test_move_proptext_on_part(lib):
+    part = placedPart(lib, QPoint(50000, 30000), rot=90)
+    txt = part.children()[0]
+    txt.setPosGlobal(QPoint(40000, 20000))
+    assert txt.posGlobal() == QPoint(40000, 20000)
+    assert txt.pos != QPoint(40000, 20000)
+
+
+def test_part_hit_on_property_text(lib):
+    part = placedPart(lib, QPoint(50000, 30000), rot=90)
+    box = part.children()[0].bbox()
+    # the text box is in page coordinates, outside the symbol body
+    assert not part.bbox().contains(box.center())
+    assert part.testHit(box.center(), 0)
+    assert not part.testHit(QPoint(0, 0), 0)
@@ -0,0 +1,54 @@
+from PyQt5.QtCore import QPoint
+from sch.document import MasterDocument, ObjAddCmd, ObjChangeCmd, ObjDelCmd
+from sch.obj.net import NetObj
+from sch.obj.part import PartObj
+from sch.obj.pin import PinObj
+
+
+def placedPart(lib, pos):
+    part = PartObj(lib)
+    part.name = "R"
+    part.path = "./schlib/res.xsch"
+    part.pos = pos
+    return part
+
+
+def test_pins_follow_edits(lib):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    page = doc.pages[0]
+    part = placedPart(lib, QPoint(0, 0))
+    page.doCommand(ObjAddCmd(part))
+    assert page.pinsAt(QPoint(0, 0)) == [(part, "1")]
+    assert page.pinsAt(QPoint(10000, 0)) == [(part, "2")]
+    net = NetObj(QPoint(10000, 0), QPoint(20000, 0))
+    page.doCommand(ObjAddCmd(net))
+    assert page.netPins(net) == [(part, "2")]
+    cmd = ObjChangeCmd(part)
+    part.pos = QPoint(10000, 0)
+    page.doCommand(cmd)
+    assert page.pinsAt(QPoint(0, 0)) == []
+    assert page.netPins(net) == [(part, "1"), (part, "2")]
+    page.doCommand(ObjDelCmd(part))
+    assert page.netPins(net) == []
+
+
+def test_symbol_edit_moves_pins_of_instances_only(lib):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    doc.appendNewPage()
+    page, other = doc.pages
+    part = placedPart(lib, QPoint(0, 0))
+    page.doCommand(ObjAddCmd(part))
+    other.doCommand(ObjAddCmd(NetObj(QPoint(0, 0), QPoint(10000, 0))))
+    index, otherIndex = page._validPinIndex(), other._validPinIndex()
+    sym = lib.getSym("./schlib/res.xsch", "R")
+    pin = next(p for p in sym.objects(objType=PinObj) if p.pinId == "2")
+    cmd = ObjChangeCmd(pin)
+    pin.pos = QPoint(20000, 0)
+    sym.doCommand(cmd)
+    assert page.pinsAt(QPoint(10000, 0)) == []
+    assert page.pinsAt(QPoint(20000, 0)) == [(part, "2")]
+    # the indexes were updated, not rebuilt
+    assert page._validPinIndex() is index
+    assert other._validPinIndex() is otherIndex
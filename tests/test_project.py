@@ -0,0 +1,93 @@
+import pytest
+from lxml import etree
+from PyQt5.QtCore import QPoint
+import sch.document
+import sch.project
+from sch.document import MasterDocument, ObjAddCmd, Validation
+from sch.obj.net import NetObj
+
+
+def load(lib, file, **kwargs):
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(file), Validation.strict, recover=False, **kwargs)
+    return doc
+
+
+@pytest.fixture
+def project(lib, docFile, tmp_path):
+    """The sample document saved as the project tmp_path/a.xschp."""
+    load(lib, docFile).saveToFile(str(tmp_path / "a.xschp"))
+    return tmp_path / "a.xschp"
+
+
+@pytest.fixture
+def written(monkeypatch):
+    """Names of the files atomicWrite replaces, relative to their project."""
+    names = []
+    atomicWrite = sch.document.atomicWrite
+
+    def record(file, write):
+        names.append(file.split(".xschp/", 1)[1])
+        atomicWrite(file, write)
+    monkeypatch.setattr(sch.document, "atomicWrite", record)
+    return names
+
+
+def pageFile(project, name):
+    m = sch.project.readManifest(str(project))
+    return next(rel for n, rel in m.symbols + m.pages if n == name)
+
+
+def test_project_round_trip(lib, docFile, project, tmp_path, canonical):
+    load(lib, project).saveToFile(str(tmp_path / "b.xsch"))
+    assert canonical(tmp_path / "b.xsch") == canonical(docFile)
+
+
+def test_project_pages_are_validated(lib, project):
+    page = next((project / "pages").iterdir())
+    page.write_text(page.read_text().replace("<objects>", "<objects><bogus/>", 1))
+    with pytest.raises(etree.DocumentInvalid):
+        load(lib, project)
+
+
+@pytest.mark.parametrize("background", [False, True])
+def test_only_modified_pages_are_written(lib, project, written, background):
+    doc = load(lib, project)
+    doc.saveToFile(str(project))
+    assert written == ["project.xml"]
+    written.clear()
+    doc.pages[1].doCommand(ObjAddCmd(NetObj(QPoint(0, 10000), QPoint(10000, 10000))))
+    if background:
+        doc.saveInBackground(str(project))
+        doc.waitForSave()
+    else:
+        doc.saveToFile(str(project))
+    assert written == [pageFile(project, "Page2"), "project.xml"]
+    assert not doc.isModified()
+    assert len(load(lib, project).pages[1].objects()) == 2
+
+
+def test_new_and_renamed_pages(lib, project, written):
+    doc = load(lib, project)
+    doc.appendNewPage()
+    doc.pages[0].name = "First"
+    doc.saveToFile(str(project))
+    # names are kept in the manifest
+    assert written == [pageFile(project, "Page3"), "project.xml"]
+    assert [p.name for p in load(lib, project).pages] == ["First", "Page2", "Page3"]
+
+
+def test_saving_elsewhere_writes_everything(lib, project, tmp_path, written):
+    doc = load(lib, project)
+    doc.saveToFile(str(tmp_path / "b.xschp"))
+    assert sorted(written) == sorted([pageFile(tmp_path / "b.xschp", "A"), pageFile(tmp_path / "b.xschp", "Page1"),
+                                      pageFile(tmp_path / "b.xschp", "Page2"), "project.xml"])
+
+
+def test_stale_files_are_removed(lib, project):
+    # saved over by a document with one page and no symbols
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    doc.saveToFile(str(project))
+    assert sorted(str(f.relative_to(project)) for f in project.glob("*/*")) == [pageFile(project, "Page1")]
+    assert [p.name for p in load(lib, project).pages] == ["Page1"]
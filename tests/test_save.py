@@ -0,0 +1,105 @@
+import io
+import os
+import stat
+import pytest
+from lxml import etree
+from PyQt5.QtCore import QPoint
+import sch.document
+from sch.document import MasterDocument, ObjAddCmd, Validation, atomicWrite
+from sch.obj.net import NetObj
+
+
+def openFds():
+    return len(os.listdir("/proc/self/fd"))
+
+
+def mode(file):
+    return stat.S_IMODE(os.stat(file).st_mode)
+
+
+def test_atomic_write_modes(tmp_path):
+    new = tmp_path / "new.xsch"
+    umask = os.umask(0o022)
+    try:
+        atomicWrite(str(new), lambda h: h.write(b"a"))
+    finally:
+        os.umask(umask)
+    assert new.read_bytes() == b"a"
+    assert mode(new) == 0o644
+    # rewriting keeps the permissions of the file being replaced
+    os.chmod(new, 0o640)
+    atomicWrite(str(new), lambda h: h.write(b"b"))
+    assert new.read_bytes() == b"b"
+    assert mode(new) == 0o640
+
+
+@pytest.mark.skipif(not os.path.isdir("/proc/self/fd"), reason="needs /proc")
+def test_atomic_write_failures_leave_nothing_behind(tmp_path, monkeypatch):
+    file = tmp_path / "a.xsch"
+    file.write_bytes(b"old")
+    fds = openFds()
+
+    def fail(h):
+        h.write(b"partial")
+        raise ValueError("write failed")
+    with pytest.raises(ValueError):
+        atomicWrite(str(file), fail)
+
+    def denied(*args):
+        raise PermissionError("stat")
+    monkeypatch.setattr(sch.document.os, "stat", denied)
+    with pytest.raises(PermissionError):
+        atomicWrite(str(file), lambda h: h.write(b"new"))
+    monkeypatch.undo()
+    assert file.read_bytes() == b"old"
+    assert os.listdir(tmp_path) == ["a.xsch"]
+    assert openFds() == fds
+
+
+def saveInBackground(doc, file):
+    result = []
+    doc.sigSaved.connect(lambda f: result.append(("saved", f)))
+    doc.sigSaveFailed.connect(lambda e: result.append(("failed", e)))
+    doc.saveInBackground(file)
+    doc.waitForSave()
+    return result
+
+
+def test_background_save(lib, tmp_path):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    doc.pages[0].doCommand(ObjAddCmd(NetObj(QPoint(0, 0), QPoint(1000, 0))))
+    file = str(tmp_path / "a.xsch")
+    assert saveInBackground(doc, file) == [("saved", file)]
+    assert not doc.pages[0].isModified()
+    saved = MasterDocument(lib)
+    saved.loadFromFile(file, recover=False)
+    assert len(saved.pages[0].objects()) == 1
+
+
+def test_background_save_failure_keeps_edits(lib, tmp_path, monkeypatch):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    doc.pages[0].doCommand(ObjAddCmd(NetObj(QPoint(0, 0), QPoint(1000, 0))))
+
+    def broken(*args):
+        raise RuntimeError("broken writer")
+    # not an I/O error: anything escaping the worker thread would abort the process
+    monkeypatch.setattr(sch.document.DocSnapshot, "writeXml", broken)
+    assert saveInBackground(doc, str(tmp_path / "a.xsch")) == [("failed", "broken writer")]
+    assert doc.pages[0].isModified()
+    assert os.listdir(tmp_path) == ["schlib"]
+
+
+def test_streaming_writer_matches_tree(lib, docFile, monkeypatch):
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(docFile), Validation.strict, lazy=False, recover=False)
+    root = etree.Element("xSchematic")
+    doc.toXml(root)
+    tree = etree.tostring(root, pretty_print=True)
+    # written page by page and object by object, never as a whole tree
+    monkeypatch.setattr(MasterDocument, "toXml", None)
+    h = io.BytesIO()
+    doc.writeXml(h)
+    # the same lines, though the objects of a page may come in another order
+    assert sorted(h.getvalue().splitlines()) == sorted(tree.splitlines())
@@ -0,0 +1,83 @@
+import random
+from PyQt5.QtCore import QPoint, QRect
+from sch.document import MasterDocument, ObjAddCmd, ObjChangeCmd, ObjDelCmd
+from sch.obj.line import LineObj
+from sch.obj.net import NetObj
+from sch.obj.part import PartObj
+from sch.spatial import GridIndex
+
+
+def test_grid_index():
+    index = GridIndex(cell=1000)
+    a, b = object(), object()
+    index.insert(a, QRect(0, 0, 500, 500))
+    index.insert(b, QRect(-5000, 2000, 10000, 100))
+    assert index.query(QRect(100, 100, 10, 10)) == {a}
+    assert index.query(QRect(4000, 2050, 10, 10)) == {b}
+    assert index.query(QRect(-10000, -10000, 20000, 20000)) == {a, b}
+    # inserting again moves the object
+    index.insert(a, QRect(8000, 8000, 100, 100))
+    assert index.query(QRect(100, 100, 10, 10)) == set()
+    assert index.box(a) == QRect(8000, 8000, 100, 100)
+    index.remove(b)
+    assert b not in index and len(index) == 1
+
+
+
+def test_queries_match_brute_force():
+    rnd = random.Random(1)
+    index = GridIndex(cell=1000)
+    boxes = {}
+    for i in range(500):
+        # mostly small objects, some spanning many cells
+        w, h = rnd.choice([(rnd.randrange(1, 2000), rnd.randrange(1, 2000)), (30000, 100)])
+        boxes[i] = QRect(rnd.randrange(-20000, 20000), rnd.randrange(-20000, 20000), w, h)
+        index.insert(i, boxes[i])
+    for j in range(200):
+        size = rnd.choice([10, 500, 5000, 60000])
+        rect = QRect(rnd.randrange(-25000, 25000), rnd.randrange(-25000, 25000), size, size)
+        expected = {i for i, box in boxes.items() if box.intersects(rect)}
+        found = list(index.iterQuery(rect))
+        assert len(found) == len(set(found))
+        assert set(found) == expected
+        assert index.query(rect) == expected
+
+
+def test_page_queries_follow_edits(lib):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    page = doc.pages[0]
+    net = NetObj(QPoint(0, 0), QPoint(10000, 0))
+    page.doCommand(ObjAddCmd(net))
+    assert page.findObjsNear(QPoint(5000, 0), 100) == {net}
+    cmd = ObjChangeCmd(net)
+    net.pt1 = QPoint(0, 50000)
+    net.pt2 = QPoint(10000, 50000)
+    page.doCommand(cmd)
+    assert page.findObjsNear(QPoint(5000, 0), 100) == set()
+    assert page.findObjsNear(QPoint(5000, 50000), 100) == {net}
+    page.undo()
+    assert page.findObjsNear(QPoint(5000, 0), 100) == {net}
+    page.doCommand(ObjDelCmd(net))
+    assert page.findObjsInRect(QRect(-1000, -1000, 20000, 2000)) == set()
+
+
+def test_symbol_edit_reindexes_instances_only(lib):
+    doc = MasterDocument(lib)
+    doc.appendNewPage()
+    doc.appendNewPage()
+    page, other = doc.pages
+    part = PartObj(lib)
+    part.name = "R"
+    part.path = "./schlib/res.xsch"
+    page.doCommand(ObjAddCmd(part))
+    other.doCommand(ObjAddCmd(NetObj(QPoint(0, 0), QPoint(10000, 0))))
+    far = QRect(90000, -100, 200, 200)
+    assert part not in page.findObjsInRect(far)
+    spatial, otherSpatial = page._validSpatial(), other._validSpatial()
+    sym = lib.getSym("./schlib/res.xsch", "R")
+    sym.doCommand(ObjAddCmd(LineObj(QPoint(0, 0), QPoint(100000, 0))))
+    # the part grew with its symbol; the indexes were updated, not rebuilt
+    assert part in page.findObjsInRect(far)
+    assert page._validSpatial() is spatial
+    assert other._validSpatial() is otherSpatial
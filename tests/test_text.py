@@ -0,0 +1,68 @@
+import os
+import subprocess
+import sys
+from PyQt5.QtCore import QPoint, QRect, Qt
+from PyQt5.QtGui import QImage, QPainter
+from sch.obj.text import TextObj, layouts, textExtent
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def python(code):
+    # fonts are set up once per process, so what happens without (or before) a QGuiApplication
+    # is checked in a fresh one
+    env = dict(os.environ, PYTHONPATH=ROOT, QT_QPA_PLATFORM="offscreen")
+    return subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True)
+
+
+def test_extent_scales_with_size(app):
+    small = textExtent("R12", "Helvetica", 1000)
+    large = textExtent("R12", "Helvetica", 10000)
+    assert small.width() > 0 and small.height() > 0
+    assert abs(large.width() - 10 * small.width()) <= 10
+    assert textExtent("R12345", "Helvetica", 1000).width() > small.width()
+
+
+def test_box_holds_extent(app):
+    txt = TextObj("hello", QPoint(1000, 2000), Qt.AlignLeft | Qt.AlignBottom, "Helvetica", 6000)
+    ext = textExtent("hello", "Helvetica", 6000)
+    # document y points up: the text stands on its position
+    assert txt.bbox() == QRect(QPoint(1000, 2000), ext)
+
+
+def test_extent_needs_gui_application():
+    r = python("from PyQt5.QtCore import QCoreApplication\n"
+               "app = QCoreApplication([])\n"
+               "import sch.obj.text\n"
+               "try:\n"
+               "    sch.obj.text.textExtent('R1', 'Helvetica', 6000)\n"
+               "except RuntimeError:\n"
+               "    print('raised')\n")
+    assert r.stdout.strip() == "raised", r.stderr
+
+
+def test_cli_measures_like_gui(app):
+    r = python("import sch.cli, sch.obj.text\n"
+               "sch.cli._initWorker([])\n"
+               "e = sch.obj.text.textExtent('R1 10k', 'Helvetica', 6000)\n"
+               "print(e.width(), e.height())\n")
+    ext = textExtent("R1 10k", "Helvetica", 6000)
+    assert r.stdout.split() == [str(ext.width()), str(ext.height())], r.stderr
+
+
+def test_layouts_far_zoomed_out(app):
+    # a 6000 unit text at this scale is far below a point; it is still laid out at 1 point,
+    # in its own layout
+    image = QImage(100, 100, QImage.Format_ARGB32)
+    painter = QPainter(image)
+    painter.scale(0.00005, 0.00005)
+    texts = [TextObj(s, QPoint(0, 0), Qt.AlignLeft | Qt.AlignBottom, "Helvetica", 6000) for s in ("R1", "C22")]
+    for txt in texts:
+        txt.draw(painter)
+    painter.end()
+    for txt in texts:
+        assert txt._font.pointSize() == 1
+        assert txt._statictext.text() == txt.text
+    font, width, height, st = layouts.get("R1", "Helvetica", 0, 0, Qt.AlignLeft)
+    assert font.pointSize() == 1 and st.text() == "R1"
+    assert layouts.get("R1", "Helvetica", 1, 0, Qt.AlignLeft)[3] is st
@@ -0,0 +1,64 @@
+import time
+import pytest
+from lxml import etree
+from PyQt5.QtCore import QCoreApplication
+import sch.document
+import sch.library
+from sch.document import MasterDocument, Validation
+
+# allowed by the loader, but not by the schema
+EXTRA_ATTRIBUTE = '<net x1="0" y1="0" x2="0" y2="10000" extra="1"/>'
+
+
+@pytest.fixture
+def badFile(docFile):
+    docFile.write_text(docFile.read_text().replace('<net x1="0" y1="0" x2="0" y2="10000"/>', EXTRA_ATTRIBUTE))
+    return docFile
+
+
+def load(lib, file, validation):
+    doc = MasterDocument(lib)
+    doc.loadFromFile(str(file), validation, recover=False)
+    return doc
+
+
+def test_schema_is_compiled_once(lib, docFile, monkeypatch):
+    compiled = []
+    relaxNG = etree.RelaxNG
+    monkeypatch.setattr(etree, "RelaxNG", lambda tree: compiled.append(tree) or relaxNG(tree))
+    monkeypatch.setattr(sch.document, "_schema", None)
+    for i in range(3):
+        load(lib, docFile, Validation.strict)
+    assert len(compiled) == 1
+    assert sch.document.schema() is sch.document.schema()
+
+
+def test_strict(lib, docFile, badFile):
+    with pytest.raises(etree.DocumentInvalid, match="extra"):
+        load(lib, badFile, Validation.strict)
+
+
+def test_off(lib, badFile):
+    doc = load(lib, badFile, Validation.off)
+    assert len(doc.pages[1].objects()) == 1
+
+
+def test_deferred(lib, badFile):
+    doc = MasterDocument(lib)
+    failures = []
+    doc.sigValidationFailed.connect(failures.append)
+    doc.loadFromFile(str(badFile), Validation.deferred, recover=False)
+    # the document is usable at once; the failure is reported from a worker thread
+    assert len(doc.pages) == 2
+    deadline = time.monotonic() + 10
+    while not failures and time.monotonic() < deadline:
+        QCoreApplication.processEvents()
+        time.sleep(0.01)
+    assert len(failures) == 1 and "extra" in failures[0]
+
+
+def test_library_files_are_not_validated(lib, monkeypatch):
+    validated = []
+    monkeypatch.setattr(sch.document, "validate", validated.append)
+    assert sch.library.PartLibrary(lib.paths).getSym("./schlib/res.xsch", "R") is not None
+    assert validated == []